@@ -1,21 +1,31 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 import uvicorn
 import os
 import asyncio
-import json
+import logging
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import uuid
-from datetime import datetime
+from functools import lru_cache
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Final
 import spacy
+import aiofiles
+import orjson
 from bson import ObjectId
 
+# Configurar logging uma única vez, no ponto de entrada da aplicação (antes de
+# importar os módulos internos, que registram mensagens já na importação)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
 # Importar processadores e analisadores
 from app.utils.text_processor import TextProcessor
 from app.utils.redacao_analyzer import RedacaoAnalyzer
-from app.utils.file_processor import file_processor
+from app.utils.file_processor import file_processor, extract_text_from_path
 from app.utils.ia_agent import ia_agent
 
 # Importar esquemas
@@ -25,18 +35,44 @@ from app.models.schemas import RedacaoInput, RedacaoAnalise, Correcao
 from app.database.repositories import (
     redacao_repository,
     analise_repository,
+    embedding_repository,
     user_repository
 )
 
-# Importar RAG manager
+# Importar cliente MongoDB e RAG manager
+from app.database.mongo_client import mongo_client
 from app.database.rag_manager import rag_manager
+from app.database.vector_codec import encode_vector
+from app.database.models import ProblemasColumnar, codificar_problemas
 
 import tempfile
 
+
+def _json_default(obj: Any) -> Any:
+    """Serializa tipos do BSON que o orjson não conhece (datetime é nativo)"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError
+
+
+class MongoORJSONResponse(ORJSONResponse):
+    """Resposta JSON via orjson que aceita documentos do MongoDB diretamente"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
 app = FastAPI(
     title="Elysia - API de Correção de Redações",
     description="API para análise e correção automática de redações em português.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=MongoORJSONResponse
 )
 
 # Configurar CORS para permitir requisições do frontend
@@ -48,9 +84,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tamanho dos blocos lidos do upload
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Formatos de arquivo aceitos no upload
+_ALLOWED_MIME: Final[frozenset[str]] = frozenset({
+    "text/plain",
+    "application/pdf",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+})
+_ALLOWED_EXT: Final[frozenset[str]] = frozenset({".txt", ".pdf", ".doc", ".docx"})
+
 # Inicializar processadores
 text_processor = TextProcessor()
-analyzer = RedacaoAnalyzer()
+analyzer = RedacaoAnalyzer(text_processor=text_processor)
+
+# Pool de processos para o trabalho CPU-bound (extração de texto de PDF/DOC/DOCX),
+# mantendo o event loop livre para atender requisições
+process_pool: Optional[ProcessPoolExecutor] = None
+
+@app.on_event("startup")
+async def startup():
+    """Configura coleções e índices do MongoDB e o pool de processos ao iniciar a API"""
+    global process_pool
+    process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    await mongo_client.ensure_indexes()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Encerra o pool de processos e as conexões HTTP do agente de IA"""
+    if process_pool:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+    await ia_agent.aclose()
 
 @app.get("/")
 def read_root():
@@ -72,21 +138,16 @@ async def analisar_redacao(
     - **usuario_email**: Email do usuário (opcional)
     - **usar_agente_ia**: Flag para usar o agente de IA na análise (opcional, padrão=True)
     """
+    # Timestamp único da requisição, compartilhado por redação, análise e embedding
+    request_ts = datetime.now(timezone.utc)
+    
     try:
-        # Verificar tipo de arquivo
-        tipos_permitidos = [
-            "text/plain", 
-            "application/pdf",
-            "application/msword",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        ]
-        
-        # Verificar pela extensão se o content_type não for confiável
-        tipo_valido = arquivo.content_type in tipos_permitidos
+        # Verificar tipo de arquivo, pela extensão se o content_type não for confiável
+        tipo_valido = arquivo.content_type in _ALLOWED_MIME
         if not tipo_valido:
             # Verificar extensão como fallback
             extensao = Path(arquivo.filename).suffix.lower() if arquivo.filename else ""
-            tipo_valido = extensao in [".txt", ".pdf", ".doc", ".docx"]
+            tipo_valido = extensao in _ALLOWED_EXT
         
         if not tipo_valido:
             raise HTTPException(
@@ -94,9 +155,6 @@ async def analisar_redacao(
                 detail="Formato de arquivo não suportado. Use .txt, .pdf, .doc ou .docx"
             )
         
-        # Ler conteúdo do arquivo
-        conteudo = await arquivo.read()
-        
         # Encontrar ou criar usuário
         try:
             usuario = await user_repository.find_by_email(usuario_email)
@@ -106,7 +164,7 @@ async def analisar_redacao(
                     "email": usuario_email,
                     "nome": "Usuário Elysia",
                     "tipo": "aluno",
-                    "data_cadastro": datetime.now()
+                    "data_cadastro": request_ts
                 })
             else:
                 usuario_id = str(usuario["_id"])
@@ -117,49 +175,78 @@ async def analisar_redacao(
             logger.error(f"Erro ao processar usuário: {e}")
             usuario_id = "000000000000000000000000"  # ObjectId fictício
         
+        # Gerar ID para a redação
+        redacao_id = str(ObjectId())
+        
+        # Gravar o arquivo em disco à medida que os blocos chegam, sem carregá-lo inteiro em memória
+        arquivo_dir = os.path.join("data", "redacoes")
+        os.makedirs(arquivo_dir, exist_ok=True)
+        arquivo_path = os.path.join(arquivo_dir, f"{redacao_id}_{arquivo.filename}")
+        
+        tamanho_bytes = 0
+        hasher = hashlib.blake2b(digest_size=16)
+        async with aiofiles.open(arquivo_path, "wb") as buffer:
+            while chunk := await arquivo.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
+                hasher.update(chunk)
+                tamanho_bytes += len(chunk)
+        content_hash = hasher.hexdigest()
+        
+        # Arquivo idêntico já analisado: devolver a análise existente sem reprocessar
+        existente = await redacao_repository.find_concluida_by_hash(content_hash)
+        if existente:
+            analise = await analise_repository.find_by_redacao(existente["_id"])
+            if analise:
+                # Só aqui o arquivo é descartado; sem análise, segue o processamento normal
+                os.remove(arquivo_path)
+                return {
+                    "status": "concluida",
+                    "redacao_id": str(existente["_id"]),
+                    "analise_id": str(analise["_id"]),
+                    "mensagem": "Redação idêntica já analisada anteriormente"
+                }
+        
         # Extrair texto do arquivo usando o processador de arquivos
         try:
-            texto = file_processor.extract_text(
-                conteudo, 
-                file_name=arquivo.filename, 
-                content_type=arquivo.content_type
+            texto = await asyncio.get_running_loop().run_in_executor(
+                process_pool,
+                extract_text_from_path,
+                arquivo_path,
+                arquivo.filename,
+                arquivo.content_type
             )
         except Exception as e:
+            os.remove(arquivo_path)
             raise HTTPException(status_code=400, detail=f"Não foi possível extrair texto do arquivo: {str(e)}")
         
         if not texto or len(texto.strip()) < 50:
+            os.remove(arquivo_path)
             raise HTTPException(status_code=400, detail="Texto extraído muito curto ou vazio")
         
-        # Gerar ID para a redação
-        redacao_id = str(ObjectId())
-        
-        # Criar redação no banco de dados
-        await redacao_repository.insert_one({
+        # Criar redação no banco de dados (insert agrupado com outras requisições)
+        await redacao_repository.create({
             "_id": ObjectId(redacao_id),
             "usuario_id": ObjectId(usuario_id),
-            "titulo": titulo or f"Redação {datetime.now().strftime('%d/%m/%Y')}",
+            "titulo": titulo or f"Redação {request_ts.strftime('%d/%m/%Y')}",
             "status": "processando",
-            "data_envio": datetime.now(),
+            "data_envio": request_ts,
             "texto_extraido": texto,
+            "content_hash": content_hash,
             "metadata": {
                 "tipo_arquivo": arquivo.content_type,
                 "nome_arquivo": arquivo.filename,
-                "tamanho_bytes": len(conteudo),
+                "tamanho_bytes": tamanho_bytes,
                 "ip_origem": None  # Poderia ser capturado do request em ambiente de produção
             }
         })
         
-        # Salvar o arquivo para processamento pelo agente de IA
+        # Manter o arquivo apenas para processamento pelo agente de IA
         arquivo_salvo = None
         if usar_agente_ia:
-            arquivo_dir = os.path.join("data", "redacoes")
-            os.makedirs(arquivo_dir, exist_ok=True)
-            arquivo_path = os.path.join(arquivo_dir, f"{redacao_id}_{arquivo.filename}")
-            
-            with open(arquivo_path, "wb") as buffer:
-                buffer.write(conteudo)
             arquivo_salvo = arquivo_path
             logger.info(f"Arquivo salvo em {arquivo_salvo} para processamento pelo agente de IA")
+        else:
+            os.remove(arquivo_path)
         
         # Processar análise em background
         background_tasks.add_task(
@@ -168,7 +255,8 @@ async def analisar_redacao(
             texto=texto, 
             titulo=titulo, 
             usuario_id=usuario_id,
-            file_path=arquivo_salvo
+            file_path=arquivo_salvo,
+            request_ts=request_ts
         )
         
         # Retornar ID para acompanhamento
@@ -184,13 +272,29 @@ async def analisar_redacao(
         logger.error(f"Erro ao processar upload de redação: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar a redação: {str(e)}")
 
+# Diretório das redações de exemplo
+EXEMPLOS_DIR = Path("data/redacoes")
+
+@lru_cache(maxsize=1)
+def _listar_exemplos(dir_mtime: float) -> List[str]:
+    """Títulos dos exemplos; a chave de mtime invalida o cache quando o diretório muda"""
+    return [f.stem for f in EXEMPLOS_DIR.glob("*.json")]
+
+@lru_cache(maxsize=128)
+def _load_exemplo(path: str, mtime: float) -> RedacaoAnalise:
+    """
+    Exemplo já validado, recarregado apenas quando o arquivo é modificado
+    
+    model_validate_json decodifica e valida os bytes em uma única passada no
+    pydantic-core, sem o dict intermediário que o response_model validaria de novo.
+    """
+    return RedacaoAnalise.model_validate_json(Path(path).read_bytes())
+
 @app.get("/api/exemplos", response_model=List[str])
 def get_exemplos():
     """Retorna uma lista de títulos de redações de exemplo disponíveis"""
     try:
-        exemplos_dir = Path("data/redacoes")
-        exemplos = [f.stem for f in exemplos_dir.glob("*.json")]
-        return exemplos
+        return _listar_exemplos(EXEMPLOS_DIR.stat().st_mtime)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar exemplos: {str(e)}")
 
@@ -198,92 +302,131 @@ def get_exemplos():
 def get_exemplo(titulo: str):
     """Retorna a análise de uma redação de exemplo pelo título"""
     try:
-        exemplo_path = Path(f"data/redacoes/{titulo}.json")
-        if not exemplo_path.exists():
+        exemplo_path = EXEMPLOS_DIR / f"{titulo}.json"
+        try:
+            mtime = exemplo_path.stat().st_mtime
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail=f"Exemplo '{titulo}' não encontrado")
         
-        with open(exemplo_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _load_exemplo(str(exemplo_path), mtime)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar exemplo: {str(e)}")
 
+async def _analisar_com_ia(texto: str, file_path: Optional[str]) -> Dict[str, Any]:
+    """Analisa a redação com o agente de IA, preferindo o arquivo original quando disponível"""
+    # Se temos o arquivo original, processamos ele diretamente
+    if file_path and os.path.exists(file_path):
+        logger.info(f"Usando arquivo original para análise: {file_path}")
+        # Usar o agente para processar o documento diretamente
+        doc_result = await ia_agent.process_document(file_path)
+        if "error" not in doc_result and doc_result.get("analysis"):
+            return doc_result.get("analysis")
+        
+        # Fallback para o texto extraído
+        logger.warning(f"Falha ao processar documento original, usando texto extraído: {str(doc_result.get('error', ''))}")
+        return await ia_agent.analyze_text(texto)
+    
+    # Se não temos o arquivo, usamos o texto extraído
+    logger.info("Usando texto extraído para análise de redação")
+    return await ia_agent.analyze_text(texto)
+
+async def _indexar_embedding(
+    redacao_id: str,
+    titulo: Optional[str],
+    texto: str,
+    embedding: List[float],
+    request_ts: datetime
+) -> List[Dict[str, Any]]:
+    """Salva o embedding da redação e retorna o contexto das análises de redações similares"""
+    vector_bin, vector_scale = encode_vector(embedding)
+    embedding_id = await embedding_repository.create({
+        "redacao_id": ObjectId(redacao_id),
+        "titulo": titulo,
+        "vector_embedding": vector_bin,
+        "vector_scale": vector_scale,
+        "texto_snippet": texto[:1000],  # Salvar apenas um trecho para referência
+        "modelo_embedding": "text-embedding-3-small",
+        "data_criacao": request_ts
+    })
+    rag_manager.update_corpus(redacao_id, embedding, titulo, texto[:1000], embedding_id)
+    
+    # Buscar análises de redações similares para enriquecer o contexto (uma única agregação)
+    analises_similares = await rag_manager.find_similar_analises(
+        embedding, limite=3, excluir_redacao_id=redacao_id
+    )
+    return [
+        {
+            "nota": analise_similar.get("nota_geral", 0),
+            "resumo": analise_similar.get("resumo_executivo", ""),
+            "pontos_fortes": analise_similar.get("pontos_fortes", [])
+        }
+        for analise_similar in analises_similares
+    ]
+
 # Função para processamento assíncrono de redações
-async def processar_redacao_async(redacao_id: str, texto: str, titulo: Optional[str], usuario_id: str, file_path: Optional[str] = None):
+async def processar_redacao_async(
+    redacao_id: str,
+    texto: str,
+    titulo: Optional[str],
+    usuario_id: str,
+    file_path: Optional[str] = None,
+    request_ts: Optional[datetime] = None
+):
     """Processa a redação de forma assíncrona e salva os resultados no MongoDB"""
+    request_ts = request_ts or datetime.now(timezone.utc)
     try:
         # Atualizar status para processando
-        await redacao_repository.update(redacao_id, {"status": "processando"})
+        await redacao_repository.update_one(redacao_id, {"status": "processando"})
         
         # Verificar tamanho do texto
         if len(texto) < 50:
-            await redacao_repository.update(redacao_id, {
+            await redacao_repository.update_one(redacao_id, {
                 "status": "erro",
                 "mensagem_erro": "Texto muito curto para análise detalhada. Mínimo de 50 caracteres requerido."
             })
             return
         
-        # Gerar embeddings para a redação
-        try:
-            embedding = await rag_manager.generate_embedding(texto)
-        except Exception as e:
-            logger.error(f"Erro ao gerar embedding: {str(e)}")
-            embedding = None
-        
-        # Salvar embedding
-        if embedding:
-            await embedding_repository.create({
-                "redacao_id": redacao_id,
-                "vector": embedding,
-                "texto": texto[:200]  # Salvar apenas um trecho para referência
-            })
-            
-            # Buscar redações similares para enriquecer o contexto
-            redacoes_similares = await rag_manager.find_similar_redacoes(embedding, limite=3)
-            contexto_adicional = []
-            
-            for redacao_similar in redacoes_similares:
-                similar_id = redacao_similar.get("_id")
-                if similar_id and similar_id != redacao_id:  # Evitar a própria redação
-                    analise_similar = await analise_repository.find_by_redacao(str(similar_id))
-                    if analise_similar:
-                        contexto_adicional.append({
-                            "nota": analise_similar.get("nota_geral", 0),
-                            "resumo": analise_similar.get("resumo_executivo", ""),
-                            "pontos_fortes": analise_similar.get("pontos_fortes", [])
-                        })
-        
-        # Processar análise da redação usando o Agente de IA
+        # Embedding, pontos-chave e análise dependem apenas do texto: executar em paralelo
         logger.info(f"Iniciando análise com agente de IA para redação {redacao_id}")
+        embedding, pontos_chave, analysis_result = await asyncio.gather(
+            asyncio.to_thread(rag_manager.generate_embedding, texto),
+            ia_agent.extract_key_points(texto),
+            _analisar_com_ia(texto, file_path),
+            return_exceptions=True
+        )
         
-        analysis_result = {}
-        # Se temos o arquivo original, processamos ele diretamente
-        if file_path and os.path.exists(file_path):
-            logger.info(f"Usando arquivo original para análise: {file_path}")
-            # Usar o agente para processar o documento diretamente
-            doc_result = await ia_agent.process_document(file_path)
-            if "error" not in doc_result and doc_result.get("analysis"):
-                analysis_result = doc_result.get("analysis")
-            else:
-                # Fallback para o texto extraído
-                logger.warning(f"Falha ao processar documento original, usando texto extraído: {str(doc_result.get('error', ''))}")
-                analysis_result = await ia_agent.analyze_text(texto)
-        else:
-            # Se não temos o arquivo, usamos o texto extraído
-            logger.info(f"Usando texto extraído para análise de redação {redacao_id}")
-            analysis_result = await ia_agent.analyze_text(texto)
+        if isinstance(embedding, BaseException):
+            logger.error(f"Erro ao gerar embedding: {str(embedding)}")
+            embedding = None
+        if isinstance(pontos_chave, BaseException):
+            logger.error(f"Erro ao extrair pontos-chave: {str(pontos_chave)}")
+            pontos_chave = []
+        if isinstance(analysis_result, BaseException):
+            analysis_result = {"error": str(analysis_result)}
             
         # Verificar se a análise foi bem-sucedida
         if "error" in analysis_result:
             logger.error(f"Erro na análise com IA: {analysis_result['error']}")
             analysis_result = {}
-            
-        # Adicionar mais informações com IA
-        sugestoes = await ia_agent.generate_improvement_suggestions(texto, analysis_result) if analysis_result else []
-        pontos_chave = await ia_agent.extract_key_points(texto) if texto else []
+        
+        # Etapas dependentes: sugestões usam a análise, a busca de similares usa o embedding
+        async def _sugestoes() -> List[str]:
+            if not analysis_result:
+                return []
+            return await ia_agent.generate_improvement_suggestions(texto, analysis_result)
+        
+        async def _contexto() -> List[Dict[str, Any]]:
+            if not embedding:
+                return []
+            return await _indexar_embedding(redacao_id, titulo, texto, embedding, request_ts)
+        
+        sugestoes, contexto_adicional = await asyncio.gather(_sugestoes(), _contexto())
         
         # Preparar o objeto de análise
         analise = {
-            "redacao_id": redacao_id,
+            "redacao_id": ObjectId(redacao_id),
             "titulo": titulo or "Redação sem título",
             "nota_geral": analysis_result.get("nota_geral", 7.0),
             "resumo_executivo": analysis_result.get("resumo_executivo", "Análise não disponível"),
@@ -294,24 +437,28 @@ async def processar_redacao_async(redacao_id: str, texto: str, titulo: Optional[
                 {"competencia": "Coesão textual", "nota": 7.5, "justificativa": "Uso adequado de elementos coesivos, com algumas falhas."},
                 {"competencia": "Proposta de intervenção", "nota": 6.0, "justificativa": "Proposta pouco desenvolvida e sem detalhamento dos agentes."}
             ]),
-            "problemas_gramaticais": analysis_result.get("problemas_gramaticais", []),
+            # Em colunas quando normalizável; obter_analise_redacao devolve a visão em lista
+            **codificar_problemas(analysis_result.get("problemas_gramaticais", [])),
+            # Desvios da base de regras do analisador, numa única varredura do texto
+            "problemas_regras": analyzer.encontrar_problemas(texto),
             "recomendacoes": analysis_result.get("recomendacoes", sugestoes),
             "pontos_fortes": analysis_result.get("pontos_fortes", pontos_chave),
-            "contexto_adicional": contexto_adicional
+            "contexto_adicional": contexto_adicional,
+            "data_analise": request_ts
         }
         
         # Salvar análise no MongoDB
         await analise_repository.create(analise)
         
         # Atualizar status da redação
-        await redacao_repository.update(redacao_id, {
+        await redacao_repository.update_one(redacao_id, {
             "status": "concluida",
             "analise_disponivel": True
         })
     except Exception as e:
         logger.error(f"Erro no processamento assíncrono: {str(e)}")
         # Atualizar status para erro
-        await redacao_repository.update(redacao_id, {
+        await redacao_repository.update_one(redacao_id, {
             "status": "erro",
             "mensagem_erro": f"Erro ao processar redação: {str(e)}"
         })
@@ -364,17 +511,18 @@ async def obter_analise_redacao(redacao_id: str):
         if not analise:
             raise HTTPException(status_code=404, detail="Análise não encontrada")
         
-        # Converter ObjectIds para strings
-        for key, value in analise.items():
-            if isinstance(value, ObjectId):
-                analise[key] = str(value)
+        # Textos gravados por referência (texto_original_ref + correcoes) voltam por extenso
+        analise = await analise_repository.resolver_textos(analise, redacao)
+        
+        # Expor _id interno como "id"; ObjectIds (inclusive aninhados) são convertidos na serialização
+        analise["id"] = analise.pop("_id", None)
         
-        # Remover _id interno
-        if "_id" in analise:
-            analise["id"] = str(analise["_id"])
-            del analise["_id"]
+        # Problemas gravados em colunas voltam ao formato de lista da API
+        if "problemas" in analise:
+            analise["problemas_gramaticais"] = ProblemasColumnar.from_bson(analise.pop("problemas")).to_list()
         
-        return analise
+        # Retornar a resposta diretamente evita o jsonable_encoder, que não conhece ObjectId
+        return MongoORJSONResponse(analise)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter análise: {str(e)}")
 
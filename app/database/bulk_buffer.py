@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+from bson import ObjectId
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from app.database.mongo_client import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class BulkBuffer:
+    """
+    Buffer de escritas que agrupa inserts de requisições concorrentes
+    em um único bulk_write por coleção.
+
+    O flush acontece a cada `flush_interval` segundos ou quando o buffer
+    atinge `max_ops` operações, o que acontecer primeiro.
+    """
+
+    def __init__(self, flush_interval: float = 0.025, max_ops: int = 500):
+        self.db = get_db()
+        self.flush_interval = flush_interval
+        self.max_ops = max_ops
+
+        # Operações pendentes por coleção: (InsertOne, future do chamador)
+        self._ops: Dict[str, List[Tuple[InsertOne, asyncio.Future]]] = defaultdict(list)
+        self._count = 0
+        self._flush_task = None
+
+    async def insert_one(self, collection_name: str, document: Dict[str, Any]) -> str:
+        """
+        Enfileira um insert e aguarda o flush do lote correspondente
+
+        Args:
+            collection_name: Nome da coleção de destino
+            document: Documento a ser inserido
+
+        Returns:
+            ID (pré-gerado) do documento inserido
+        """
+        # Gerar o ID no cliente para não depender da resposta do servidor
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+
+        future = asyncio.get_running_loop().create_future()
+        self._ops[collection_name].append((InsertOne(document), future))
+        self._count += 1
+
+        if self._count >= self.max_ops:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        await future
+        return str(document["_id"])
+
+    async def _flush_later(self):
+        """Aguarda a janela de agrupamento e dispara o flush"""
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Envia todas as operações pendentes, uma chamada bulk_write por coleção"""
+        if not self._count:
+            return
+
+        pending, self._ops = self._ops, defaultdict(list)
+        self._count = 0
+
+        for collection_name, batch in pending.items():
+            requests = [op for op, _ in batch]
+            try:
+                await self.db[collection_name].bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                # Com ordered=False apenas os documentos com erro falham
+                logger.error("Erro no bulk_write em %s: %s", collection_name, e.details)
+                failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+                for index, (_, future) in enumerate(batch):
+                    if future.done():
+                        continue
+                    if index in failed:
+                        future.set_exception(Exception(failed[index].get("errmsg", "Erro de escrita")))
+                    else:
+                        future.set_result(True)
+                continue
+            except Exception as e:
+                logger.error("Erro no bulk_write em %s: %s", collection_name, e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(True)
+
+
+# Instância única para uso na aplicação
+bulk_buffer = BulkBuffer()
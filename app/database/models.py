@@ -1,36 +1,45 @@
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
-from pydantic import BaseModel, Field, EmailStr
-from bson import ObjectId
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, GetCoreSchemaHandler, GetJsonSchemaHandler
+from pydantic_core import core_schema
+from bson import Binary, ObjectId
+import numpy as np
+
+
+def _validate_object_id(value: str) -> ObjectId:
+    if not ObjectId.is_valid(value):
+        raise ValueError("ObjectId inválido")
+    return ObjectId(value)
 
 
 # Classe auxiliar para lidar com ObjectId do MongoDB
 class PyObjectId(ObjectId):
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
-    
-    @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError("ObjectId inválido")
-        return ObjectId(v)
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        # Instâncias de ObjectId passam pela checagem isinstance do pydantic-core;
+        # apenas strings chegam ao validador Python
+        return core_schema.union_schema(
+            [
+                core_schema.is_instance_schema(ObjectId),
+                core_schema.chain_schema([
+                    core_schema.str_schema(),
+                    core_schema.no_info_plain_validator_function(_validate_object_id),
+                ]),
+            ],
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+        )
     
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler) -> Dict[str, Any]:
+        return {"type": "string"}
 
 
 # Modelo Base com ID MongoDB
+# Os campos de data não têm default: o chamador atribui um único datetime UTC por requisição
 class MongoBaseModel(BaseModel):
-    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
     
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {
-            ObjectId: str
-        }
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
 
 
 # Modelo de Usuário
@@ -39,7 +48,7 @@ class UserModel(MongoBaseModel):
     nome: str
     tipo: str = Field(..., description="professor|aluno|admin")
     instituicao: Optional[str] = None
-    data_cadastro: datetime = Field(default_factory=datetime.now)
+    data_cadastro: datetime
     ultimo_acesso: Optional[datetime] = None
     configuracoes: Dict[str, Any] = Field(default_factory=dict)
 
@@ -58,10 +67,11 @@ class RedacaoModel(MongoBaseModel):
     usuario_id: PyObjectId
     titulo: Optional[str] = None
     status: str = "pendente"  # pendente|processando|concluida|erro
-    data_envio: datetime = Field(default_factory=datetime.now)
+    data_envio: datetime
     data_conclusao: Optional[datetime] = None
     objeto_url: Optional[str] = None
     texto_extraido: str
+    content_hash: Optional[str] = None  # BLAKE2b (128 bits) do arquivo enviado
     metadata: Optional[MetadataModel] = Field(default_factory=MetadataModel)
 
 
@@ -74,6 +84,168 @@ class ProblemaGramaticalModel(BaseModel):
     posicao: List[int]
 
 
+# Campos de ProblemaGramaticalModel; as demais chaves vindas da IA vão em `extras`
+_CAMPOS_TEXTO_PROBLEMA = ("tipo", "texto_original", "sugestao", "explicacao")
+_CAMPOS_PROBLEMA = _CAMPOS_TEXTO_PROBLEMA + ("posicao",)
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def _texto_campo(valor: Any) -> str:
+    """Campo textual do problema: None vira "", escalares viram str"""
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float, bool)):
+        return str(valor)
+    raise ValueError(f"Campo textual inválido: {valor!r}")
+
+
+def _posicao_campo(valor: Any) -> tuple:
+    """(início, fim) de `posicao`; (-1, -1) quando ausente"""
+    if valor is None or valor == [] or valor == ():
+        return -1, -1
+    if not isinstance(valor, (list, tuple)) or len(valor) < 2:
+        raise ValueError(f"Posição inválida: {valor!r}")
+    ini, fim = valor[0], valor[1]
+    for v in (ini, fim):
+        # float só se for inteiro e finito (is_integer é falso para inf e nan)
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or (isinstance(v, float) and not v.is_integer()):
+            raise ValueError(f"Posição inválida: {valor!r}")
+    ini, fim = int(ini), int(fim)
+    if not (-1 <= ini <= _INT32_MAX and -1 <= fim <= _INT32_MAX):
+        raise ValueError(f"Posição fora do intervalo: {valor!r}")
+    return ini, fim
+
+
+class ProblemasColumnar(BaseModel):
+    """
+    Problemas gramaticais em colunas (SoA): posições e tipos em arrays NumPy
+    contíguos, textos em listas paralelas. No MongoDB os arrays são gravados
+    como BinData; ProblemaGramaticalModel é reconstruído sob demanda.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
+    posicoes_ini: np.ndarray  # int32, -1 quando ausente
+    posicoes_fim: np.ndarray  # int32, -1 quando ausente
+    tipo_codes: np.ndarray  # int32, índice em `tipos` (int8 em documentos antigos)
+    tipos: List[str]
+    textos_originais: List[str]
+    sugestoes: List[str]
+    explicacoes: List[str]
+    extras: Optional[List[Optional[Dict[str, Any]]]] = None  # chaves fora do modelo, por item
+    
+    @classmethod
+    def from_list(cls, problemas: List[Any]) -> "ProblemasColumnar":
+        """
+        Converte a lista de problemas (formato da IA) para colunas
+        
+        Cada item é validado e normalizado: textos nulos ou numéricos viram str
+        e chaves desconhecidas são preservadas em `extras`. Levanta ValueError
+        se algum item não puder ser representado (ver codificar_problemas).
+        """
+        tipos: Dict[str, int] = {}
+        n = len(problemas)
+        ini = np.full(n, -1, dtype=np.int32)
+        fim = np.full(n, -1, dtype=np.int32)
+        codes = np.empty(n, dtype=np.int32)
+        colunas: Dict[str, List[str]] = {campo: [] for campo in _CAMPOS_TEXTO_PROBLEMA}
+        extras: List[Optional[Dict[str, Any]]] = []
+        
+        for i, p in enumerate(problemas):
+            if not isinstance(p, dict):
+                raise ValueError(f"Problema não é um objeto: {p!r}")
+            for campo in _CAMPOS_TEXTO_PROBLEMA:
+                colunas[campo].append(_texto_campo(p.get(campo)))
+            ini[i], fim[i] = _posicao_campo(p.get("posicao"))
+            codes[i] = tipos.setdefault(colunas["tipo"][i], len(tipos))
+            extra = {k: v for k, v in p.items() if k not in _CAMPOS_PROBLEMA}
+            extras.append(extra or None)
+        
+        return cls(
+            posicoes_ini=ini,
+            posicoes_fim=fim,
+            tipo_codes=codes,
+            tipos=list(tipos),
+            textos_originais=colunas["texto_original"],
+            sugestoes=colunas["sugestao"],
+            explicacoes=colunas["explicacao"],
+            extras=extras if any(extras) else None
+        )
+    
+    @classmethod
+    def from_bson(cls, doc: Dict[str, Any]) -> "ProblemasColumnar":
+        n = len(doc["textos_originais"])
+        # Documentos anteriores gravavam os códigos em int8: a largura sai do tamanho
+        codes_dtype = np.int8 if n and len(doc["tipo_codes"]) == n else np.int32
+        return cls(
+            posicoes_ini=np.frombuffer(doc["posicoes_ini"], dtype=np.int32),
+            posicoes_fim=np.frombuffer(doc["posicoes_fim"], dtype=np.int32),
+            tipo_codes=np.frombuffer(doc["tipo_codes"], dtype=codes_dtype),
+            tipos=doc["tipos"],
+            textos_originais=doc["textos_originais"],
+            sugestoes=doc["sugestoes"],
+            explicacoes=doc["explicacoes"],
+            extras=doc.get("extras")
+        )
+    
+    def to_bson(self) -> Dict[str, Any]:
+        doc = {
+            "posicoes_ini": Binary(self.posicoes_ini.tobytes()),
+            "posicoes_fim": Binary(self.posicoes_fim.tobytes()),
+            "tipo_codes": Binary(self.tipo_codes.tobytes()),
+            "tipos": self.tipos,
+            "textos_originais": self.textos_originais,
+            "sugestoes": self.sugestoes,
+            "explicacoes": self.explicacoes
+        }
+        if self.extras is not None:
+            doc["extras"] = self.extras
+        return doc
+    
+    def __len__(self) -> int:
+        return len(self.tipo_codes)
+    
+    def __getitem__(self, i: int) -> ProblemaGramaticalModel:
+        return ProblemaGramaticalModel(
+            tipo=self.tipos[self.tipo_codes[i]],
+            texto_original=self.textos_originais[i],
+            sugestao=self.sugestoes[i],
+            explicacao=self.explicacoes[i],
+            posicao=[int(self.posicoes_ini[i]), int(self.posicoes_fim[i])]
+        )
+    
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Visão em lista de dicts, o formato exposto pela API (com as chaves extras)"""
+        itens = [self[i].model_dump() for i in range(len(self))]
+        if self.extras is not None:
+            for item, extra in zip(itens, self.extras):
+                if extra:
+                    item.update(extra)
+        return itens
+    
+    def contagem_por_tipo(self) -> Dict[str, int]:
+        """Histograma de problemas por tipo, calculado sobre a coluna de códigos"""
+        contagem = np.bincount(self.tipo_codes, minlength=len(self.tipos))
+        return {tipo: int(c) for tipo, c in zip(self.tipos, contagem)}
+
+
+def codificar_problemas(problemas: Any) -> Dict[str, Any]:
+    """
+    Campos do documento de análise para os problemas gramaticais
+    
+    Em colunas ({"problemas": ...}) quando todos os itens puderem ser normalizados;
+    senão a lista original é gravada como veio ({"problemas_gramaticais": [...]}),
+    para que uma resposta malformada da IA não derrube a análise inteira.
+    """
+    if not isinstance(problemas, list):
+        return {"problemas_gramaticais": problemas if problemas is not None else []}
+    try:
+        return {"problemas": ProblemasColumnar.from_list(problemas).to_bson()}
+    except ValueError:
+        return {"problemas_gramaticais": problemas}
+
+
 class AnaliseEstruturalModel(BaseModel):
     introducao: Dict[str, Any]
     desenvolvimento: Dict[str, Any]
@@ -117,15 +289,38 @@ class NotaAvaliacaoModel(BaseModel):
     pontos_melhorar: List[str]
 
 
+def aplicar_correcoes(texto: str, correcoes: List[Dict[str, Any]]) -> str:
+    """
+    Reconstrói o texto corrigido a partir do original e da lista de correções
+    
+    Cada correção é {"pos": início no texto original, "del": caracteres removidos,
+    "ins": texto inserido}; as posições não podem se sobrepor.
+    """
+    partes = []
+    cursor = 0
+    for c in sorted(correcoes, key=lambda c: c["pos"]):
+        partes.append(texto[cursor:c["pos"]])
+        partes.append(c["ins"])
+        cursor = c["pos"] + c["del"]
+    partes.append(texto[cursor:])
+    return "".join(partes)
+
+
 # Modelo completo de Análise
+# O texto pode vir por extenso (texto_original/texto_corrigido) ou por referência:
+# texto_original_ref aponta para a redação (texto_extraido) e correcoes guarda apenas
+# o diff, reconstruído com aplicar_correcoes
 class AnaliseModel(MongoBaseModel):
     redacao_id: PyObjectId
     usuario_id: PyObjectId
-    texto_original: str
-    texto_corrigido: str
+    texto_original: Optional[str] = None
+    texto_corrigido: Optional[str] = None
+    texto_original_ref: Optional[PyObjectId] = None
+    correcoes: Optional[List[Dict[str, Any]]] = None
     resumo_executivo: str
     metricas: MetricasTextoModel
-    problemas_gramaticais: List[ProblemaGramaticalModel]
+    problemas: Optional[ProblemasColumnar] = None
+    problemas_gramaticais: Optional[List[Any]] = None  # lista bruta quando não normalizável
     analise_estrutural: AnaliseEstruturalModel
     analise_coesao: AnaliseCoesaoModel
     analise_vocabulario: AnaliseVocabularioModel
@@ -133,7 +328,7 @@ class AnaliseModel(MongoBaseModel):
     notas: List[NotaAvaliacaoModel]
     nota_geral: float
     recomendacoes: List[str]
-    data_analise: datetime = Field(default_factory=datetime.now)
+    data_analise: datetime
     tempo_processamento_ms: Optional[int] = None
 
 
@@ -142,9 +337,11 @@ class EmbeddingModel(MongoBaseModel):
     redacao_id: PyObjectId
     titulo: Optional[str] = None
     texto_snippet: str  # Primeiros 1000 caracteres para exibição
-    vector_embedding: List[float]
+    vector_embedding: Union[bytes, List[float]]  # BinData vector int8 ou float32 (ver vector_codec)
+    vector_scale: Optional[float] = None  # Escala para dequantizar: q * scale / 127
+    text_sha256: Optional[str] = None  # SHA-256 do texto que originou o vetor
     modelo_embedding: str = "text-embedding-3-small"  # Modelo usado para gerar o embedding
-    data_criacao: datetime = Field(default_factory=datetime.now)
+    data_criacao: datetime
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
@@ -157,7 +354,7 @@ class CorpusExemploModel(MongoBaseModel):
     temas: List[str] = Field(default_factory=list)
     nivel_qualidade: float
     vector_embedding: Optional[List[float]] = None
-    data_adicao: datetime = Field(default_factory=datetime.now)
+    data_adicao: datetime
 
 
 # Modelo de Feedback
@@ -166,4 +363,4 @@ class FeedbackModel(MongoBaseModel):
     usuario_id: PyObjectId
     avaliacao: str  # util|parcial|inutil
     comentario: Optional[str] = None
-    data_feedback: datetime = Field(default_factory=datetime.now)
+    data_feedback: datetime
@@ -1,17 +1,55 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
 from pymongo.errors import ConnectionFailure, OperationFailure
 import os
+import asyncio
+import time
 from dotenv import load_dotenv
 import logging
 from typing import Optional, Dict, Any
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Coleções da aplicação e seus índices
+COLLECTION_INDEXES = {
+    "users": [IndexModel("email", unique=True)],
+    "redacoes": [
+        # find_by_user: filtro por usuário, mais recentes primeiro
+        IndexModel([("usuario_id", ASCENDING), ("data_envio", DESCENDING)]),
+        IndexModel("data_envio"),
+        IndexModel("status"),
+        # Não é único: reenvios concorrentes do mesmo arquivo podem coexistir enquanto processam
+        IndexModel("content_hash"),
+    ],
+    # redacao_id também é a chave do $lookup das buscas de redações similares; não é
+    # único para não impedir a inicialização em bases com análises reprocessadas
+    "analises": [IndexModel("redacao_id"), IndexModel("usuario_id")],
+    # O índice vetorial de embeddings é criado à parte, pois depende do Atlas
+    "embeddings": [IndexModel("redacao_id", unique=True)],
+    "corpus_exemplos": [
+        # enrich_with_rag e find_by_categoria: categoria + nivel_qualidade mínimo
+        IndexModel([("categoria", ASCENDING), ("nivel_qualidade", DESCENDING)]),
+        IndexModel("nivel_qualidade"),
+        IndexModel("temas"),
+        IndexModel([("texto", TEXT)]),
+    ],
+    "feedbacks": [IndexModel("analise_id")],
+}
+
+# Índice Atlas Vector Search sobre os embeddings (text-embedding-3-small)
+VECTOR_INDEX_NAME = "vector_index"
+VECTOR_INDEX_DEFINITION = {
+    "fields": [{
+        "type": "vector",
+        "path": "vector_embedding",
+        "numDimensions": 1536,
+        "similarity": "cosine"
+    }]
+}
+
 class MongoDB:
     _instance = None
     
@@ -30,92 +68,108 @@ class MongoDB:
             mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
             db_name = os.getenv("MONGODB_DBNAME", "elysia")
             
-            # Conectar ao MongoDB
-            self.client = MongoClient(mongo_uri)
-            
-            # Verificar conexão
-            self.client.admin.command('ping')
+            # Conectar ao MongoDB (Motor conecta sob demanda, sem bloquear o event loop);
+            # o pool é ajustável por processo (API, worker, scripts)
+            self.client = AsyncIOMotorClient(
+                mongo_uri,
+                maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+                minPoolSize=int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+                waitQueueTimeoutMS=int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "0")) or None,
+                serverSelectionTimeoutMS=int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+            )
             
             # Acessar o banco de dados
             self.db = self.client[db_name]
             
-            logger.info(f"Conexão com MongoDB estabelecida: {db_name}")
-            
-            # Inicializar índices e coleções
-            self._setup_collections()
+            logger.info("Cliente MongoDB configurado: %s", db_name)
             
         except ConnectionFailure as e:
-            logger.error(f"Falha ao conectar ao MongoDB: {e}")
+            logger.error("Falha ao conectar ao MongoDB: %s", e)
             raise
     
-    def _setup_collections(self):
-        """Configura coleções e índices necessários"""
-        # Coleção de usuários
-        if "users" not in self.db.list_collection_names():
-            self.db.create_collection("users")
-        
-        # Índices para usuários
-        self.db.users.create_index("email", unique=True)
+    async def ensure_indexes(self):
+        """Verifica a conexão e configura coleções e índices necessários"""
+        try:
+            # Verificar conexão
+            await self.client.admin.command('ping')
+        except ConnectionFailure as e:
+            logger.error("Falha ao conectar ao MongoDB: %s", e)
+            raise
         
-        # Coleção de redações
-        if "redacoes" not in self.db.list_collection_names():
-            self.db.create_collection("redacoes")
+        await self._setup_collections()
+    
+    async def warm_pool(self, connections: int):
+        """
+        Abre `connections` conexões do pool com pings simultâneos
         
-        # Índices para redações
-        self.db.redacoes.create_index("usuario_id")
-        self.db.redacoes.create_index("data_envio")
-        self.db.redacoes.create_index("status")
+        Antes de uma rajada de escritas concorrentes: handshake e descoberta da
+        topologia acontecem aqui, e não na primeira escrita de cada conexão.
+        """
+        await asyncio.gather(*(self.client.admin.command('ping') for _ in range(connections)))
+    
+    async def _setup_collections(self):
+        """Configura coleções e índices necessários"""
+        # Criar coleções ausentes (nomes existentes obtidos em uma única consulta)
+        existentes = set(await self.db.list_collection_names())
+        for nome in COLLECTION_INDEXES:
+            if nome not in existentes:
+                await self.db.create_collection(nome)
         
-        # Coleção de análises
-        if "analises" not in self.db.list_collection_names():
-            self.db.create_collection("analises")
+        # Um createIndexes por coleção
+        for nome, indexes in COLLECTION_INDEXES.items():
+            await self.db[nome].create_indexes(indexes)
         
-        # Índices para análises
-        self.db.analises.create_index("redacao_id")
-        self.db.analises.create_index("usuario_id")
+        await self.ensure_vector_index()
         
-        # Coleção de embeddings para RAG
-        if "embeddings" not in self.db.list_collection_names():
-            self.db.create_collection("embeddings")
+        logger.info("Configuração de coleções e índices concluída")
+    
+    async def ensure_vector_index(self, timeout: float = 60.0) -> bool:
+        """
+        Garante o índice Atlas Vector Search dos embeddings
         
-        # Índices para embeddings - incluindo índice vetorial se disponível
-        self.db.embeddings.create_index("redacao_id", unique=True)
+        Cria o índice se não existir e aguarda até `timeout` segundos que fique
+        consultável. Fora do Atlas o comando falha e a aplicação usa a busca
+        alternativa em memória.
         
+        Returns:
+            True se o índice estiver pronto para consultas
+        """
         try:
-            # Criar índice vetorial (MongoDB 5.0+ com Atlas)
-            self.db.command({
-                "createIndexes": "embeddings",
-                "indexes": [{
-                    "name": "vector_index",
-                    "key": {"vector_embedding": "vector"},
-                    "vectorOptions": {"dimension": 1536, "similarity": "cosine"}
-                }]
-            })
-            logger.info("Índice vetorial criado com sucesso")
+            indexes = await self.db.embeddings.aggregate(
+                [{"$listSearchIndexes": {"name": VECTOR_INDEX_NAME}}]
+            ).to_list(length=1)
+            
+            if not indexes:
+                # pymongo 4.6 não aceita `type` em SearchIndexModel: usar o comando direto
+                await self.db.command({
+                    "createSearchIndexes": "embeddings",
+                    "indexes": [{
+                        "name": VECTOR_INDEX_NAME,
+                        "type": "vectorSearch",
+                        "definition": VECTOR_INDEX_DEFINITION
+                    }]
+                })
+                logger.info("Índice vetorial criado; aguardando ficar consultável")
+            
+            prazo = time.monotonic() + timeout
+            while True:
+                if indexes and indexes[0].get("queryable"):
+                    return True
+                if time.monotonic() >= prazo:
+                    logger.warning("Índice vetorial ainda não consultável - usando busca alternativa")
+                    return False
+                await asyncio.sleep(2)
+                indexes = await self.db.embeddings.aggregate(
+                    [{"$listSearchIndexes": {"name": VECTOR_INDEX_NAME}}]
+                ).to_list(length=1)
         except OperationFailure as e:
-            logger.warning(f"Não foi possível criar índice vetorial: {e}")
+            logger.warning("Não foi possível criar índice vetorial: %s", e)
             logger.info("Índice vetorial não disponível - usando busca alternativa")
-        
-        # Coleção de corpus de exemplos
-        if "corpus_exemplos" not in self.db.list_collection_names():
-            self.db.create_collection("corpus_exemplos")
-        
-        # Índices para corpus
-        self.db.corpus_exemplos.create_index("categoria")
-        self.db.corpus_exemplos.create_index([("texto", "text")])
-        
-        # Coleção de feedback
-        if "feedbacks" not in self.db.list_collection_names():
-            self.db.create_collection("feedbacks")
-        
-        # Índices para feedback
-        self.db.feedbacks.create_index("analise_id")
-        
-        logger.info("Configuração de coleções e índices concluída")
+            return False
     
     def get_db(self):
         """Retorna a referência ao banco de dados"""
-        if not self.db:
+        if self.db is None:
             self.initialize_connection()
         return self.db
     
@@ -1,26 +1,72 @@
 import os
-import json
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
+import asyncio
 import logging
+from pathlib import Path
 from bson import ObjectId
+from pymongo import UpdateOne
+
+# Numba é opcional: sem ele, os scores vêm sempre do produto matriz-vetor (BLAS)
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 # OpenAI para geração de embeddings
 from openai import OpenAI
 
 # Importar cliente MongoDB
-from app.database.mongo_client import get_db
+from app.database.mongo_client import get_db, mongo_client, VECTOR_INDEX_NAME
+from app.database.vector_codec import encode_vector, decode_vector
+from app.database.repositories import redacao_repository, IdLike, _oid
+from app.utils.file_processor import file_processor
 from app.database.models import (
     EmbeddingModel,
     RedacaoModel,
     CorpusExemploModel
 )
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Modelo de embedding e limites por requisição à API
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+EMBEDDING_MAX_CHARS = 8000
+EMBEDDING_BATCH_SIZE = 96
+EMBEDDING_CACHE_SIZE = 10_000
+
+# Segundo nível do cache de embeddings, em disco e persistente entre execuções
+# (um .npy float32 por SHA-256(modelo + texto)); vazio desativa
+EMBEDDING_DISK_CACHE_DIR = os.getenv("EMBEDDING_DISK_CACHE_DIR", "data/embeddings_cache")
+
+# Abaixo deste número de linhas o custo de despacho do BLAS domina a consulta
+JIT_MAX_ROWS = 500
+
+# Corpus em memória em float16 (metade da banda de memória por consulta),
+# convertido para float32 em blocos de CORPUS_TILE_ROWS linhas (~768 KB)
+CORPUS_DTYPE = np.float16
+CORPUS_TILE_ROWS = 128
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dot_rows(M, q, out):
+        """Produto escalar de cada linha (já normalizada) com a consulta"""
+        for i in prange(M.shape[0]):
+            s = 0.0
+            for j in range(M.shape[1]):
+                s += M[i, j] * q[j]
+            out[i] = s
+
+def num_candidates(limit: int) -> int:
+    """Candidatos explorados no HNSW: margem maior que o limite melhora o recall"""
+    return max(limit * 20, 150)
+
 class RAGManager:
     def __init__(self):
         # Obter conexão com MongoDB
@@ -33,22 +79,80 @@ class RAGManager:
         
         self.openai_client = OpenAI(api_key=api_key) if api_key else None
         
-        # Verificar se há suporte a índice vetorial
-        self.has_vector_search = self._check_vector_search()
+        # Cache LRU de embeddings por SHA-256(modelo + texto); protegido por lock
+        # porque generate_embedding também roda em threads (asyncio.to_thread)
+        self._emb_cache: "OrderedDict[bytes, Tuple[float, ...]]" = OrderedDict()
+        self._emb_cache_lock = threading.Lock()
+        
+        # Suporte a índice vetorial é verificado na primeira busca (requer event loop)
+        self.has_vector_search = None
+        
+        # Cache do corpus para a busca alternativa sem índice vetorial, carregado na
+        # primeira consulta: matriz (N, 1536) float16 com linhas normalizadas e
+        # metadados em listas paralelas (uma entrada por linha)
+        self._corpus: Optional[np.ndarray] = None
+        self._corpus_ids: List[ObjectId] = []  # redacao_id
+        self._corpus_doc_ids: List[Optional[ObjectId]] = []  # _id do embedding
+        self._corpus_titulos: List[Optional[str]] = []
+        self._corpus_snippets: List[str] = []
+        self._corpus_pos: Dict[ObjectId, int] = {}
     
-    def _check_vector_search(self) -> bool:
-        """Verifica se o MongoDB suporta busca vetorial"""
+    async def _check_vector_search(self) -> bool:
+        """Verifica (criando se necessário) o índice vetorial; executado uma vez por processo"""
         try:
-            # Tenta uma consulta simples para verificar se o índice vetorial está disponível
-            _ = self.db.command({
-                "listSearchIndexes": "embeddings",
-                "name": "vector_index"
-            })
-            return True
+            return await mongo_client.ensure_vector_index(timeout=0)
         except Exception as e:
-            logger.warning(f"Busca vetorial não disponível: {e}")
+            logger.warning("Busca vetorial não disponível: %s", e)
             return False
     
+    @staticmethod
+    def _embedding_cache_key(text: str) -> bytes:
+        return hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode("utf-8")).digest()
+    
+    @staticmethod
+    def _disk_cache_path(key: bytes) -> Optional[Path]:
+        if not EMBEDDING_DISK_CACHE_DIR:
+            return None
+        return Path(EMBEDDING_DISK_CACHE_DIR) / f"{key.hex()}.npy"
+    
+    def _cache_get(self, key: bytes) -> Optional[List[float]]:
+        with self._emb_cache_lock:
+            vector = self._emb_cache.get(key)
+            if vector is not None:
+                self._emb_cache.move_to_end(key)
+                return list(vector)
+        
+        # Ausente da memória: tentar o cache em disco
+        path = self._disk_cache_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            vector = np.load(path).tolist()
+        except Exception as e:
+            logger.warning("Erro ao ler embedding em cache (%s): %s", path.name, e)
+            return None
+        self._cache_put(key, vector, persist=False)
+        return vector
+    
+    def _cache_put(self, key: bytes, vector: List[float], persist: bool = True):
+        with self._emb_cache_lock:
+            self._emb_cache[key] = tuple(vector)
+            self._emb_cache.move_to_end(key)
+            if len(self._emb_cache) > EMBEDDING_CACHE_SIZE:
+                self._emb_cache.popitem(last=False)
+        
+        path = self._disk_cache_path(key) if persist else None
+        if path is None:
+            return
+        try:
+            # Gravar em arquivo temporário e renomear: API e workers compartilham o diretório
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+            np.save(tmp_path, np.asarray(vector, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning("Erro ao salvar embedding em cache: %s", e)
+    
     def generate_embedding(self, text: str) -> List[float]:
         """
         Gera um embedding para o texto usando OpenAI API
@@ -58,27 +162,88 @@ class RAGManager:
         
         Returns:
             Lista de floats representando o embedding
+        
+        Raises:
+            ValueError: se o texto estiver vazio
         """
         if not self.openai_client:
             raise ValueError("OpenAI API não configurada. Defina OPENAI_API_KEY.")
         
+        # Processar texto para embedding (limitar tamanho para evitar tokens excessivos)
+        text = (text or "").strip()[:EMBEDDING_MAX_CHARS]
+        if not text:
+            raise ValueError("Texto vazio: não é possível gerar embedding")
+        key = self._embedding_cache_key(text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Processar texto para embedding (limitar tamanho para evitar tokens excessivos)
-            text = text[:8000]  # Limitar para evitar exceder limite de tokens
-            
             response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
+                model=EMBEDDING_MODEL,
                 input=text
             )
             
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            self._cache_put(key, embedding)
+            return embedding
         
         except Exception as e:
-            logger.error(f"Erro ao gerar embedding: {e}")
-            # Fallback: embedding de zeros (não ideal, apenas para evitar falhas completas)
-            return [0.0] * 1536  # Dimensão do modelo text-embedding-3-small
+            # Sem fallback de zeros: um vetor nulo seria gravado e distorceria as buscas
+            logger.error("Erro ao gerar embedding: %s", e)
+            raise
+    
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings para vários textos em uma única requisição à API
+        
+        Listas maiores que EMBEDDING_BATCH_SIZE são enviadas em várias requisições
+        de até EMBEDDING_BATCH_SIZE textos.
+        
+        Args:
+            texts: Textos para gerar embeddings
+        
+        Returns:
+            Embeddings na mesma ordem dos textos
+        """
+        if not self.openai_client:
+            raise ValueError("OpenAI API não configurada. Defina OPENAI_API_KEY.")
+        
+        texts = [(text or "").strip()[:EMBEDDING_MAX_CHARS] for text in texts]
+        if not all(texts):
+            raise ValueError("Texto vazio: não é possível gerar embedding")
+        keys = [self._embedding_cache_key(text) for text in texts]
+        embeddings = [self._cache_get(key) for key in keys]
+        
+        # Enviar à API apenas os textos ausentes do cache
+        faltantes = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        for inicio in range(0, len(faltantes), EMBEDDING_BATCH_SIZE):
+            lote = faltantes[inicio:inicio + EMBEDDING_BATCH_SIZE]
+            response = self.openai_client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=[texts[i] for i in lote]
+            )
+            
+            # A API devolve os itens com `index`; não depender da ordem da resposta
+            for d in response.data:
+                i = lote[d.index]
+                embeddings[i] = d.embedding
+                self._cache_put(keys[i], d.embedding)
+        
+        return embeddings
     
-    async def store_redacao_embedding(self, redacao_id: str, texto: str, titulo: Optional[str] = None) -> str:
+    @staticmethod
+    def _text_sha256(texto: str) -> str:
+        """Hash do texto de origem, gravado junto ao vetor para detectar reenvios idênticos"""
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+    
+    async def store_redacao_embedding(
+        self,
+        redacao_id: IdLike,
+        texto: str,
+        titulo: Optional[str] = None,
+        embedding: Optional[List[float]] = None
+    ) -> str:
         """
         Gera e armazena embedding para uma redação
         
@@ -86,57 +251,141 @@ class RAGManager:
             redacao_id: ID da redação no MongoDB
             texto: Texto completo da redação
             titulo: Título opcional da redação
+            embedding: Embedding já calculado (ex.: em lote); gerado se omitido
         
         Returns:
             ID do embedding armazenado
         """
         try:
-            # Converter string para ObjectId
-            redacao_obj_id = ObjectId(redacao_id)
+            # Converter para ObjectId apenas se vier como string
+            redacao_obj_id = _oid(redacao_id)
             
             # Verificar se já existe embedding para esta redação
-            existing = self.db.embeddings.find_one({"redacao_id": redacao_obj_id})
+            existing = await self.db.embeddings.find_one({"redacao_id": redacao_obj_id})
+            text_sha256 = self._text_sha256(texto)
+            if existing and existing.get("text_sha256") == text_sha256:
+                # Mesmo texto já embedado: preservar o vetor e evitar a chamada à API
+                logger.info("Embedding da redação %s já está atualizado", redacao_id)
+                return str(existing["_id"])
+            
             if existing:
-                logger.info(f"Embedding já existe para redação {redacao_id}. Atualizando...")
+                logger.info("Embedding já existe para redação %s. Atualizando...", redacao_id)
                 # Atualizar com novo embedding
-                embedding_vector = self.generate_embedding(texto)
+                embedding_vector = embedding or await asyncio.to_thread(self.generate_embedding, texto)
+                vector_bin, vector_scale = encode_vector(embedding_vector)
                 
-                self.db.embeddings.update_one(
+                await self.db.embeddings.update_one(
                     {"_id": existing["_id"]},
                     {"$set": {
-                        "vector_embedding": embedding_vector,
+                        "vector_embedding": vector_bin,
+                        "vector_scale": vector_scale,
+                        "text_sha256": text_sha256,
                         "texto_snippet": texto[:1000],
                         "titulo": titulo,
-                        "data_criacao": datetime.now()
+                        "data_criacao": datetime.now(timezone.utc)
                     }}
                 )
                 
+                self.update_corpus(redacao_obj_id, embedding_vector, titulo, texto[:1000], existing["_id"])
+                
                 return str(existing["_id"])
             
             # Criar novo embedding
-            embedding_vector = self.generate_embedding(texto)
+            embedding_vector = embedding or await asyncio.to_thread(self.generate_embedding, texto)
+            vector_bin, vector_scale = encode_vector(embedding_vector)
             
             # Criar documento de embedding
             embedding_doc = {
                 "redacao_id": redacao_obj_id,
                 "titulo": titulo,
                 "texto_snippet": texto[:1000],  # Primeiros 1000 caracteres para exibição
-                "vector_embedding": embedding_vector,
+                "vector_embedding": vector_bin,
+                "vector_scale": vector_scale,
+                "text_sha256": text_sha256,
                 "modelo_embedding": "text-embedding-3-small",
-                "data_criacao": datetime.now(),
+                "data_criacao": datetime.now(timezone.utc),
                 "metadata": {}
             }
             
             # Inserir no MongoDB
-            result = self.db.embeddings.insert_one(embedding_doc)
+            result = await self.db.embeddings.insert_one(embedding_doc)
+            self.update_corpus(redacao_obj_id, embedding_vector, titulo, texto[:1000], result.inserted_id)
             
-            logger.info(f"Embedding armazenado para redação {redacao_id}")
+            logger.info("Embedding armazenado para redação %s", redacao_id)
             return str(result.inserted_id)
         
         except Exception as e:
-            logger.error(f"Erro ao armazenar embedding: {e}")
+            logger.error("Erro ao armazenar embedding: %s", e)
             raise
     
+    async def store_many(self, redacoes: List[Dict[str, Any]]) -> int:
+        """
+        Gera e armazena embeddings de várias redações, agrupando as chamadas à API
+        
+        Args:
+            redacoes: Itens com "redacao_id", "texto" e "titulo" (opcional)
+        
+        Returns:
+            Número de embeddings gravados
+        """
+        # Textos vazios não geram embedding
+        redacoes = [r for r in redacoes if (r.get("texto") or "").strip()]
+        
+        # Descartar redações cujo texto é idêntico ao já embedado
+        hashes = {str(r["redacao_id"]): self._text_sha256(r["texto"]) for r in redacoes}
+        atuais = {
+            str(doc["redacao_id"]): doc.get("text_sha256")
+            async for doc in self.db.embeddings.find(
+                {"redacao_id": {"$in": [ObjectId(rid) for rid in hashes]}},
+                {"redacao_id": 1, "text_sha256": 1}
+            )
+        }
+        redacoes = [r for r in redacoes if atuais.get(str(r["redacao_id"])) != hashes[str(r["redacao_id"])]]
+        
+        total = 0
+        for inicio in range(0, len(redacoes), EMBEDDING_BATCH_SIZE):
+            lote = redacoes[inicio:inicio + EMBEDDING_BATCH_SIZE]
+            
+            # Uma requisição à API por lote, fora do event loop (cliente síncrono)
+            embeddings = await asyncio.to_thread(
+                self.generate_embeddings, [r["texto"] for r in lote]
+            )
+            
+            agora = datetime.now(timezone.utc)
+            operacoes = []
+            for r, embedding_vector in zip(lote, embeddings):
+                vector_bin, vector_scale = encode_vector(embedding_vector)
+                operacoes.append(UpdateOne(
+                    {"redacao_id": ObjectId(r["redacao_id"])},
+                    {
+                        "$set": {
+                            "titulo": r.get("titulo"),
+                            "texto_snippet": r["texto"][:1000],
+                            "vector_embedding": vector_bin,
+                            "vector_scale": vector_scale,
+                            "text_sha256": hashes[str(r["redacao_id"])],
+                            "modelo_embedding": EMBEDDING_MODEL,
+                            "data_criacao": agora
+                        },
+                        "$setOnInsert": {"metadata": {}}
+                    },
+                    upsert=True
+                ))
+            
+            result = await self.db.embeddings.bulk_write(operacoes, ordered=False)
+            
+            # Só os documentos inseridos têm _id na resposta; para os atualizados
+            # update_corpus preserva o valor já conhecido
+            for i, (r, embedding_vector) in enumerate(zip(lote, embeddings)):
+                self.update_corpus(
+                    r["redacao_id"], embedding_vector, r.get("titulo"), r["texto"][:1000],
+                    result.upserted_ids.get(i)
+                )
+            total += len(lote)
+        
+        logger.info("%s embeddings armazenados em lote", total)
+        return total
+    
     async def vector_search(self, query_text: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Realiza busca vetorial por similaridade
@@ -148,11 +397,17 @@ class RAGManager:
         Returns:
             Lista de documentos similares
         """
+        if not (query_text or "").strip():
+            return []
+        
         # Gerar embedding para a consulta
-        query_embedding = self.generate_embedding(query_text)
+        query_embedding = await asyncio.to_thread(self.generate_embedding, query_text)
         
         results = []
         
+        if self.has_vector_search is None:
+            self.has_vector_search = await self._check_vector_search()
+        
         # Se tiver índice vetorial disponível, usar busca nativa
         if self.has_vector_search:
             try:
@@ -160,10 +415,10 @@ class RAGManager:
                 pipeline = [
                     {
                         "$vectorSearch": {
-                            "index": "vector_index",
+                            "index": VECTOR_INDEX_NAME,
                             "queryVector": query_embedding,
                             "path": "vector_embedding",
-                            "numCandidates": limit * 10,
+                            "numCandidates": num_candidates(limit),
                             "limit": limit
                         }
                     },
@@ -178,58 +433,228 @@ class RAGManager:
                     }
                 ]
                 
-                results = list(self.db.embeddings.aggregate(pipeline))
+                results = await self.db.embeddings.aggregate(pipeline).to_list(length=limit)
                 
             except Exception as e:
-                logger.error(f"Erro na busca vetorial: {e}")
+                logger.error("Erro na busca vetorial: %s", e)
                 # Fallback para busca alternativa
         
-        # Se não tiver índice vetorial ou falhar, usar método alternativo
+        # Se não tiver índice vetorial ou falhar, usar método alternativo:
+        # um único produto matriz-vetor sobre o corpus normalizado em memória
         if not results:
-            # Buscar todos os embeddings
-            all_embeddings = list(self.db.embeddings.find({}, {
-                "_id": 1,
-                "redacao_id": 1, 
-                "titulo": 1,
-                "texto_snippet": 1,
-                "vector_embedding": 1
-            }))
+            if self._corpus is None:
+                await self._load_corpus()
             
-            # Calcular similaridade manualmente
-            similarities = []
-            for doc in all_embeddings:
-                if "vector_embedding" in doc:
-                    # Calcular similaridade de cosseno
-                    doc_vector = doc["vector_embedding"]
-                    similarity = self._cosine_similarity(query_embedding, doc_vector)
-                    
-                    similarities.append({
-                        "_id": doc["_id"],
-                        "redacao_id": doc["redacao_id"],
-                        "titulo": doc.get("titulo"),
-                        "texto_snippet": doc.get("texto_snippet", ""),
-                        "score": similarity
-                    })
-            
-            # Ordenar por similaridade e pegar os top N
-            similarities.sort(key=lambda x: x["score"], reverse=True)
-            results = similarities[:limit]
+            results = [
+                {
+                    "_id": self._corpus_doc_ids[i],
+                    "redacao_id": self._corpus_ids[i],
+                    "titulo": self._corpus_titulos[i],
+                    "texto_snippet": self._corpus_snippets[i],
+                    "score": score
+                }
+                for i, score in self._top_k(query_embedding, limit)
+            ]
         
         return results
     
+    async def _load_corpus(self):
+        """Carrega todos os embeddings em uma matriz float16 com linhas normalizadas"""
+        docs = await self.db.embeddings.find(
+            {"vector_embedding": {"$exists": True}},
+            {"_id": 1, "redacao_id": 1, "titulo": 1, "texto_snippet": 1, "vector_embedding": 1}
+        ).to_list(length=None)
+        
+        self._corpus_ids = [doc["redacao_id"] for doc in docs]
+        self._corpus_doc_ids = [doc["_id"] for doc in docs]
+        self._corpus_titulos = [doc.get("titulo") for doc in docs]
+        self._corpus_snippets = [doc.get("texto_snippet", "") for doc in docs]
+        self._corpus_pos = {redacao_id: i for i, redacao_id in enumerate(self._corpus_ids)}
+        if not docs:
+            self._corpus = np.empty((0, EMBEDDING_DIM), dtype=CORPUS_DTYPE)
+            return
+        
+        # A escala int8 é irrelevante aqui: as linhas são normalizadas em seguida
+        corpus = np.stack([decode_vector(doc["vector_embedding"]) for doc in docs])
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True).clip(min=1e-12)
+        self._corpus = corpus.astype(CORPUS_DTYPE)
+    
+    def invalidate_cache(self):
+        """Descarta o corpus em memória; a próxima consulta o recarrega do banco"""
+        self._corpus = None
+        self._corpus_ids = []
+        self._corpus_doc_ids = []
+        self._corpus_titulos = []
+        self._corpus_snippets = []
+        self._corpus_pos = {}
+    
+    def update_corpus(
+        self,
+        redacao_id: Any,
+        embedding: List[float],
+        titulo: Optional[str] = None,
+        texto_snippet: str = "",
+        embedding_id: Optional[Any] = None
+    ):
+        """Insere ou substitui a linha de uma redação na matriz em memória"""
+        if self._corpus is None:
+            # Ainda não carregada: a próxima consulta lerá o embedding do banco
+            return
+        
+        redacao_obj_id = ObjectId(redacao_id) if not isinstance(redacao_id, ObjectId) else redacao_id
+        embedding_obj_id = ObjectId(embedding_id) if embedding_id is not None else None
+        # Cópia: a normalização in-place não pode alterar o array do chamador
+        row = np.array(embedding, dtype=np.float32)
+        row /= max(float(np.linalg.norm(row)), 1e-12)
+        row = row.astype(CORPUS_DTYPE)
+        
+        pos = self._corpus_pos.get(redacao_obj_id)
+        if pos is not None:
+            self._corpus[pos] = row
+            self._corpus_titulos[pos] = titulo
+            self._corpus_snippets[pos] = texto_snippet
+            if embedding_obj_id is not None:
+                self._corpus_doc_ids[pos] = embedding_obj_id
+        else:
+            self._corpus = np.vstack([self._corpus, row])
+            self._corpus_pos[redacao_obj_id] = len(self._corpus_ids)
+            self._corpus_ids.append(redacao_obj_id)
+            self._corpus_doc_ids.append(embedding_obj_id)
+            self._corpus_titulos.append(titulo)
+            self._corpus_snippets.append(texto_snippet)
+    
+    def _top_k(self, embedding: List[float], k: int) -> List[Tuple[int, float]]:
+        """Índices e scores das k linhas do corpus mais similares, em ordem decrescente"""
+        k = min(k, len(self._corpus_ids))
+        if k == 0:
+            return []
+        
+        query = np.array(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        
+        # A matriz fica em float16; cada bloco é convertido para float32 antes do
+        # produto, de modo que a acumulação é em float32 e o bloco cabe no cache L2
+        n = len(self._corpus_ids)
+        scores = np.empty(n, dtype=np.float32)
+        use_jit = HAS_NUMBA and n < JIT_MAX_ROWS
+        for inicio in range(0, n, CORPUS_TILE_ROWS):
+            fim = min(inicio + CORPUS_TILE_ROWS, n)
+            tile = self._corpus[inicio:fim].astype(np.float32)
+            if use_jit:
+                _dot_rows(tile, query, scores[inicio:fim])
+            else:
+                np.matmul(tile, query, out=scores[inicio:fim])
+        
+        # Seleção parcial O(N) dos k melhores, ordenando apenas esses
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return [(int(i), float(scores[i])) for i in top]
+    
+    async def _search_local(self, embedding: List[float], limite: int) -> List[Dict[str, Any]]:
+        """Busca alternativa: um único produto matriz-vetor (BLAS) sobre o corpus em memória"""
+        if self._corpus is None:
+            await self._load_corpus()
+        
+        return [{"_id": self._corpus_ids[i], "score": score} for i, score in self._top_k(embedding, limite)]
+    
+    async def find_similar_analises(
+        self,
+        embedding: List[float],
+        limite: int = 3,
+        excluir_redacao_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca as análises das redações mais similares em uma única agregação
+        
+        Args:
+            embedding: Embedding da redação de consulta
+            limite: Número máximo de resultados
+            excluir_redacao_id: Redação a ignorar (normalmente a própria consulta)
+        
+        Returns:
+            Lista de {"redacao_id", "score", "nota_geral", "resumo_executivo", "pontos_fortes"}
+        """
+        excluir = ObjectId(excluir_redacao_id) if excluir_redacao_id else None
+        
+        if self.has_vector_search is None:
+            self.has_vector_search = await self._check_vector_search()
+        
+        if self.has_vector_search:
+            try:
+                pipeline = [
+                    {
+                        "$vectorSearch": {
+                            "index": VECTOR_INDEX_NAME,
+                            "queryVector": embedding,
+                            "path": "vector_embedding",
+                            "numCandidates": num_candidates(limite + 1),
+                            "limit": limite + 1
+                        }
+                    },
+                    {"$match": {"redacao_id": {"$ne": excluir}}},
+                    {"$limit": limite},
+                    {
+                        "$lookup": {
+                            "from": "analises",
+                            "localField": "redacao_id",
+                            "foreignField": "redacao_id",
+                            "as": "analise"
+                        }
+                    },
+                    {"$unwind": "$analise"},
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "redacao_id": 1,
+                            "score": {"$meta": "vectorSearchScore"},
+                            "nota_geral": "$analise.nota_geral",
+                            "resumo_executivo": "$analise.resumo_executivo",
+                            "pontos_fortes": "$analise.pontos_fortes"
+                        }
+                    }
+                ]
+                return await self.db.embeddings.aggregate(pipeline).to_list(length=limite)
+            except Exception as e:
+                logger.error("Erro na busca vetorial: %s", e)
+        
+        # Busca alternativa: top-k em memória e uma única consulta $in nas análises
+        similares = [
+            s for s in await self._search_local(embedding, limite + 1)
+            if s["_id"] != excluir
+        ][:limite]
+        if not similares:
+            return []
+        
+        analises = await self.db.analises.find(
+            {"redacao_id": {"$in": [s["_id"] for s in similares]}},
+            {"redacao_id": 1, "nota_geral": 1, "resumo_executivo": 1, "pontos_fortes": 1}
+        ).to_list(length=len(similares))
+        por_redacao = {a["redacao_id"]: a for a in analises}
+        
+        return [
+            {
+                "redacao_id": s["_id"],
+                "score": s["score"],
+                "nota_geral": por_redacao[s["_id"]].get("nota_geral"),
+                "resumo_executivo": por_redacao[s["_id"]].get("resumo_executivo"),
+                "pontos_fortes": por_redacao[s["_id"]].get("pontos_fortes")
+            }
+            for s in similares if s["_id"] in por_redacao
+        ]
+    
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calcula similaridade de cosseno entre dois vetores"""
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
+        a = np.asarray(vec1, dtype=np.float32)
+        b = np.asarray(vec2, dtype=np.float32)
         
-        dot_product = np.dot(vec1, vec2)
-        norm_vec1 = np.linalg.norm(vec1)
-        norm_vec2 = np.linalg.norm(vec2)
-        
-        if norm_vec1 == 0 or norm_vec2 == 0:
+        # Duas somas de quadrados e uma única raiz, em vez de duas normas
+        na2 = np.vdot(a, a)
+        nb2 = np.vdot(b, b)
+        if na2 == 0 or nb2 == 0:
             return 0.0
         
-        return dot_product / (norm_vec1 * norm_vec2)
+        return float(np.dot(a, b) / np.sqrt(na2 * nb2))
     
     async def get_similar_redacoes(self, texto: str, limit: int = 3) -> List[Dict[str, Any]]:
         """
@@ -245,41 +670,48 @@ class RAGManager:
         # Buscar embeddings similares
         similar_embeddings = await self.vector_search(texto, limit=limit)
         
+        if not similar_embeddings:
+            return []
+        
+        # Duas consultas $in em paralelo no lugar de 2 find_one por resultado
+        redacao_ids = [emb["redacao_id"] for emb in similar_embeddings]
+        redacoes, analises = await asyncio.gather(
+            self.db.redacoes.find(
+                {"_id": {"$in": redacao_ids}}, {"titulo": 1}
+            ).to_list(length=len(redacao_ids)),
+            self.db.analises.find(
+                {"redacao_id": {"$in": redacao_ids}},
+                {"redacao_id": 1, "nota_geral": 1, "resumo_executivo": 1, "recomendacoes": {"$slice": 3}}
+            ).to_list(length=len(redacao_ids))
+        )
+        redacoes_por_id = {redacao["_id"]: redacao for redacao in redacoes}
+        analises_por_redacao = {analise["redacao_id"]: analise for analise in analises}
+        
         result_redacoes = []
         
         for emb in similar_embeddings:
-            try:
-                redacao_id = emb["redacao_id"]
-                
-                # Buscar redação
-                redacao = self.db.redacoes.find_one({"_id": redacao_id})
-                
-                if not redacao:
-                    continue
-                
-                # Buscar análise da redação
-                analise = self.db.analises.find_one({"redacao_id": redacao_id})
-                
-                # Montar resultado
-                result = {
-                    "id": str(redacao["_id"]),
-                    "titulo": redacao.get("titulo", "Sem título"),
-                    "texto_snippet": emb.get("texto_snippet", ""),
-                    "similarity_score": emb.get("score", 0),
+            redacao = redacoes_por_id.get(emb["redacao_id"])
+            if not redacao:
+                continue
+            
+            # Montar resultado
+            result = {
+                "id": str(redacao["_id"]),
+                "titulo": redacao.get("titulo", "Sem título"),
+                "texto_snippet": emb.get("texto_snippet", ""),
+                "similarity_score": emb.get("score", 0),
+            }
+            
+            # Adicionar análise se disponível
+            analise = analises_por_redacao.get(emb["redacao_id"])
+            if analise:
+                result["analise"] = {
+                    "nota_geral": analise.get("nota_geral", 0),
+                    "resumo": analise.get("resumo_executivo", ""),
+                    "principais_recomendacoes": analise.get("recomendacoes", [])
                 }
-                
-                # Adicionar análise se disponível
-                if analise:
-                    result["analise"] = {
-                        "nota_geral": analise.get("nota_geral", 0),
-                        "resumo": analise.get("resumo_executivo", ""),
-                        "principais_recomendacoes": analise.get("recomendacoes", [])[:3]
-                    }
-                
-                result_redacoes.append(result)
-                
-            except Exception as e:
-                logger.error(f"Erro ao processar redação similar: {e}")
+            
+            result_redacoes.append(result)
         
         return result_redacoes
     
@@ -302,7 +734,7 @@ class RAGManager:
             "categoria": "exemplar"
         }
         
-        exemplos = list(self.db.corpus_exemplos.find(exemplos_query).limit(2))
+        exemplos = await self.db.corpus_exemplos.find(exemplos_query).limit(2).to_list(length=2)
         
         # Preparar contexto RAG
         rag_context = {
@@ -329,11 +761,101 @@ class RAGManager:
             if "analise" in similar and "principais_recomendacoes" in similar["analise"]:
                 all_recomendacoes.extend(similar["analise"]["principais_recomendacoes"])
         
-        # Remover duplicatas
-        unique_recomendacoes = list(set(all_recomendacoes))
+        # Remover duplicatas mantendo a ordem (redações mais similares primeiro)
+        unique_recomendacoes = list(dict.fromkeys(all_recomendacoes))
         
         # Retornar as 5 principais recomendações
         return unique_recomendacoes[:5]
 
 # Instância única para uso na aplicação
 rag_manager = RAGManager()
+
+
+class SeedEmbeddingQueue:
+    """
+    Fila de embeddings dos scripts de carga inicial
+    
+    Cada script enfileira sua redação com enqueue(); quem orquestra a carga chama
+    flush() uma vez ao final, e todos os textos seguem juntos para store_many
+    (uma requisição à API por lote de EMBEDDING_BATCH_SIZE e um único bulk_write).
+    """
+    
+    def __init__(self, manager: RAGManager):
+        self.manager = manager
+        self._pendentes: List[Dict[str, Any]] = []
+    
+    def enqueue(self, redacao_id: IdLike, texto: str, titulo: Optional[str] = None) -> None:
+        """Enfileira uma redação para o próximo flush"""
+        self._pendentes.append({"redacao_id": redacao_id, "texto": texto, "titulo": titulo})
+    
+    def __len__(self) -> int:
+        return len(self._pendentes)
+    
+    async def flush(self) -> int:
+        """
+        Gera e grava os embeddings de todas as redações enfileiradas
+        
+        Returns:
+            Número de embeddings gravados
+        """
+        if not self._pendentes:
+            return 0
+        
+        pendentes, self._pendentes = self._pendentes, []
+        return await self.manager.store_many(pendentes)
+
+
+# Fila única compartilhada pelos scripts de carga inicial
+seed_embedding_queue = SeedEmbeddingQueue(rag_manager)
+
+
+async def ingest_many(itens: List[Dict[str, Any]], concurrency: int = 8) -> List[Optional[str]]:
+    """
+    Ingere vários arquivos de redação: extração de texto, gravação e embeddings
+    
+    A extração e a gravação de cada arquivo rodam em paralelo, limitadas por um
+    semáforo; os embeddings são gerados depois, em lotes via store_many.
+    
+    Args:
+        itens: Dicts com "conteudo" (bytes), "nome" e, opcionalmente,
+            "titulo", "content_type" e "usuario_id"
+        concurrency: Máximo de arquivos processados simultaneamente
+    
+    Returns:
+        IDs das redações criadas, na ordem dos itens (None quando falhou)
+    """
+    sem = asyncio.Semaphore(concurrency)
+    ingeridas: List[Dict[str, Any]] = []
+    
+    async def one(item: Dict[str, Any]) -> Optional[str]:
+        async with sem:
+            try:
+                texto = await asyncio.to_thread(
+                    file_processor.extract_text, item["conteudo"], item["nome"], item.get("content_type")
+                )
+                if not texto or not texto.strip():
+                    logger.warning("Nenhum texto extraído de %s", item['nome'])
+                    return None
+                
+                titulo = item.get("titulo") or Path(item["nome"]).stem
+                redacao_id = await redacao_repository.create({
+                    "usuario_id": ObjectId(item["usuario_id"]) if item.get("usuario_id") else None,
+                    "titulo": titulo,
+                    "status": "pendente",
+                    "data_envio": datetime.now(timezone.utc),
+                    "texto_extraido": texto,
+                    "metadata": {"nome_arquivo": item["nome"], "tamanho_bytes": len(item["conteudo"])}
+                })
+                if redacao_id:
+                    ingeridas.append({"redacao_id": redacao_id, "texto": texto, "titulo": titulo})
+                return redacao_id
+            except Exception as e:
+                logger.error("Erro ao ingerir %s: %s", item.get('nome'), e)
+                return None
+    
+    ids = await asyncio.gather(*(one(item) for item in itens))
+    
+    if ingeridas:
+        await rag_manager.store_many(ingeridas)
+    
+    return list(ids)
@@ -1,92 +1,148 @@
 from typing import List, Dict, Any, Optional, Union
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument, WriteConcern
+from pymongo.results import BulkWriteResult
 import logging
 
 from app.database.mongo_client import get_db
+from app.database.bulk_buffer import bulk_buffer
 from app.database.models import (
     UserModel,
     RedacaoModel,
     AnaliseModel,
     EmbeddingModel,
     CorpusExemploModel,
-    FeedbackModel
+    FeedbackModel,
+    aplicar_correcoes
 )
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+IdLike = Union[str, ObjectId]
+
+
+def _oid(value: IdLike) -> ObjectId:
+    """Converte para ObjectId apenas quando necessário"""
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+
 class BaseRepository:
     """Repositório base com operações comuns para todas as coleções"""
     
     def __init__(self, collection_name: str):
         self.db = get_db()
+        self.collection_name = collection_name
         self.collection = self.db[collection_name]
     
-    async def find_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+    def _collection_for(self, write_concern: Optional[WriteConcern]):
+        """Coleção com o write concern pedido; sem ele, o padrão do cliente"""
+        if write_concern is None:
+            return self.collection
+        return self.collection.with_options(write_concern=write_concern)
+    
+    async def find_by_id(self, id: IdLike) -> Optional[Dict[str, Any]]:
         """Busca documento por ID"""
         try:
-            result = self.collection.find_one({"_id": ObjectId(id)})
+            result = await self.collection.find_one({"_id": _oid(id)})
             return result
         except Exception as e:
-            logger.error(f"Erro ao buscar documento por ID: {e}")
+            logger.error("Erro ao buscar documento por ID: %s", e)
             return None
     
     async def find_one(self, filter: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Busca um documento que corresponda ao filtro"""
         try:
-            return self.collection.find_one(filter)
+            return await self.collection.find_one(filter)
         except Exception as e:
-            logger.error(f"Erro na busca find_one: {e}")
+            logger.error("Erro na busca find_one: %s", e)
             return None
     
     async def find_many(self, filter: Dict[str, Any], limit: int = 100, skip: int = 0) -> List[Dict[str, Any]]:
         """Busca múltiplos documentos que correspondam ao filtro"""
         try:
             cursor = self.collection.find(filter).skip(skip).limit(limit)
-            return list(cursor)
+            return await cursor.to_list(length=limit)
         except Exception as e:
-            logger.error(f"Erro na busca find_many: {e}")
+            logger.error("Erro na busca find_many: %s", e)
             return []
     
-    async def insert_one(self, document: Dict[str, Any]) -> Optional[str]:
+    async def insert_one(
+        self,
+        document: Dict[str, Any],
+        write_concern: Optional[WriteConcern] = None
+    ) -> Optional[str]:
         """Insere um documento e retorna o ID"""
         try:
-            result = self.collection.insert_one(document)
+            result = await self._collection_for(write_concern).insert_one(document)
             return str(result.inserted_id)
         except Exception as e:
-            logger.error(f"Erro ao inserir documento: {e}")
+            logger.error("Erro ao inserir documento: %s", e)
+            return None
+    
+    async def insert_many(
+        self,
+        documents: List[Dict[str, Any]],
+        ordered: bool = False,
+        write_concern: Optional[WriteConcern] = None
+    ) -> Optional[List[ObjectId]]:
+        """Insere vários documentos em uma única chamada e retorna os IDs, na ordem dos documentos"""
+        try:
+            result = await self._collection_for(write_concern).insert_many(documents, ordered=ordered)
+            return result.inserted_ids
+        except Exception as e:
+            logger.error("Erro ao inserir documentos: %s", e)
+            return None
+    
+    async def bulk_write(
+        self,
+        requests: List[Any],
+        ordered: bool = False,
+        write_concern: Optional[WriteConcern] = None
+    ) -> Optional[BulkWriteResult]:
+        """Envia várias operações (InsertOne, UpdateOne, ...) em uma única chamada"""
+        try:
+            return await self._collection_for(write_concern).bulk_write(requests, ordered=ordered)
+        except Exception as e:
+            logger.error("Erro no bulk_write: %s", e)
+            return None
+    
+    async def create(self, document: Dict[str, Any]) -> Optional[str]:
+        """Insere um documento via buffer de escrita em lote e retorna o ID"""
+        try:
+            return await bulk_buffer.insert_one(self.collection_name, document)
+        except Exception as e:
+            logger.error("Erro ao inserir documento em lote: %s", e)
             return None
     
-    async def update_one(self, id: str, update_data: Dict[str, Any]) -> bool:
+    async def update_one(self, id: IdLike, update_data: Dict[str, Any]) -> bool:
         """Atualiza um documento por ID"""
         try:
-            result = self.collection.update_one(
-                {"_id": ObjectId(id)},
+            result = await self.collection.update_one(
+                {"_id": _oid(id)},
                 {"$set": update_data}
             )
             return result.modified_count > 0
         except Exception as e:
-            logger.error(f"Erro ao atualizar documento: {e}")
+            logger.error("Erro ao atualizar documento: %s", e)
             return False
     
-    async def delete_one(self, id: str) -> bool:
+    async def delete_one(self, id: IdLike) -> bool:
         """Deleta um documento por ID"""
         try:
-            result = self.collection.delete_one({"_id": ObjectId(id)})
+            result = await self.collection.delete_one({"_id": _oid(id)})
             return result.deleted_count > 0
         except Exception as e:
-            logger.error(f"Erro ao deletar documento: {e}")
+            logger.error("Erro ao deletar documento: %s", e)
             return False
     
     async def count(self, filter: Dict[str, Any] = None) -> int:
         """Conta documentos que correspondem ao filtro"""
         try:
-            return self.collection.count_documents(filter or {})
+            return await self.collection.count_documents(filter or {})
         except Exception as e:
-            logger.error(f"Erro ao contar documentos: {e}")
+            logger.error("Erro ao contar documentos: %s", e)
             return 0
 
 
@@ -100,9 +156,30 @@ class UserRepository(BaseRepository):
         """Busca usuário por email"""
         return await self.find_one({"email": email})
     
-    async def update_last_access(self, user_id: str) -> bool:
+    async def get_or_create_by_email(self, email: str, user_data: Dict[str, Any]) -> Optional[ObjectId]:
+        """
+        Retorna o ID do usuário com o email, criando-o com `user_data` se não existir
+        
+        Uma única operação atômica (upsert com $setOnInsert sobre o índice único
+        de email), sem a janela entre busca e inserção.
+        """
+        try:
+            dados = {k: v for k, v in user_data.items() if k != "email"}
+            result = await self.collection.find_one_and_update(
+                {"email": email},
+                {"$setOnInsert": dados},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                projection={"_id": 1}
+            )
+            return result["_id"]
+        except Exception as e:
+            logger.error("Erro ao obter ou criar usuário: %s", e)
+            return None
+    
+    async def update_last_access(self, user_id: IdLike) -> bool:
         """Atualiza a data de último acesso"""
-        return await self.update_one(user_id, {"ultimo_acesso": datetime.now()})
+        return await self.update_one(user_id, {"ultimo_acesso": datetime.now(timezone.utc)})
 
 
 class RedacaoRepository(BaseRepository):
@@ -111,23 +188,27 @@ class RedacaoRepository(BaseRepository):
     def __init__(self):
         super().__init__("redacoes")
     
-    async def find_by_user(self, user_id: str, limit: int = 20, skip: int = 0) -> List[Dict[str, Any]]:
+    async def find_by_user(self, user_id: IdLike, limit: int = 20, skip: int = 0) -> List[Dict[str, Any]]:
         """Busca redações de um usuário"""
-        return await self.find_many({"usuario_id": ObjectId(user_id)}, limit=limit, skip=skip)
+        return await self.find_many({"usuario_id": _oid(user_id)}, limit=limit, skip=skip)
     
-    async def update_status(self, redacao_id: str, status: str) -> bool:
+    async def update_status(self, redacao_id: IdLike, status: str) -> bool:
         """Atualiza o status da redação"""
         update_data = {"status": status}
         
         # Se status for concluída, atualizar data_conclusao
         if status == "concluida":
-            update_data["data_conclusao"] = datetime.now()
+            update_data["data_conclusao"] = datetime.now(timezone.utc)
             
         return await self.update_one(redacao_id, update_data)
     
     async def find_pendentes(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Busca redações pendentes para processamento"""
         return await self.find_many({"status": "pendente"}, limit=limit)
+    
+    async def find_concluida_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Busca uma redação já analisada com o mesmo conteúdo de arquivo"""
+        return await self.find_one({"content_hash": content_hash, "status": "concluida"})
 
 
 class AnaliseRepository(BaseRepository):
@@ -136,13 +217,44 @@ class AnaliseRepository(BaseRepository):
     def __init__(self):
         super().__init__("analises")
     
-    async def find_by_redacao(self, redacao_id: str) -> Optional[Dict[str, Any]]:
+    async def find_by_redacao(self, redacao_id: IdLike) -> Optional[Dict[str, Any]]:
         """Busca análise por ID da redação"""
-        return await self.find_one({"redacao_id": ObjectId(redacao_id)})
+        return await self.find_one({"redacao_id": _oid(redacao_id)})
+    
+    async def resolver_textos(
+        self,
+        analise: Dict[str, Any],
+        redacao: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Preenche texto_original/texto_corrigido de análises gravadas por referência
+        
+        O original é o texto_extraido da redação em texto_original_ref (a redação
+        já carregada pode ser passada em `redacao`); o corrigido é reconstruído
+        com aplicar_correcoes. Análises com os textos por extenso voltam intactas.
+        """
+        ref = analise.get("texto_original_ref")
+        if ref is None or analise.get("texto_original") is not None:
+            return analise
+        
+        if redacao is None or redacao.get("_id") != ref:
+            try:
+                redacao = await self.db["redacoes"].find_one({"_id": ref}, {"texto_extraido": 1})
+            except Exception as e:
+                logger.error("Erro ao buscar o texto referenciado pela análise: %s", e)
+                return analise
+        if not redacao or redacao.get("texto_extraido") is None:
+            return analise
+        
+        texto = redacao["texto_extraido"]
+        analise["texto_original"] = texto
+        if analise.get("texto_corrigido") is None:
+            analise["texto_corrigido"] = aplicar_correcoes(texto, analise.get("correcoes") or [])
+        return analise
     
-    async def find_by_user(self, user_id: str, limit: int = 20, skip: int = 0) -> List[Dict[str, Any]]:
+    async def find_by_user(self, user_id: IdLike, limit: int = 20, skip: int = 0) -> List[Dict[str, Any]]:
         """Busca análises de um usuário"""
-        return await self.find_many({"usuario_id": ObjectId(user_id)}, limit=limit, skip=skip)
+        return await self.find_many({"usuario_id": _oid(user_id)}, limit=limit, skip=skip)
 
 
 class EmbeddingRepository(BaseRepository):
@@ -151,9 +263,9 @@ class EmbeddingRepository(BaseRepository):
     def __init__(self):
         super().__init__("embeddings")
     
-    async def find_by_redacao(self, redacao_id: str) -> Optional[Dict[str, Any]]:
+    async def find_by_redacao(self, redacao_id: IdLike) -> Optional[Dict[str, Any]]:
         """Busca embedding por ID da redação"""
-        return await self.find_one({"redacao_id": ObjectId(redacao_id)})
+        return await self.find_one({"redacao_id": _oid(redacao_id)})
 
 
 class CorpusExemploRepository(BaseRepository):
@@ -181,9 +293,9 @@ class FeedbackRepository(BaseRepository):
     def __init__(self):
         super().__init__("feedbacks")
     
-    async def find_by_analise(self, analise_id: str) -> List[Dict[str, Any]]:
+    async def find_by_analise(self, analise_id: IdLike) -> List[Dict[str, Any]]:
         """Busca feedbacks por ID da análise"""
-        return await self.find_many({"analise_id": ObjectId(analise_id)})
+        return await self.find_many({"analise_id": _oid(analise_id)})
 
 
 # Instâncias dos repositórios para uso na aplicação
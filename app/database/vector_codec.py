@@ -0,0 +1,76 @@
+"""
+Codificação compacta de embeddings para armazenamento no MongoDB
+"""
+import os
+from typing import Any, List, Optional, Tuple, Union
+
+import numpy as np
+from bson.binary import Binary
+
+# BSON BinData subtipo 9 (vector): 1 byte de dtype + 1 byte de padding + dados
+VECTOR_SUBTYPE = 9
+INT8_DTYPE = 0x03
+FLOAT32_DTYPE = 0x27
+
+# Formato gravado: "int8" (padrão, ~1,5 KB por vetor) ou "float32" (~6 KB, sem perda)
+EMBEDDING_VECTOR_DTYPE = os.getenv("EMBEDDING_VECTOR_DTYPE", "int8")
+
+
+def quantize_int8(vector: Union[List[float], np.ndarray]) -> Tuple[Binary, float]:
+    """
+    Quantiza um embedding para int8 com escala por vetor
+
+    Args:
+        vector: Embedding em ponto flutuante
+
+    Returns:
+        (BinData vector int8, escala) — o valor original é q * scale / 127
+    """
+    vec = np.asarray(vector, dtype=np.float32)
+    scale = float(np.max(np.abs(vec))) if vec.size else 0.0
+    if scale == 0.0:
+        q = np.zeros(vec.shape, dtype=np.int8)
+    else:
+        q = np.round(vec / scale * 127).astype(np.int8)
+
+    return Binary(bytes([INT8_DTYPE, 0]) + q.tobytes(), VECTOR_SUBTYPE), scale
+
+
+def pack_float32(vector: Union[List[float], np.ndarray]) -> Binary:
+    """Empacota um embedding como BinData vector float32 (little-endian)"""
+    vec = np.asarray(vector, dtype="<f4")
+    return Binary(bytes([FLOAT32_DTYPE, 0]) + vec.tobytes(), VECTOR_SUBTYPE)
+
+
+def encode_vector(vector: Union[List[float], np.ndarray]) -> Tuple[Binary, Optional[float]]:
+    """
+    Codifica um embedding no formato configurado em EMBEDDING_VECTOR_DTYPE
+
+    Returns:
+        (BinData vector, escala) — a escala só existe para int8
+    """
+    if EMBEDDING_VECTOR_DTYPE == "float32":
+        return pack_float32(vector), None
+    return quantize_int8(vector)
+
+
+def decode_vector(value: Any, scale: Optional[float] = None) -> np.ndarray:
+    """
+    Reconstrói um embedding armazenado como float32
+
+    Aceita BinData vector int8 ou float32 e listas de floats de documentos
+    antigos. O float32 é lido sem cópia (array somente leitura). Sem `scale`
+    o vetor int8 é devolvido sem reescala, o que basta para similaridade de
+    cosseno.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        if value[0] == FLOAT32_DTYPE:
+            return np.frombuffer(value, dtype="<f4", offset=2)
+        if value[0] != INT8_DTYPE:
+            raise ValueError(f"Tipo de vetor BSON não suportado: {value[0]:#x}")
+        vec = np.frombuffer(value, dtype=np.int8, offset=2).astype(np.float32)
+        if scale is not None:
+            vec *= scale / 127
+        return vec
+
+    return np.asarray(value, dtype=np.float32)
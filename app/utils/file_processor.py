@@ -7,8 +7,6 @@ from pathlib import Path
 import logging
 import io
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class FileProcessor:
@@ -16,41 +14,45 @@ class FileProcessor:
     
     def __init__(self):
         """Inicializa o processador de arquivos"""
-        self._check_dependencies()
+        # Bibliotecas de cada formato são importadas no primeiro uso e mantidas aqui
+        self._pdf_backend = None  # ("pdfium", módulo) ou ("pypdf2", módulo)
+        self._docx = None
+        self._textract = None
     
-    def _check_dependencies(self):
-        """Verifica dependências para processamento de diferentes formatos"""
-        # Tentar importar dependências necessárias
-        self.has_pdf_support = self._check_pdf_support()
-        self.has_docx_support = self._check_docx_support()
-        self.has_doc_support = self._check_doc_support()
+    def _get_pdf_backend(self):
+        """Importa a biblioteca de PDF (pypdfium2, ou PyPDF2 como alternativa)"""
+        if self._pdf_backend is None:
+            try:
+                import pypdfium2
+                self._pdf_backend = ("pdfium", pypdfium2)
+            except ImportError:
+                try:
+                    import PyPDF2
+                except ImportError:
+                    raise ImportError("Suporte a PDF não disponível. Instale com: pip install pypdfium2")
+                logger.info("pypdfium2 não está instalado; usando PyPDF2 (mais lento). Instale com: pip install pypdfium2")
+                self._pdf_backend = ("pypdf2", PyPDF2)
+        return self._pdf_backend
     
-    def _check_pdf_support(self):
-        """Verifica se o suporte a PDF está disponível"""
-        try:
-            import PyPDF2
-            return True
-        except ImportError:
-            logger.warning("PyPDF2 não está instalado. Instale com: pip install PyPDF2")
-            return False
-    
-    def _check_docx_support(self):
-        """Verifica se o suporte a DOCX está disponível"""
-        try:
-            import docx
-            return True
-        except ImportError:
-            logger.warning("python-docx não está instalado. Instale com: pip install python-docx")
-            return False
+    def _get_docx(self):
+        """Importa python-docx no primeiro uso"""
+        if self._docx is None:
+            try:
+                import docx
+            except ImportError:
+                raise ImportError("Suporte a DOCX não disponível. Instale com: pip install python-docx")
+            self._docx = docx
+        return self._docx
     
-    def _check_doc_support(self):
-        """Verifica se o suporte a DOC está disponível"""
-        try:
-            import textract
-            return True
-        except ImportError:
-            logger.warning("textract não está instalado. Instale com: pip install textract")
-            return False
+    def _get_textract(self):
+        """Importa textract no primeiro uso"""
+        if self._textract is None:
+            try:
+                import textract
+            except ImportError:
+                raise ImportError("Suporte a DOC não disponível. Instale com: pip install textract")
+            self._textract = textract
+        return self._textract
     
     def extract_text(self, file_content, file_name=None, content_type=None):
         """
@@ -70,28 +72,48 @@ class FileProcessor:
         # Determinar tipo de arquivo
         file_type = self._determine_file_type(file_name, content_type)
         
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False) as temp:
-            temp.write(file_content)
-            temp_path = temp.name
-        
-        try:
-            # Extrair texto com base no tipo de arquivo
-            if file_type == "pdf":
-                text = self._extract_from_pdf(temp_path)
-            elif file_type == "docx":
-                text = self._extract_from_docx(temp_path)
-            elif file_type == "doc":
-                text = self._extract_from_doc(temp_path)
-            elif file_type == "txt":
-                text = self._extract_from_txt(temp_path)
-            else:
-                raise ValueError(f"Formato de arquivo não suportado: {file_type}")
+        # textract só trabalha com caminhos: apenas .doc passa por arquivo temporário
+        if file_type == "doc":
+            with tempfile.NamedTemporaryFile(delete=False) as temp:
+                temp.write(file_content)
+                temp_path = temp.name
             
-            return text
-        finally:
-            # Limpar arquivo temporário
-            os.unlink(temp_path)
+            try:
+                return self._extract_from_doc(temp_path)
+            finally:
+                # Limpar arquivo temporário
+                os.unlink(temp_path)
+        
+        # PDF, DOCX e TXT são lidos diretamente da memória
+        return self._extract_by_type(io.BytesIO(file_content), file_type)
+    
+    def extract_text_from_path(self, file_path, file_name=None, content_type=None):
+        """
+        Extrai texto de um arquivo já gravado em disco, sem cópia temporária
+        
+        Args:
+            file_path: Caminho do arquivo
+            file_name: Nome original do arquivo (opcional, padrão: nome em disco)
+            content_type: Tipo MIME do arquivo (opcional)
+        
+        Returns:
+            texto extraído
+        """
+        file_type = self._determine_file_type(file_name or Path(file_path).name, content_type)
+        return self._extract_by_type(file_path, file_type)
+    
+    def _extract_by_type(self, file_path, file_type):
+        """Extrai texto com base no tipo de arquivo (caminho, ou io.BytesIO exceto para .doc)"""
+        if file_type == "pdf":
+            return self._extract_from_pdf(file_path)
+        elif file_type == "docx":
+            return self._extract_from_docx(file_path)
+        elif file_type == "doc":
+            return self._extract_from_doc(file_path)
+        elif file_type == "txt":
+            return self._extract_from_txt(file_path)
+        else:
+            raise ValueError(f"Formato de arquivo não suportado: {file_type}")
     
     def _determine_file_type(self, file_name=None, content_type=None):
         """Determina o tipo de arquivo com base no nome ou tipo MIME"""
@@ -124,57 +146,71 @@ class FileProcessor:
     
     def _extract_from_pdf(self, file_path):
         """Extrai texto de arquivo PDF"""
-        if not self.has_pdf_support:
-            raise ImportError("Suporte a PDF não disponível")
+        backend, module = self._get_pdf_backend()
         
         try:
-            import PyPDF2
-            reader = PyPDF2.PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            if backend == "pdfium":
+                return self._extract_pdf_pdfium(module, file_path)
+            
+            reader = module.PdfReader(file_path)
+            # extract_text() pode devolver None em páginas sem texto
+            return "\n".join((page.extract_text() or "") for page in reader.pages)
         except Exception as e:
-            logger.error(f"Erro ao extrair texto do PDF: {e}")
+            logger.error("Erro ao extrair texto do PDF: %s", e)
             return ""
     
+    def _extract_pdf_pdfium(self, pdfium, file_path):
+        """Extrai texto de PDF com o PDFium (código nativo, bem mais rápido que PyPDF2)"""
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            pages = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return "\n".join(pages)
+        finally:
+            pdf.close()
+    
     def _extract_from_docx(self, file_path):
         """Extrai texto de arquivo DOCX"""
-        if not self.has_docx_support:
-            raise ImportError("Suporte a DOCX não disponível")
+        docx = self._get_docx()
         
         try:
-            import docx
             doc = docx.Document(file_path)
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
+            return "\n".join(para.text for para in doc.paragraphs)
         except Exception as e:
-            logger.error(f"Erro ao extrair texto do DOCX: {e}")
+            logger.error("Erro ao extrair texto do DOCX: %s", e)
             return ""
     
     def _extract_from_doc(self, file_path):
         """Extrai texto de arquivo DOC"""
-        if not self.has_doc_support:
-            raise ImportError("Suporte a DOC não disponível")
+        textract = self._get_textract()
         
         try:
-            import textract
             text = textract.process(file_path).decode('utf-8')
             return text
         except Exception as e:
-            logger.error(f"Erro ao extrair texto do DOC: {e}")
+            logger.error("Erro ao extrair texto do DOC: %s", e)
             return ""
     
     def _extract_from_txt(self, file_path):
         """Extrai texto de arquivo TXT"""
         try:
+            if isinstance(file_path, io.BytesIO):
+                return file_path.getvalue().decode('utf-8', errors='ignore')
+            
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 return f.read()
         except Exception as e:
-            logger.error(f"Erro ao extrair texto do TXT: {e}")
+            logger.error("Erro ao extrair texto do TXT: %s", e)
             return ""
 
 # Instância global para reutilização
 file_processor = FileProcessor()
+
+
+def extract_text_from_path(file_path, file_name=None, content_type=None):
+    """Função de módulo (serializável) para extração em pools de processos"""
+    return file_processor.extract_text_from_path(file_path, file_name=file_name, content_type=content_type)
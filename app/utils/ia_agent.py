@@ -2,23 +2,31 @@
 Agente de IA para processamento inteligente de documentos e redações
 """
 import os
-import json
+import time
+import hashlib
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import asyncio
-from pathlib import Path
 
+import httpx
 import openai
+import orjson
+import tiktoken
 from dotenv import load_dotenv
-from tenacity import retry, wait_exponential, stop_after_attempt
+from tenacity import retry, retry_if_exception_type, wait_exponential, stop_after_attempt
 
 from app.utils.file_processor import file_processor
 
+# Redis é opcional: sem ele as análises não são cacheadas
+try:
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configurar OpenAI API
@@ -26,6 +34,117 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 if not openai.api_key:
     logger.warning("OpenAI API Key não está configurada. O agente terá funcionalidade limitada.")
 
+# Pool HTTP do cliente OpenAI: HTTP/2 e keep-alive evitam um handshake TLS por chamada
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+# Cache das respostas de analyze_text (24h por padrão)
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+
+# Limites da conta na OpenAI (requisições e tokens por minuto)
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "40000"))
+
+# Janela de contexto (tokens) por modelo; modelos desconhecidos usam a do gpt-4
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+# Limite de tokens da resposta por modelo, quando menor que a janela de contexto
+MODEL_MAX_OUTPUT_TOKENS = {
+    "gpt-4-turbo": 4096,
+    "gpt-4o": 4096,
+    "gpt-3.5-turbo": 4096,
+}
+# Tokens reservados para o template do prompt e a formatação das mensagens
+PROMPT_OVERHEAD_TOKENS = 300
+# Delimitadores <<<REDACAO_i>>> de cada item de um lote
+BATCH_ITEM_OVERHEAD_TOKENS = 20
+# Resposta esperada por redação em uma análise agrupada
+ANALYSIS_OUTPUT_TOKENS = int(os.getenv("ANALYSIS_OUTPUT_TOKENS", "1500"))
+
+# Limite de redações por requisição em analyze_texts
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "4"))
+
+ANALYSIS_FIELDS = """
+            - nota_geral (float entre 0-10)
+            - notas (array de objetos com competência, nota, justificativa)
+            - resumo_executivo (string com resumo da análise)
+            - problemas_gramaticais (array de problemas encontrados)
+            - recomendacoes (array de recomendações)
+            - pontos_fortes (array de pontos fortes)
+"""
+
+class OpenAIThrottler:
+    """
+    Balde de requisições e tokens que adia chamadas antes de estourar o limite
+    
+    A capacidade é reposta continuamente a RPM/60 e TPM/60 por segundo e
+    ajustada pelos cabeçalhos x-ratelimit-remaining-* de cada resposta, de
+    modo que as chamadas esperem o necessário em vez de receber um 429.
+    """
+    
+    def __init__(self, max_requests_per_minute: int, max_tokens_per_minute: int):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = float(max_requests_per_minute)
+        self.available_token_capacity = float(max_tokens_per_minute)
+        self._last_update = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        self.available_request_capacity = min(
+            self.available_request_capacity + elapsed * self.max_requests_per_minute / 60,
+            self.max_requests_per_minute
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + elapsed * self.max_tokens_per_minute / 60,
+            self.max_tokens_per_minute
+        )
+    
+    async def acquire(self, estimated_tokens: int):
+        """Aguarda até haver capacidade para uma requisição de `estimated_tokens`"""
+        # Uma requisição maior que o limite por minuto espera apenas o balde encher
+        estimated_tokens = min(estimated_tokens, self.max_tokens_per_minute)
+        
+        while True:
+            # Sem await entre a verificação e o débito: seguro entre corrotinas
+            self._refill()
+            if self.available_request_capacity >= 1 and self.available_token_capacity >= estimated_tokens:
+                self.available_request_capacity -= 1
+                self.available_token_capacity -= estimated_tokens
+                return
+            
+            espera = max(
+                (1 - self.available_request_capacity) * 60 / self.max_requests_per_minute,
+                (estimated_tokens - self.available_token_capacity) * 60 / self.max_tokens_per_minute,
+                0.01
+            )
+            await asyncio.sleep(espera)
+    
+    def update_from_headers(self, headers):
+        """Limita a capacidade local ao que o servidor informa como restante"""
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            self.available_request_capacity = min(
+                self.available_request_capacity, float(remaining_requests)
+            )
+        
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.available_token_capacity = min(
+                self.available_token_capacity, float(remaining_tokens)
+            )
+
+
+# Erros transitórios da API que justificam nova tentativa
+TRANSIENT_ERRORS = (openai.InternalServerError, openai.APIConnectionError)
+
 class IAAgent:
     """
     Agente de IA para processamento avançado de documentos e redações
@@ -44,6 +163,196 @@ class IAAgent:
         self.temperature = 0.2
         self.system_prompt = self._get_system_prompt()
         
+        # Encoder tiktoken e orçamento de tokens calculados no primeiro uso (ver
+        # _encoder): a instância global é criada no import, que não deve baixar nada
+        self._enc: Optional[tiktoken.Encoding] = None
+        self._enc_indisponivel = False
+        self._text_token_budget: Optional[int] = None
+        
+        # Cliente OpenAI assíncrono, criado no primeiro uso (ver _client)
+        self.client: Optional[openai.AsyncOpenAI] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        
+        self.throttler = OpenAIThrottler(OPENAI_RPM, OPENAI_TPM)
+        
+        # Cache de análises no Redis (conexão aberta sob demanda)
+        redis_uri = os.getenv("REDIS_URI")
+        self.cache = aioredis.from_url(redis_uri) if HAS_REDIS and redis_uri else None
+    
+    async def aclose(self):
+        """Fecha as conexões mantidas pelo cliente HTTP e pelo cache"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            self.client = None
+        if self.cache is not None:
+            await self.cache.aclose()
+        
+    def _client(self) -> openai.AsyncOpenAI:
+        """
+        Devolve o cliente OpenAI compartilhado por todas as chamadas
+        
+        A criação é adiada até a primeira chamada, já dentro do event loop do
+        processo que atende a requisição: com `gunicorn --preload` a instância
+        global é importada no mestre antes do fork, e o pool de conexões não
+        deve ser herdado pelos workers.
+        """
+        if not openai.api_key:
+            raise ValueError("OpenAI API não configurada. Defina OPENAI_API_KEY.")
+        if self.client is None:
+            self._http_client = httpx.AsyncClient(
+                http2=True,
+                limits=HTTP_LIMITS,
+                timeout=HTTP_TIMEOUT
+            )
+            self.client = openai.AsyncOpenAI(
+                api_key=openai.api_key,
+                http_client=self._http_client,
+                timeout=HTTP_TIMEOUT
+            )
+        return self.client
+    
+    async def _call_llm(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """
+        Chama o modelo de chat respeitando o limite de taxa da conta
+        
+        Returns:
+            Conteúdo (JSON) da resposta
+        """
+        content, _ = await self._call_llm_choice(messages, temperature, max_tokens)
+        return content
+    
+    @retry(
+        retry=retry_if_exception_type(TRANSIENT_ERRORS),
+        wait=wait_exponential(min=1, max=60),
+        stop=stop_after_attempt(3),
+        reraise=True
+    )
+    async def _call_llm_choice(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Como _call_llm, devolvendo também o finish_reason ("length" = resposta cortada)
+        
+        Returns:
+            (conteúdo da resposta, finish_reason)
+        """
+        prompt_tokens = sum(self.count_tokens(m["content"]) for m in messages)
+        await self.throttler.acquire(prompt_tokens + max_tokens)
+        
+        raw = await self._client().chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+        self.throttler.update_from_headers(raw.headers)
+        
+        choice = raw.parse().choices[0]
+        return choice.message.content, choice.finish_reason
+    
+    def _analysis_cache_key(self, text: str) -> str:
+        """Chave do cache: modelo + SHA-256 do texto com espaços normalizados"""
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"ia:analise:{self.model}:{digest}"
+    
+    async def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        try:
+            cached = await self.cache.get(key)
+        except Exception as e:
+            logger.warning("Cache de análises indisponível: %s", e)
+            return None
+        return orjson.loads(cached) if cached else None
+    
+    async def _cache_put(self, key: str, analysis: Dict[str, Any]):
+        if self.cache is None:
+            return
+        try:
+            await self.cache.set(key, orjson.dumps(analysis), ex=ANALYSIS_CACHE_TTL)
+        except Exception as e:
+            logger.warning("Falha ao gravar no cache de análises: %s", e)
+    
+    def _encoder(self) -> Optional[tiktoken.Encoding]:
+        """
+        Encoder tiktoken do modelo, carregado na primeira contagem
+        
+        O arquivo BPE vem do TIKTOKEN_CACHE_DIR (preenchido no build da imagem)
+        ou é baixado. Sem rede e sem cache, devolve None e as contagens caem na
+        estimativa de ~4 caracteres por token, sem nova tentativa a cada chamada.
+        """
+        if self._enc is None and not self._enc_indisponivel:
+            try:
+                try:
+                    self._enc = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._enc = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning("Encoder tiktoken indisponível, estimando tokens por caracteres: %s", e)
+                self._enc_indisponivel = True
+        return self._enc
+    
+    def count_tokens(self, text: str) -> int:
+        """Número de tokens do texto no encoder do modelo (ou estimativa)"""
+        enc = self._encoder()
+        if enc is None:
+            return len(text) // 4 + 1
+        return len(enc.encode(text))
+    
+    @property
+    def context_window(self) -> int:
+        return MODEL_CONTEXT_WINDOWS.get(self.model, MODEL_CONTEXT_WINDOWS["gpt-4"])
+    
+    @property
+    def max_output_tokens(self) -> int:
+        return MODEL_MAX_OUTPUT_TOKENS.get(self.model, self.context_window)
+    
+    @property
+    def text_token_budget(self) -> int:
+        """
+        Orçamento de tokens para o texto da redação: o que sobra da janela de
+        contexto depois da resposta, do prompt de sistema e do template
+        """
+        if self._text_token_budget is None:
+            self._text_token_budget = (
+                self.context_window
+                - self.max_tokens
+                - self.count_tokens(self.system_prompt)
+                - PROMPT_OVERHEAD_TOKENS
+            )
+        return self._text_token_budget
+    
+    def _truncate(self, text: str) -> Tuple[str, int]:
+        """
+        Corta o texto no orçamento de tokens do modelo
+        
+        Returns:
+            (texto, número de tokens do texto devolvido)
+        """
+        budget = self.text_token_budget
+        enc = self._encoder()
+        if enc is None:
+            n_tokens = self.count_tokens(text)
+            if n_tokens <= budget:
+                return text, n_tokens
+            return text[:budget * 4] + "...", budget
+        
+        tokens = enc.encode(text)
+        if len(tokens) <= budget:
+            return text, len(tokens)
+        return enc.decode(tokens[:budget]) + "...", budget
+    
     def _get_system_prompt(self) -> str:
         """Define o sistema prompt para o agente de IA"""
         return """
@@ -59,7 +368,6 @@ class IAAgent:
         Responda sempre em formato JSON estruturado.
         """
         
-    @retry(wait=wait_exponential(min=1, max=60), stop=stop_after_attempt(5))
     async def process_document(self, file_path: str, file_type: Optional[str] = None) -> Dict[str, Any]:
         """
         Processa um documento usando IA para extrair e analisar o conteúdo
@@ -72,12 +380,11 @@ class IAAgent:
             Dict com o resultado da análise
         """
         try:
-            # Extrair texto do documento
-            with open(file_path, 'rb') as file:
-                file_content = file.read()
-                
-            file_name = Path(file_path).name
-            text = file_processor.extract_text(file_content, file_name, file_type)
+            # Extrair o texto direto do arquivo em disco (pypdfium2 para PDF),
+            # em uma thread para não bloquear o event loop
+            text = await asyncio.to_thread(
+                file_processor.extract_text_from_path, file_path, None, file_type
+            )
             
             if not text:
                 return {"error": "Não foi possível extrair texto do documento."}
@@ -92,10 +399,9 @@ class IAAgent:
             }
             
         except Exception as e:
-            logger.error(f"Erro ao processar documento: {str(e)}")
+            logger.error("Erro ao processar documento: %s", e)
             return {"error": f"Falha ao processar documento: {str(e)}"}
     
-    @retry(wait=wait_exponential(min=1, max=60), stop=stop_after_attempt(3))
     async def analyze_text(self, text: str) -> Dict[str, Any]:
         """
         Analisa o texto da redação usando IA
@@ -106,10 +412,14 @@ class IAAgent:
         Returns:
             Dict com análise detalhada
         """
-        # Limitar o tamanho do texto para evitar tokens excessivos
-        max_chars = 14000
-        if len(text) > max_chars:
-            text = text[:max_chars] + "..."
+        # Limitar o tamanho do texto para caber na janela de contexto
+        text, _ = self._truncate(text)
+        
+        # Redações reenviadas (mesmo texto) não repetem a chamada ao modelo
+        cache_key = self._analysis_cache_key(text)
+        cached = await self._cache_get(cache_key)
+        if cached is not None:
+            return cached
             
         try:
             user_prompt = f"""
@@ -120,38 +430,184 @@ class IAAgent:
             {text}
             
             Forneça a análise completa em formato JSON com os seguintes campos:
-            - nota_geral (float entre 0-10)
-            - notas (array de objetos com competência, nota, justificativa)
-            - resumo_executivo (string com resumo da análise)
-            - problemas_gramaticais (array de problemas encontrados)
-            - recomendacoes (array de recomendações)
-            - pontos_fortes (array de pontos fortes)
+            {ANALYSIS_FIELDS}
             """
             
-            response = await openai.chat.completions.acreate(
-                model=self.model,
+            content = await self._call_llm(
                 messages=[
                     {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
+                max_tokens=self.max_tokens
             )
             
             try:
                 # Extrair resposta como JSON
-                result_text = response.choices[0].message.content
-                analysis = json.loads(result_text)
+                analysis = orjson.loads(content)
+                await self._cache_put(cache_key, analysis)
                 return analysis
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 logger.error("Falha ao decodificar JSON da resposta da IA")
                 return {"error": "Resposta da IA não está em formato JSON válido"}
                 
         except Exception as e:
-            logger.error(f"Erro ao analisar texto com IA: {str(e)}")
+            logger.error("Erro ao analisar texto com IA: %s", e)
             return {"error": f"Falha na análise: {str(e)}"}
     
+    async def analyze_texts(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analisa várias redações agrupando até ANALYSIS_BATCH_SIZE por requisição
+        
+        Um lote só cresce enquanto prompt (sistema, template, textos e
+        delimitadores) mais ANALYSIS_OUTPUT_TOKENS por redação couberem na
+        janela de contexto do modelo, e enquanto a resposta esperada couber no
+        seu limite de saída. Redações que ficam sozinhas seguem por analyze_text.
+        
+        Args:
+            texts: Textos das redações
+            
+        Returns:
+            Uma análise por texto, na mesma ordem da entrada
+        """
+        truncados = [self._truncate(t) for t in texts]
+        texts = [t for t, _ in truncados]
+        n_tokens = [n for _, n in truncados]
+        keys = [self._analysis_cache_key(t) for t in texts]
+        results: List[Optional[Dict[str, Any]]] = [await self._cache_get(k) for k in keys]
+        
+        # Agrupar sequencialmente enquanto o lote couber na janela de contexto
+        disponivel = self.context_window - self.count_tokens(self.system_prompt) - PROMPT_OVERHEAD_TOKENS
+        lotes, lote, tokens_lote = [], [], 0
+        for i in (i for i, r in enumerate(results) if r is None):
+            custo = n_tokens[i] + BATCH_ITEM_OVERHEAD_TOKENS + ANALYSIS_OUTPUT_TOKENS
+            if lote and (
+                len(lote) == ANALYSIS_BATCH_SIZE
+                or tokens_lote + custo > disponivel
+                or ANALYSIS_OUTPUT_TOKENS * (len(lote) + 1) > self.max_output_tokens
+            ):
+                lotes.append(lote)
+                lote, tokens_lote = [], 0
+            lote.append(i)
+            tokens_lote += custo
+        if lote:
+            lotes.append(lote)
+        
+        async def _analisar_lote(lote: List[int]) -> None:
+            if len(lote) > 1:
+                analises = await self._analyze_batch([texts[i] for i in lote])
+            else:
+                analises = [None]
+            for i, analise in zip(lote, analises):
+                if analise is None:
+                    # Item ausente na resposta agrupada (ou lote unitário): analisar
+                    # individualmente; analyze_text já grava no cache
+                    analise = await self.analyze_text(texts[i])
+                else:
+                    await self._cache_put(keys[i], analise)
+                results[i] = analise
+        
+        await asyncio.gather(*(_analisar_lote(lote) for lote in lotes))
+        return results
+    
+    async def _analyze_batch(self, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Envia um lote de redações em uma única chamada ao modelo
+        
+        O max_tokens da chamada é o que sobra da janela depois do prompt. Se a
+        resposta ainda vier cortada (finish_reason == "length"), o lote é
+        dividido ao meio e cada metade reenviada, em vez de descartar tudo.
+        
+        Returns:
+            Análises na ordem dos textos; None para itens que o modelo não devolveu
+        """
+        redacoes = "\n\n".join(
+            f"<<<REDACAO_{i}>>>\n{text}\n<<<FIM_REDACAO_{i}>>>" for i, text in enumerate(texts)
+        )
+        user_prompt = f"""
+            Analise cada uma das {len(texts)} redações abaixo, delimitadas por
+            <<<REDACAO_i>>> e <<<FIM_REDACAO_i>>>, de acordo com as competências de
+            clareza, coesão, coerência, norma culta e proposta de intervenção.
+            
+            {redacoes}
+            
+            Responda com um objeto JSON {{"analises": [...]}} contendo uma análise
+            por redação, cada uma com o campo "indice" (o i do delimitador) e os campos:
+            {ANALYSIS_FIELDS}
+            """
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        prompt_tokens = sum(self.count_tokens(m["content"]) for m in messages) + PROMPT_OVERHEAD_TOKENS
+        max_tokens = min(self.context_window - prompt_tokens, self.max_output_tokens)
+        
+        try:
+            content, finish_reason = await self._call_llm_choice(
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens
+            )
+        except Exception as e:
+            logger.error("Erro na análise em lote: %s", e)
+            return [None] * len(texts)
+        
+        if finish_reason == "length":
+            if len(texts) == 1:
+                return [None]
+            logger.warning("Resposta do lote de %d redações truncada; dividindo o lote", len(texts))
+            # Metades unitárias não são reenviadas: o None leva o item a analyze_text
+            meio = len(texts) // 2
+            primeira, segunda = await asyncio.gather(
+                self._analyze_batch(texts[:meio]) if meio > 1 else asyncio.sleep(0, [None]),
+                self._analyze_batch(texts[meio:]) if len(texts) - meio > 1 else asyncio.sleep(0, [None])
+            )
+            return primeira + segunda
+        
+        try:
+            analises = orjson.loads(content).get("analises", [])
+        except Exception as e:
+            logger.error("Resposta da análise em lote inválida: %s", e)
+            return [None] * len(texts)
+        
+        # Associar pelo índice informado pelo modelo, não pela posição no array
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        for analise in analises:
+            if not isinstance(analise, dict):
+                continue
+            indice = analise.pop("indice", None)
+            if isinstance(indice, int) and 0 <= indice < len(texts):
+                results[indice] = analise
+        return results
+    
+    async def full_report(self, text: str, max_points: int = 5) -> Dict[str, Any]:
+        """
+        Gera o relatório completo: análise, pontos-chave e sugestões de melhoria
+        
+        Os pontos-chave dependem só do texto e saem em paralelo com a análise;
+        apenas as sugestões esperam por ela, que informa os pontos fracos.
+        
+        Args:
+            text: Texto da redação
+            max_points: Número máximo de pontos-chave
+            
+        Returns:
+            Análise acrescida de "pontos_chave" e "sugestoes_melhoria"
+        """
+        async def _analise_e_sugestoes() -> Tuple[Dict[str, Any], List[str]]:
+            analysis = await self.analyze_text(text)
+            if "error" in analysis:
+                return analysis, []
+            return analysis, await self.generate_improvement_suggestions(text, analysis)
+        
+        (analysis, suggestions), key_points = await asyncio.gather(
+            _analise_e_sugestoes(),
+            self.extract_key_points(text, max_points)
+        )
+        if "error" in analysis:
+            return analysis
+        return {**analysis, "pontos_chave": key_points, "sugestoes_melhoria": suggestions}
+    
     async def extract_key_points(self, text: str, max_points: int = 5) -> List[str]:
         """
         Extrai pontos-chave do texto usando IA
@@ -172,18 +628,16 @@ class IAAgent:
             Forneça apenas a lista de pontos em JSON.
             """
             
-            response = await openai.chat.completions.acreate(
-                model=self.model,
+            content = await self._call_llm(
                 messages=[
                     {"role": "system", "content": "Você é um assistente especializado em extrair pontos-chave de textos."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,
-                max_tokens=1000,
-                response_format={"type": "json_object"}
+                max_tokens=1000
             )
             
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(content)
             
             if isinstance(result, dict) and "pontos" in result:
                 return result["pontos"]
@@ -198,7 +652,7 @@ class IAAgent:
             return []
             
         except Exception as e:
-            logger.error(f"Erro ao extrair pontos-chave: {str(e)}")
+            logger.error("Erro ao extrair pontos-chave: %s", e)
             return []
     
     async def generate_improvement_suggestions(self, text: str, analysis: Dict[str, Any]) -> List[str]:
@@ -224,23 +678,21 @@ class IAAgent:
             Com base na análise da redação, gere 3-5 sugestões específicas e acionáveis para melhorar o texto.
             Foque nos seguintes pontos fracos:
             
-            {json.dumps(weak_points, ensure_ascii=False)}
+            {orjson.dumps(weak_points).decode()}
             
             Forneça sugestões diretas, específicas e práticas em formato JSON.
             """
             
-            response = await openai.chat.completions.acreate(
-                model=self.model,
+            content = await self._call_llm(
                 messages=[
                     {"role": "system", "content": "Você é um especialista em redação e fornecer feedback construtivo e acionável."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.4,
-                max_tokens=1000,
-                response_format={"type": "json_object"}
+                max_tokens=1000
             )
             
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(content)
             
             if isinstance(result, dict) and "sugestoes" in result:
                 return result["sugestoes"]
@@ -255,7 +707,7 @@ class IAAgent:
             return []
             
         except Exception as e:
-            logger.error(f"Erro ao gerar sugestões de melhoria: {str(e)}")
+            logger.error("Erro ao gerar sugestões de melhoria: %s", e)
             return []
 
 
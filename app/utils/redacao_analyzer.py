@@ -1,13 +1,12 @@
 import spacy
 from typing import List, Dict, Any, Optional, Tuple
-import json
 import re
 import os
 from pathlib import Path
 import uuid
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
 import numpy as np
-from collections import Counter
+from collections import Counter, OrderedDict
 
 from app.utils.text_processor import TextProcessor
 from app.models.schemas import (
@@ -21,21 +20,34 @@ from app.models.schemas import (
     MetricasTexto
 )
 
+# Máximo de segmentos (parágrafos) com resultado guardado em memória
+SEGMENT_CACHE_SIZE = 4096
+
 class RedacaoAnalyzer:
-    def __init__(self):
-        self.text_processor = TextProcessor()
+    def __init__(self, text_processor: Optional[TextProcessor] = None):
+        # Reutilizar um TextProcessor existente evita treinar o TF-IDF de novo
+        self.text_processor = text_processor or TextProcessor()
         self.nlp = self.text_processor.nlp
         
+        # Configuração do processamento em lote com spaCy
+        self.batch_size = 32
+        self.n_process = max(1, (os.cpu_count() or 1) // 2)
+        
+        # Resultados por segmento (LRU): reenvios com pequenas edições só
+        # processam no spaCy os parágrafos que mudaram
+        self._segment_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        
         # Carregar base de conhecimento (regras gramaticais, conectivos, etc.)
         self.base_conhecimento = self._carregar_base_conhecimento()
+        self.padrao_problemas, self.regras_problemas = self._compilar_padrao_problemas()
         
         # Carregar exemplos de redações para RAG
-        self.exemplos = self._carregar_exemplos()
+        self.definir_exemplos(self._carregar_exemplos())
     
     def _carregar_base_conhecimento(self) -> Dict[str, Any]:
         """Carrega base de conhecimento com regras gramaticais e padrões textuais"""
         # Em um sistema real, isto seria carregado de um arquivo ou banco de dados
-        return {
+        base = {
             "conectivos": {
                 "adição": ["além disso", "ademais", "outrossim", "também", "e", "bem como"],
                 "conclusão": ["portanto", "logo", "assim", "dessa forma", "por conseguinte"],
@@ -76,20 +88,145 @@ class RedacaoAnalyzer:
                 }
             }
         }
+        
+        # Compilar os padrões uma única vez, na carga da base
+        for regras in base["problemas_comuns"].values():
+            for regra in regras:
+                regra["padrão"] = re.compile(regra["padrão"], re.IGNORECASE)
+        
+        return base
+    
+    def _compilar_padrao_problemas(self) -> Tuple[re.Pattern, Dict[str, Tuple[str, Dict[str, Any]]]]:
+        """
+        Junta todos os padrões de problemas em uma única alternância
+        
+        Returns:
+            (padrão combinado, mapa grupo -> (tipo do problema, regra))
+        """
+        partes = []
+        regras_por_grupo = {}
+        for tipo, regras in self.base_conhecimento["problemas_comuns"].items():
+            for regra in regras:
+                grupo = f"g{len(partes)}"
+                partes.append(f"(?P<{grupo}>{regra['padrão'].pattern})")
+                regras_por_grupo[grupo] = (tipo, regra)
+        
+        return re.compile("|".join(partes), re.IGNORECASE), regras_por_grupo
+    
+    def encontrar_problemas(self, texto: str) -> List[Dict[str, Any]]:
+        """
+        Localiza ocorrências dos problemas comuns com uma única varredura do texto
+        
+        Returns:
+            Lista de problemas no formato de ProblemaGramatical
+        """
+        problemas = []
+        for match in self.padrao_problemas.finditer(texto):
+            # O grupo nomeado externo é o último a fechar
+            tipo, regra = self.regras_problemas[match.lastgroup]
+            problemas.append({
+                "tipo": tipo,
+                "texto_original": match.group(),
+                "sugestao": regra["correção"],
+                "explicacao": regra["explicação"],
+                "posicao": list(match.span())
+            })
+        return problemas
     
     def _carregar_exemplos(self) -> List[Dict[str, Any]]:
-        """Carrega exemplos de redações para RAG"""
-        exemplos = []
-        redacoes_dir = Path("data/redacoes")
+        """Carrega exemplos de redações para RAG (já lidos pelo TextProcessor)"""
+        return self.text_processor.redacoes
+    
+    def definir_exemplos(self, exemplos: List[Dict[str, Any]]):
+        """
+        Define os exemplos de RAG e pré-calcula a matriz normalizada dos embeddings
+        
+        Só entram na matriz os exemplos com campo "embedding"; a busca por
+        similaridade vira um único produto matriz-vetor (BLAS).
+        """
+        self.exemplos = exemplos
+        self._exemplos_indexados = [e for e in exemplos if e.get("embedding")]
+        
+        if not self._exemplos_indexados:
+            self._matriz_exemplos = None
+            return
         
-        if not redacoes_dir.exists():
-            return exemplos
+        matriz = np.asarray([e["embedding"] for e in self._exemplos_indexados], dtype=np.float32)
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        self._matriz_exemplos = matriz / normas
+    
+    def exemplos_similares(self, embedding: List[float], k: int = 3) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Busca os exemplos mais próximos de um embedding por similaridade de cosseno
+        
+        Returns:
+            Lista de (exemplo, similaridade), da mais alta para a mais baixa
+        """
+        if self._matriz_exemplos is None or k <= 0:
+            return []
+        
+        q = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(q)
+        if norma == 0:
+            return []
+        
+        scores = self._matriz_exemplos @ (q / norma)
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        return [(self._exemplos_indexados[i], float(scores[i])) for i in top]
+    
+    def analisar_segmentos(self, segmentos: List[str]) -> List[Dict[str, Any]]:
+        """
+        Processa segmentos de texto (parágrafos ou sentenças) em lote com spaCy
+        
+        Args:
+            segmentos: Lista de trechos de texto
+        
+        Returns:
+            Lista com contagem de palavras e classes gramaticais por segmento
+        """
+        chaves = [hashlib.blake2b(s.encode("utf-8"), digest_size=16).digest() for s in segmentos]
+        resultados: List[Optional[Dict[str, Any]]] = [self._segment_cache_get(k) for k in chaves]
         
-        for filepath in redacoes_dir.glob("*.json"):
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    exemplos.append(json.load(f))
-            except Exception as e:
-                print(f"Erro ao carregar exemplo {filepath}: {e}")
+        # Apenas segmentos novos ou alterados passam pelo pipeline
+        faltantes = [i for i, r in enumerate(resultados) if r is None]
+        if not faltantes:
+            return resultados
         
-        return exemplos
+        # Multiprocessamento só compensa o custo de iniciar processos em lotes grandes
+        n_process = self.n_process if len(faltantes) >= self.batch_size * 2 else 1
+        
+        docs = self.nlp.pipe(
+            (segmentos[i] for i in faltantes), batch_size=self.batch_size, n_process=n_process
+        )
+        for i, doc in zip(faltantes, docs):
+            palavras = [token for token in doc if not token.is_punct and not token.is_space]
+            resultado = {
+                "texto": doc.text,
+                "num_palavras": len(palavras),
+                "tipo_palavras": dict(Counter(token.pos_ for token in palavras))
+            }
+            self._segment_cache_put(chaves[i], resultado)
+            resultados[i] = dict(resultado)
+        
+        return resultados
+    
+    def _segment_cache_get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        resultado = self._segment_cache.get(key)
+        if resultado is None:
+            return None
+        self._segment_cache.move_to_end(key)
+        return dict(resultado)
+    
+    def _segment_cache_put(self, key: bytes, resultado: Dict[str, Any]):
+        self._segment_cache[key] = resultado
+        self._segment_cache.move_to_end(key)
+        if len(self._segment_cache) > SEGMENT_CACHE_SIZE:
+            self._segment_cache.popitem(last=False)
+    
+    def analisar_paragrafos(self, texto: str) -> List[Dict[str, Any]]:
+        """Divide a redação em parágrafos e processa todos em um único lote"""
+        paragrafos = self.text_processor.get_paragraphs(texto)
+        return self.analisar_segmentos(paragrafos)
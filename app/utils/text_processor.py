@@ -3,14 +3,25 @@ from typing import List, Dict, Any, Optional, Tuple
 import re
 import os
 from pathlib import Path
-import string
-from collections import Counter
+import hashlib
+import joblib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize, sent_tokenize
 from sklearn.feature_extraction.text import TfidfVectorizer
+from spacy.parts_of_speech import NAMES as POS_NAMES
 import numpy as np
 
+# Numba é opcional: sem ele, as métricas usam operações vetorizadas do NumPy
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # Garantir que recursos NLTK estejam baixados
 try:
     nltk.data.find('tokenizers/punkt')
@@ -19,16 +30,93 @@ except LookupError:
     nltk.download('punkt')
     nltk.download('stopwords')
 
+# Tamanho do histograma de classes gramaticais (IDs de POS do spaCy)
+N_POS_IDS = max(POS_NAMES) + 1
+
+if HAS_NUMBA:
+    @njit(cache=True, parallel=True)
+    def _token_metrics(lengths, pos, n_pos):
+        """Soma dos comprimentos das palavras e histograma de POS"""
+        total = 0
+        for i in prange(lengths.shape[0]):
+            total += lengths[i]
+        
+        hist = np.zeros(n_pos, dtype=np.int64)
+        for i in range(pos.shape[0]):
+            hist[pos[i]] += 1
+        return total, hist
+else:
+    def _token_metrics(lengths, pos, n_pos):
+        """Soma dos comprimentos das palavras e histograma de POS"""
+        return int(lengths.sum()), np.bincount(pos, minlength=n_pos)
+
+# Componentes do pipeline spaCy desativados por padrão: as métricas só usam
+# tokenização e classes gramaticais (morphologizer). O parser continua carregado
+# e é ativado sob demanda para sintagmas nominais.
+SPACY_MODEL = "pt_core_news_lg"
+SPACY_DISABLED_PIPES = ["parser", "ner", "attribute_ruler", "lemmatizer"]
+
+@lru_cache(maxsize=None)
+def load_nlp():
+    """
+    Carrega o modelo spaCy uma única vez por processo.
+    
+    Todas as instâncias de TextProcessor compartilham o mesmo objeto. Com
+    `gunicorn --preload` o carregamento acontece no processo mestre e os
+    workers herdam o modelo via copy-on-write após o fork.
+    """
+    try:
+        return spacy.load(SPACY_MODEL, disable=SPACY_DISABLED_PIPES)
+    except OSError as e:
+        # O modelo é instalado no build da imagem; baixá-lo aqui travaria a
+        # requisição ou tarefa por minutos
+        raise RuntimeError(
+            f"Modelo spaCy {SPACY_MODEL} não instalado. "
+            f"Execute 'python -m spacy download {SPACY_MODEL}' na implantação."
+        ) from e
+
+# Pré-processamento: grupo 1 = URL (removida), grupo 2 = espaços em branco (um espaço)
+_PREPROCESS_RE = re.compile(r'(https?://\S+|www\.\S+)|(\s+)')
+
+def _preprocess_sub(match: re.Match) -> str:
+    return '' if match.group(1) else ' '
+
+# Redações de exemplo: um JSONL consolidado, se existir, ou um JSON por arquivo
+REDACOES_DIR = Path("data/redacoes")
+REDACOES_JSONL = Path("data/redacoes.jsonl")
+
+def _load_json_file(filepath: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return orjson.loads(filepath.read_bytes())
+    except Exception as e:
+        print(f"Erro ao carregar {filepath}: {e}")
+        return None
+
+def load_redacoes() -> List[Dict[str, Any]]:
+    """
+    Carrega as redações de exemplo
+    
+    O arquivo data/redacoes.jsonl (uma redação por linha) é lido de uma vez;
+    sem ele, os arquivos de data/redacoes/*.json são lidos em paralelo.
+    """
+    if REDACOES_JSONL.exists():
+        with open(REDACOES_JSONL, "rb") as f:
+            return [orjson.loads(line) for line in f if line.strip()]
+    
+    if not REDACOES_DIR.exists():
+        return []
+    
+    filepaths = sorted(REDACOES_DIR.glob("*.json"))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return [data for data in executor.map(_load_json_file, filepaths) if data is not None]
+
+# Vetorizador TF-IDF ajustado, reaproveitado enquanto o corpus não mudar
+TFIDF_CACHE_PATH = Path("data/cache/tfidf.joblib")
+
 class TextProcessor:
     def __init__(self):
-        # Carregar modelo spaCy para português
-        try:
-            self.nlp = spacy.load("pt_core_news_lg")
-        except OSError:
-            # Caso o modelo não esteja instalado
-            print("Modelo spaCy pt_core_news_lg não encontrado. Instalando...")
-            os.system("python -m spacy download pt_core_news_lg")
-            self.nlp = spacy.load("pt_core_news_lg")
+        # Modelo spaCy para português (compartilhado no processo)
+        self.nlp = load_nlp()
         
         # Configurar stop words
         self.stopwords = set(stopwords.words('portuguese'))
@@ -41,7 +129,8 @@ class TextProcessor:
             ngram_range=(1, 3)
         )
         
-        # Carregar corpus de redações (se existir)
+        # Carregar redações de exemplo e o corpus de textos (se existirem)
+        self.redacoes = load_redacoes()
         self.corpus = self._load_corpus()
         
         # Treinar vetorizador se houver corpus
@@ -49,36 +138,67 @@ class TextProcessor:
             self._train_tfidf()
     
     def _load_corpus(self) -> List[str]:
-        """Carrega o corpus de redações existentes"""
-        corpus = []
-        redacoes_dir = Path("data/redacoes")
-        
-        if not redacoes_dir.exists():
-            return corpus
-        
-        # Carregar redações de exemplo
-        for filepath in redacoes_dir.glob("*.json"):
-            try:
-                import json
-                with open(filepath, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if "texto_original" in data:
-                        corpus.append(data["texto_original"])
-            except Exception as e:
-                print(f"Erro ao carregar {filepath}: {e}")
-        
-        return corpus
+        """Extrai o corpus de textos das redações de exemplo"""
+        return [
+            data["texto_original"] for data in self.redacoes
+            if isinstance(data, dict) and "texto_original" in data
+        ]
+    
+    def _corpus_digest(self) -> str:
+        """Identifica o conteúdo do corpus para validar o vetorizador em cache"""
+        h = hashlib.sha256()
+        for texto in self.corpus:
+            h.update(texto.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
     
     def _train_tfidf(self):
-        """Treina o vetorizador TF-IDF com o corpus disponível"""
+        """Treina o vetorizador TF-IDF com o corpus disponível, ou o carrega do cache"""
         if not self.corpus:
             return
         
+        digest = self._corpus_digest()
+        if TFIDF_CACHE_PATH.exists():
+            try:
+                cached_digest, vectorizer = joblib.load(TFIDF_CACHE_PATH)
+                if cached_digest == digest:
+                    self.tfidf_vectorizer = vectorizer
+                    return
+            except Exception as e:
+                print(f"Erro ao carregar TF-IDF em cache: {e}")
+        
         try:
             self.tfidf_vectorizer.fit(self.corpus)
             print(f"TF-IDF treinado com {len(self.corpus)} documentos")
         except Exception as e:
             print(f"Erro ao treinar TF-IDF: {e}")
+            return
+        
+        try:
+            # Gravar em arquivo temporário e renomear: vários workers podem iniciar juntos
+            TFIDF_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = TFIDF_CACHE_PATH.with_name(f"{TFIDF_CACHE_PATH.name}.{os.getpid()}.tmp")
+            joblib.dump((digest, self.tfidf_vectorizer), tmp_path, compress=3)
+            os.replace(tmp_path, TFIDF_CACHE_PATH)
+        except Exception as e:
+            print(f"Erro ao salvar TF-IDF em cache: {e}")
+    
+    def atualizar_corpus(self) -> bool:
+        """
+        Relê as redações de exemplo e retreina o TF-IDF se o corpus mudou
+        
+        Returns:
+            True se o corpus foi alterado
+        """
+        digest_anterior = self._corpus_digest() if self.corpus else None
+        self.redacoes = load_redacoes()
+        self.corpus = self._load_corpus()
+        
+        if not self.corpus or self._corpus_digest() == digest_anterior:
+            return False
+        
+        self._train_tfidf()
+        return True
     
     def extract_text_from_file(self, file_path: str, content_type: str) -> str:
         """
@@ -126,20 +246,9 @@ class TextProcessor:
     
     def preprocess_text(self, text: str) -> str:
         """Pré-processa o texto removendo caracteres especiais e normalizando"""
-        # Remover múltiplos espaços em branco
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remover URLs
-        text = re.sub(r'https?://\S+|www\.\S+', '', text)
-        
-        # Normalizar quebras de linha
-        text = re.sub(r'\n+', '\n', text)
-        
-        # Normalizar espaços após pontuação
-        for punct in string.punctuation:
-            text = text.replace(f"{punct} ", f"{punct} ")
-        
-        return text.strip()
+        # Remover URLs e reduzir qualquer sequência de espaços em branco
+        # (inclusive quebras de linha) a um espaço, em uma única passada
+        return _PREPROCESS_RE.sub(_preprocess_sub, text).strip()
     
     def get_paragraphs(self, text: str) -> List[str]:
         """Divide o texto em parágrafos"""
@@ -151,12 +260,26 @@ class TextProcessor:
         """Divide o texto em sentenças usando NLTK"""
         return sent_tokenize(text, language='portuguese')
     
-    def analyze_with_spacy(self, text: str) -> Any:
-        """Processa o texto com SpaCy e retorna o documento processado"""
-        return self.nlp(text)
+    def analyze_with_spacy(self, text: str, with_parser: bool = False) -> Any:
+        """
+        Processa o texto com SpaCy e retorna o documento processado
+        
+        Args:
+            text: Texto a ser processado
+            with_parser: Ativa temporariamente o parser de dependências
+                (necessário para doc.noun_chunks)
+        """
+        if not with_parser:
+            return self.nlp(text)
+        
+        self.nlp.enable_pipe("parser")
+        try:
+            return self.nlp(text)
+        finally:
+            self.nlp.disable_pipe("parser")
     
     def extract_noun_phrases(self, doc) -> List[str]:
-        """Extrai sintagmas nominais do texto"""
+        """Extrai sintagmas nominais do texto (doc processado com with_parser=True)"""
         return [chunk.text for chunk in doc.noun_chunks]
     
     def calculate_tfidf(self, text: str) -> Dict[str, float]:
@@ -176,17 +299,26 @@ class TextProcessor:
             tfidf_matrix = self.tfidf_vectorizer.transform([text])
             feature_names = self.tfidf_vectorizer.get_feature_names_out()
         
-        # Converter para dicionário de termo -> score
-        dense = tfidf_matrix.todense()
-        dense_list = dense.tolist()[0]
-        
-        return {feature_names[i]: dense_list[i] for i in range(len(feature_names)) if dense_list[i] > 0}
+        # Converter para dicionário de termo -> score percorrendo só os não nulos
+        row = tfidf_matrix.tocsr()[0]
+        return {feature_names[i]: float(v) for i, v in zip(row.indices, row.data)}
     
     def get_most_important_terms(self, text: str, top_n: int = 10) -> List[Tuple[str, float]]:
         """Retorna os termos mais importantes de acordo com TF-IDF"""
         tfidf_scores = self.calculate_tfidf(text)
-        sorted_terms = sorted(tfidf_scores.items(), key=lambda x: x[1], reverse=True)
-        return sorted_terms[:top_n]
+        if not tfidf_scores or top_n <= 0:
+            return []
+        
+        terms = list(tfidf_scores)
+        scores = np.fromiter(tfidf_scores.values(), dtype=np.float64, count=len(terms))
+        
+        # Seleção parcial dos top_n e ordenação apenas deles
+        if top_n < len(scores):
+            top = np.argpartition(scores, -top_n)[-top_n:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(terms[i], float(scores[i])) for i in top]
     
     def calculate_text_metrics(self, text: str) -> Dict[str, Any]:
         """
@@ -201,27 +333,46 @@ class TextProcessor:
         # Processar com spaCy
         doc = self.analyze_with_spacy(clean_text)
         
+        return self._metrics_from_doc(doc, clean_text)
+    
+    def calculate_text_metrics_batch(self, texts: List[str], batch_size: int = 32) -> List[Dict[str, Any]]:
+        """
+        Calcula as métricas de vários textos processando-os em lote com spaCy
+        
+        Returns:
+            Uma lista de métricas por texto, na mesma ordem da entrada
+        """
+        clean_texts = [self.preprocess_text(text) for text in texts]
+        docs = self.nlp.pipe(clean_texts, batch_size=batch_size)
+        return [self._metrics_from_doc(doc, clean) for doc, clean in zip(docs, clean_texts)]
+    
+    def _metrics_from_doc(self, doc, clean_text: str) -> Dict[str, Any]:
+        """Métricas de um texto pré-processado a partir do Doc do spaCy"""
         # Obter parágrafos e sentenças
         paragraphs = self.get_paragraphs(clean_text)
         sentences = self.get_sentences(clean_text)
         
-        # Calcular métricas
-        words = [token.text for token in doc if not token.is_punct and not token.is_space]
+        # Converter tokens (exceto pontuação e espaços) em arrays numéricos
+        words = [token for token in doc if not token.is_punct and not token.is_space]
+        num_words = len(words)
+        lengths = np.fromiter((len(token) for token in words), dtype=np.int32, count=num_words)
+        pos = np.fromiter((token.pos for token in words), dtype=np.int32, count=num_words)
         
-        # Contagem de tipos de palavras
-        pos_counts = Counter([token.pos_ for token in doc if not token.is_punct and not token.is_space])
+        # Soma dos comprimentos e contagem de tipos de palavras
+        total_length, pos_hist = _token_metrics(lengths, pos, N_POS_IDS)
+        pos_counts = {POS_NAMES[i]: int(pos_hist[i]) for i in np.flatnonzero(pos_hist)}
         
         # Comprimento médio das sentenças
-        avg_sentence_length = len(words) / len(sentences) if sentences else 0
+        avg_sentence_length = num_words / len(sentences) if sentences else 0
         
         # Comprimento médio das palavras
-        avg_word_length = sum(len(word) for word in words) / len(words) if words else 0
+        avg_word_length = total_length / num_words if num_words else 0
         
         return {
-            "num_palavras": len(words),
+            "num_palavras": num_words,
             "num_sentencas": len(sentences),
             "num_paragrafos": len(paragraphs),
             "tamanho_medio_sentencas": avg_sentence_length,
             "tamanho_medio_palavras": avg_word_length,
-            "tipo_palavras": dict(pos_counts)
+            "tipo_palavras": pos_counts
         }
@@ -1,10 +1,12 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 import os
+import sys
 from dotenv import load_dotenv
-import json
 from pathlib import Path
 import logging
 import time
+import asyncio
 from datetime import datetime
 
 # Configurar logging
@@ -26,13 +28,17 @@ celery_app = Celery(
 
 # Configurações do Celery
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # msgpack é mais compacto e rápido que JSON; JSON segue aceito para
+    # mensagens enfileiradas antes da troca
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
+    result_serializer='msgpack',
+    result_accept_content=['msgpack', 'json'],
     timezone='America/Sao_Paulo',
     enable_utc=True,
     task_routes={
         'app.worker.processar_redacao': {'queue': 'analise_redacao'},
+        'app.worker.processar_redacoes_batch': {'queue': 'analise_redacao'},
         'app.worker.treinar_modelos': {'queue': 'treinamento'},
         'app.worker.atualizar_indices': {'queue': 'indexacao'}
     },
@@ -42,16 +48,18 @@ celery_app.conf.update(
 
 # Importar dependências internas
 try:
-    from app.utils.text_processor import TextProcessor
+    from app.utils.text_processor import TextProcessor, SPACY_MODEL
     from app.utils.redacao_analyzer import RedacaoAnalyzer
     from app.models.schemas import RedacaoAnalise
+    from app.utils.ia_agent import ia_agent
 except ImportError:
     logger.warning("Não foi possível importar módulos da aplicação. Isso é esperado durante a inicialização.")
 
 # Importar serviços de armazenamento/banco de dados
 try:
-    from pymongo import MongoClient
-    from elasticsearch import Elasticsearch
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from elasticsearch import AsyncElasticsearch
+    from elasticsearch.helpers import async_bulk
     import boto3
 except ImportError:
     logger.warning("Dependências de serviços externos não encontradas. Instale-as com pip.")
@@ -61,6 +69,77 @@ mongodb_client = None
 elasticsearch_client = None
 s3_client = None
 
+# Event loop persistente por processo: os clientes assíncronos (Motor,
+# Elasticsearch e OpenAI) ficam ligados a ele e reaproveitam as conexões
+# entre tarefas
+_LOOP = None
+
+def run_async(coro):
+    """Executa uma corrotina no event loop do processo"""
+    global _LOOP
+    
+    if _LOOP is None or _LOOP.is_closed():
+        _LOOP = asyncio.new_event_loop()
+        asyncio.set_event_loop(_LOOP)
+    return _LOOP.run_until_complete(coro)
+
+# Índice de busca das redações e tamanho dos blocos do bulk
+ES_INDEX = "redacoes"
+ES_BULK_CHUNK_SIZE = 500
+
+def documento_indice(redacao_id, titulo, texto, analise, metadata):
+    """Documento de busca de uma redação analisada"""
+    return {
+        "id": redacao_id,
+        "titulo": titulo,
+        "texto": texto[:1000],  # apenas parte inicial para indexação
+        "resumo": analise.get("resumo_executivo"),
+        "nota_geral": analise.get("nota_geral"),
+        "timestamp": datetime.now().isoformat(),
+        "metadata": metadata or {}
+    }
+
+# Processador e analisador compartilhados pelas tarefas do processo
+_TEXT_PROCESSOR = None
+_ANALYZER = None
+
+def get_analyzer():
+    """Cria (uma vez por processo) o TextProcessor e o RedacaoAnalyzer"""
+    global _TEXT_PROCESSOR, _ANALYZER
+    
+    if _ANALYZER is None:
+        _TEXT_PROCESSOR = TextProcessor()
+        _ANALYZER = RedacaoAnalyzer(text_processor=_TEXT_PROCESSOR)
+    return _TEXT_PROCESSOR, _ANALYZER
+
+@worker_init.connect
+def verificar_modelos(**kwargs):
+    """
+    Recusa iniciar o worker sem o modelo spaCy instalado
+    
+    Roda no processo principal, antes do pool e do consumo da fila. O Signal
+    do Celery registra e engole exceções dos receptores, por isso a saída é
+    explícita (SystemExit não é capturado como Exception).
+    """
+    import spacy
+    
+    if not spacy.util.is_package(SPACY_MODEL):
+        logger.critical(
+            "Modelo spaCy %s não instalado. Execute 'python -m spacy download %s' na implantação.",
+            SPACY_MODEL, SPACY_MODEL
+        )
+        sys.exit(1)
+
+@worker_process_init.connect
+def inicializar_processo(**kwargs):
+    """
+    Prepara cada processo do worker antes da primeira tarefa: carrega spaCy,
+    NLTK e TF-IDF e cria os clientes dos serviços externos
+    """
+    get_analyzer()
+    logger.info("Modelos de processamento de texto carregados")
+    init_services()
+
 def init_services():
     """Inicializa conexões com serviços externos"""
     global mongodb_client, elasticsearch_client, s3_client
@@ -68,12 +147,17 @@ def init_services():
     try:
         # MongoDB
         mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
-        mongodb_client = MongoClient(mongodb_uri)
+        mongodb_client = AsyncIOMotorClient(mongodb_uri, maxPoolSize=50, minPoolSize=5)
         logger.info("Conexão com MongoDB estabelecida")
         
         # Elasticsearch
         elasticsearch_uri = os.getenv('ELASTICSEARCH_URI', 'http://localhost:9200')
-        elasticsearch_client = Elasticsearch(elasticsearch_uri)
+        elasticsearch_client = AsyncElasticsearch(
+            elasticsearch_uri,
+            http_compress=True,
+            request_timeout=10,
+            connections_per_node=25
+        )
         logger.info("Conexão com Elasticsearch estabelecida")
         
         # S3/MinIO
@@ -118,27 +202,38 @@ def processar_redacao(redacao_id, texto, titulo=None, metadata=None):
     if not mongodb_client:
         init_services()
     
+    return run_async(_processar_redacao(redacao_id, texto, titulo, metadata))
+
+async def _processar_redacao(redacao_id, texto, titulo, metadata):
+    """Corpo assíncrono de processar_redacao"""
+    db = mongodb_client.elysia
+    
     try:
-        # Inicializar processador e analisador
-        text_processor = TextProcessor()
-        analyzer = RedacaoAnalyzer()
+        # Processador e analisador já carregados no processo
+        text_processor, analyzer = get_analyzer()
         
         # Registrar início do processamento
         inicio = time.time()
         
-        # Analisar a redação
-        resultado_analise = analyzer.analisar_completo(texto, titulo)
+        # Relatório do modelo de linguagem (análise, pontos-chave e sugestões)
+        relatorio = await ia_agent.full_report(texto)
+        if "error" in relatorio:
+            raise RuntimeError(relatorio["error"])
+        
+        # Métricas locais calculadas com spaCy
+        analise_dict = {
+            **relatorio,
+            "id": redacao_id,
+            "titulo": titulo,
+            "metricas": text_processor.calculate_text_metrics(texto),
+            "analise_paragrafos": analyzer.analisar_paragrafos(texto),
+            # Desvios da base de regras (concordância, regência, crase), numa única varredura
+            "problemas_regras": analyzer.encontrar_problemas(texto)
+        }
         
         # Calcular tempo de processamento
         tempo_processamento = time.time() - inicio
         
-        # Adicionar metadados e informações da análise
-        resultado_analise.id = redacao_id
-        resultado_analise.titulo = titulo
-        
-        # Converter para dict para armazenamento
-        analise_dict = resultado_analise.dict()
-        
         # Adicionar metadados adicionais
         analise_dict.update({
             "metadata": metadata or {},
@@ -146,25 +241,15 @@ def processar_redacao(redacao_id, texto, titulo=None, metadata=None):
             "tempo_processamento": tempo_processamento
         })
         
-        # Salvar no MongoDB
-        db = mongodb_client.elysia
-        db.analises.insert_one(analise_dict)
-        
-        # Indexar no Elasticsearch
+        # Salvar no MongoDB e indexar no Elasticsearch em paralelo
+        escritas = [db.analises.insert_one(analise_dict)]
         if elasticsearch_client:
-            elasticsearch_client.index(
-                index="redacoes",
+            escritas.append(elasticsearch_client.index(
+                index=ES_INDEX,
                 id=redacao_id,
-                document={
-                    "id": redacao_id,
-                    "titulo": titulo,
-                    "texto": texto[:1000],  # apenas parte inicial para indexação
-                    "resumo": resultado_analise.resumo_executivo,
-                    "nota_geral": resultado_analise.nota_geral,
-                    "timestamp": datetime.now().isoformat(),
-                    "metadata": metadata or {}
-                }
-            )
+                document=documento_indice(redacao_id, titulo, texto, relatorio, metadata)
+            ))
+        await asyncio.gather(*escritas)
         
         logger.info(f"Processamento da redação {redacao_id} concluído em {tempo_processamento:.2f}s")
         return redacao_id
@@ -172,16 +257,101 @@ def processar_redacao(redacao_id, texto, titulo=None, metadata=None):
     except Exception as e:
         logger.error(f"Erro no processamento da redação {redacao_id}: {e}")
         # Registrar erro no MongoDB para auditoria
-        if mongodb_client:
-            db = mongodb_client.elysia
-            db.erros_processamento.insert_one({
-                "redacao_id": redacao_id,
-                "erro": str(e),
-                "timestamp": datetime.now().isoformat(),
-                "texto_parcial": texto[:500] if texto else None  # Amostra para debug
-            })
+        await db.erros_processamento.insert_one({
+            "redacao_id": redacao_id,
+            "erro": str(e),
+            "timestamp": datetime.now().isoformat(),
+            "texto_parcial": texto[:500] if texto else None  # Amostra para debug
+        })
         raise
 
+@celery_app.task(name='app.worker.processar_redacoes_batch')
+def processar_redacoes_batch(itens):
+    """
+    Processa várias redações agrupando as chamadas ao modelo de linguagem
+    
+    Ponto de entrada manual (nenhum produtor no código enfileira esta tarefa):
+    destina-se a reprocessamentos e cargas em massa, p. ex.
+    `celery_app.send_task('app.worker.processar_redacoes_batch', args=[itens])`.
+    
+    Args:
+        itens: Lista de dicts com "redacao_id", "texto" e, opcionalmente,
+            "titulo" e "metadata"
+    
+    Returns:
+        IDs das redações processadas com sucesso; as que falharam ficam
+        registradas em erros_processamento
+    """
+    logger.info(f"Iniciando processamento em lote de {len(itens)} redações")
+    
+    if not mongodb_client:
+        init_services()
+    
+    return run_async(_processar_lote(itens))
+
+async def _processar_lote(itens):
+    """Corpo assíncrono de processar_redacoes_batch"""
+    inicio = time.time()
+    db = mongodb_client.elysia
+    analises = await ia_agent.analyze_texts([item["texto"] for item in itens])
+    
+    # Itens em que a IA falhou não são gravados como análise: vão para
+    # erros_processamento, como no processamento individual
+    falhas = [(item, analise) for item, analise in zip(itens, analises) if "error" in analise]
+    if falhas:
+        logger.error(f"{len(falhas)} de {len(itens)} redações do lote falharam na análise")
+        await db.erros_processamento.insert_many([
+            {
+                "redacao_id": item["redacao_id"],
+                "erro": str(analise["error"]),
+                "timestamp": datetime.now().isoformat(),
+                "texto_parcial": item["texto"][:500] if item["texto"] else None  # Amostra para debug
+            }
+            for item, analise in falhas
+        ], ordered=False)
+        validos = [i for i, analise in enumerate(analises) if "error" not in analise]
+        itens = [itens[i] for i in validos]
+        analises = [analises[i] for i in validos]
+    textos = [item["texto"] for item in itens]
+    
+    # Métricas locais de todo o lote em uma única passada do spaCy
+    text_processor, analyzer = get_analyzer()
+    metricas = text_processor.calculate_text_metrics_batch(textos)
+    tempo_processamento = time.time() - inicio
+    
+    documentos = []
+    for item, analise, metricas_item in zip(itens, analises, metricas):
+        documentos.append({
+            **analise,
+            "id": item["redacao_id"],
+            "titulo": item.get("titulo"),
+            "metricas": metricas_item,
+            "problemas_regras": analyzer.encontrar_problemas(item["texto"]),
+            "metadata": item.get("metadata") or {},
+            "timestamp_processamento": datetime.now().isoformat(),
+            "tempo_processamento": tempo_processamento
+        })
+    
+    if documentos:
+        # Gravar no MongoDB e indexar o lote inteiro em um único bulk
+        escritas = [db.analises.insert_many(documentos, ordered=False)]
+        if elasticsearch_client:
+            acoes = [
+                {
+                    "_index": ES_INDEX,
+                    "_id": item["redacao_id"],
+                    "_source": documento_indice(
+                        item["redacao_id"], item.get("titulo"), item["texto"], analise, item.get("metadata")
+                    )
+                }
+                for item, analise in zip(itens, analises)
+            ]
+            escritas.append(async_bulk(elasticsearch_client, acoes, chunk_size=ES_BULK_CHUNK_SIZE))
+        await asyncio.gather(*escritas)
+    
+    logger.info(f"Lote de {len(itens)} redações concluído em {tempo_processamento:.2f}s")
+    return [item["redacao_id"] for item in itens]
+
 @celery_app.task(name='app.worker.treinar_modelos')
 def treinar_modelos():
     """
@@ -206,10 +376,54 @@ def atualizar_indices():
     """
     logger.info("Iniciando atualização de índices")
     
-    # Implementação da indexação
+    # Retreinar o TF-IDF (e regravar o cache em disco) se o corpus mudou
+    text_processor, analyzer = get_analyzer()
+    if text_processor.atualizar_corpus():
+        analyzer.definir_exemplos(text_processor.redacoes)
+        logger.info("Vetorizador TF-IDF retreinado com o corpus atualizado")
     
-    return {"status": "success", "message": "Índices atualizados com sucesso"}
+    # Reindexar as análises armazenadas
+    if not mongodb_client:
+        init_services()
+    indexados = run_async(_reindexar_analises()) if elasticsearch_client else 0
+    
+    return {
+        "status": "success",
+        "message": "Índices atualizados com sucesso",
+        "documentos_indexados": indexados
+    }
 
-# Inicialização na importação do módulo
-if __name__ != '__main__':
-    init_services()
+async def _reindexar_analises():
+    """
+    Envia ao Elasticsearch, em blocos de ES_BULK_CHUNK_SIZE, os campos de
+    busca de todas as análises do MongoDB
+    
+    Usa update parcial com upsert: o trecho do texto indexado na análise
+    original (que não fica na coleção analises) é preservado.
+    """
+    cursor = mongodb_client.elysia.analises.find(
+        {"id": {"$exists": True}},
+        {"id": 1, "titulo": 1, "resumo_executivo": 1, "nota_geral": 1, "metadata": 1}
+    )
+    
+    async def acoes():
+        async for analise in cursor:
+            yield {
+                "_op_type": "update",
+                "_index": ES_INDEX,
+                "_id": analise["id"],
+                "doc": {
+                    "id": analise["id"],
+                    "titulo": analise.get("titulo"),
+                    "resumo": analise.get("resumo_executivo"),
+                    "nota_geral": analise.get("nota_geral"),
+                    "metadata": analise.get("metadata") or {}
+                },
+                "doc_as_upsert": True
+            }
+    
+    indexados, _ = await async_bulk(
+        elasticsearch_client, acoes(), chunk_size=ES_BULK_CHUNK_SIZE, request_timeout=60
+    )
+    logger.info(f"{indexados} análises reindexadas no Elasticsearch")
+    return indexados
@@ -1,22 +1,44 @@
 #!/usr/bin/env python
 import sys
+import argparse
 import os
 from pathlib import Path
-import json
+import re
+import math
+import mmap
+import functools
+import struct
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
+import logging.handlers
+import bson
 from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import InsertOne, WriteConcern
 
 # Adicionar diretório raiz ao path
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Pool pequeno para o script: poucas escritas, falha rápida sem servidor.
+# Precisa ser definido antes de importar o cliente (criado na importação)
+os.environ.setdefault("MONGODB_MAX_POOL_SIZE", "8")
+os.environ.setdefault("MONGODB_MIN_POOL_SIZE", "2")
+os.environ.setdefault("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000")
+os.environ.setdefault("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "3000")
+
 logger = logging.getLogger(__name__)
 
-# Importar repositórios
+# uvloop é opcional (não existe no Windows): sem ele, o loop padrão do asyncio
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
+# Importar cliente MongoDB e repositórios
+from app.database.mongo_client import mongo_client
 from app.database.repositories import (
     user_repository,
     redacao_repository, 
@@ -24,31 +46,307 @@ from app.database.repositories import (
     corpus_repository
 )
 
-# Importar RAG Manager
-from app.database.rag_manager import rag_manager
+SAMPLES_DIR = root_dir / "samples"
 
-# Redação de qualidade média (nota 7.0)
+@functools.lru_cache(maxsize=None)
+def _ler_amostra(nome: str) -> str:
+    """
+    Lê um texto de exemplo de samples/ uma única vez por processo
+    
+    O arquivo é mapeado em memória (somente leitura): as páginas vêm do cache
+    do sistema operacional, compartilhado entre os scripts que usam a amostra.
+    """
+    with open(SAMPLES_DIR / nome, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return str(m[:], "utf-8")
+
+# Redação de qualidade média (nota 7.0), texto em samples/redacao_media.txt
 REDACAO_MEDIA = {
     "titulo": "Desigualdade social no Brasil",
-    "texto": """
-    A desigualdade social no Brasil é um problema historico que permanece até os dias atuais. Desde a colonização, existe uma concentração de renda nas mãos de poucos, o que gerou um grande abismo entre as classes sociais, dificultando o acesso de muitos cidadoes a direitos básicos.
+    "texto": _ler_amostra("redacao_media.txt")
+}
 
-    Em primeiro lugar, é preciso entender que a desigualdade econômica esta diretamente relacionada com a má distribuição de oportunidades. Segundo dados do IBGE, os 10% mais ricos concentram mais de 40% da renda do país, enquanto os 10% mais pobres detêm menos de 1%. Esta disparidade reflete-se no acesso à educação de qualidade, saúde e moradia, perpetuando um ciclo de pobreza que é dificil de ser quebrado.
+# Correções ortográficas aplicadas ao texto (uma única varredura; chaves mais
+# longas primeiro para que prevaleçam sobre prefixos)
+CORRECOES = {
+    "historico": "histórico",
+    "cidadoes": "cidadãos",
+    "esta": "está",
+    "dificil": "difícil",
+    "contribuiram": "contribuíram",
+    "ascenção": "ascensão",
+    "salarios": "salários",
+    "tambem": "também",
+    "indices": "índices",
+    "individuos": "indivíduos",
+    "valorizacão": "valorização",
+}
+_CORRECOES_RE = re.compile("|".join(map(re.escape, sorted(CORRECOES, key=len, reverse=True))))
 
-    Além disso, fatores históricos como a escravidão e a falta de políticas efetivas de inclusão contribuiram para que grupos marginalizados, especialmente a população negra, enfrentassem barreiras ainda maiores para a ascenção social. Estudos mostram que pessoas negras recebem salarios menores e ocupam menos cargos de liderança, mesmo quando possuem a mesma qualificação que pessoas brancas, evidenciando um racismo estrutural que agrava a desigualdade.
+# As correções são gravadas como diff sobre o texto da redação (ver aplicar_correcoes),
+# sem uma segunda cópia do texto
+CORRECOES_DIFF = [
+    {"pos": m.start(), "del": len(m.group(0)), "ins": CORRECOES[m.group(0)]}
+    for m in _CORRECOES_RE.finditer(REDACAO_MEDIA["texto"])
+]
 
-    O Brasil tambem apresenta disparidades regionais significativas. O Nordeste e o Norte do país têm indices de desenvolvimento humano inferiores aos do Sul e Sudeste, demonstrando que a desigualdade não se expressa apenas entre individuos, mas também entre regiões. Investimentos públicos desproporcionais ao longo da história contribuiram para essa configuração.
+# Métricas simples do texto, calculadas uma única vez na importação
+_TEXTO = REDACAO_MEDIA["texto"]
+_TOKENS = _TEXTO.split()
+_PALAVRAS = len(_TOKENS)
+_SENTENCAS = sum(1 for s in _TEXTO.split('.') if s.strip())
+_PARAGRAFOS = sum(1 for p in _TEXTO.split('\n\n') if p.strip())
 
-    Para enfrentar esse cenário, é necessário implementar políticas públicas que combinem crescimento econômico com distribuição de renda. Programas de transferência de renda, como o Bolsa Família, representaram avanços, mas precisam ser complementados com investimentos em educação pública de qualidade, que é o principal mecanismo de mobilidade social.
+# Proporção estimada de cada classe gramatical (deve somar 1)
+_POS_RATIOS = (
+    ("NOUN", 0.25),
+    ("VERB", 0.20),
+    ("ADJ", 0.10),
+    ("DET", 0.15),
+    ("PREP", 0.12),
+    ("CONJ", 0.05),
+    ("OTHER", 0.13),
+)
+assert math.isclose(sum(ratio for _, ratio in _POS_RATIOS), 1.0), "_POS_RATIOS deve somar 1"
+_TIPO_PALAVRAS = {pos: int(_PALAVRAS * ratio) for pos, ratio in _POS_RATIOS}
 
-    Portanto, a redução da desigualdade social no Brasil requer um esforço coletivo que envolva governo, empresas e sociedade civil. Somente com políticas consistentes de inclusão, valorizacão da diversidade e distribuição justa de oportunidades será possível construir um país mais equilibrado e justo para todos os cidadãos.
-    """
+# Posição [início, fim] da primeira ocorrência de cada trecho apontado em
+# problemas_gramaticais, em uma única varredura do texto
+_TERMOS_PROBLEMAS = ("historico", "cidadoes", "esta", "estudos mostram")
+_POSICOES = {}
+for _m in re.finditer(r"\b(?:" + "|".join(map(re.escape, _TERMOS_PROBLEMAS)) + r")\b", _TEXTO, re.IGNORECASE):
+    _POSICOES.setdefault(_m.group(0).lower(), [_m.start(), _m.end()])
+assert len(_POSICOES) == len(_TERMOS_PROBLEMAS), "Trecho de problemas_gramaticais ausente do texto"
+
+TAMANHO_BYTES = len(_TEXTO)
+METRICAS = {
+    "num_palavras": _PALAVRAS,
+    "num_sentencas": _SENTENCAS,
+    "num_paragrafos": _PARAGRAFOS,
+    "tamanho_medio_sentencas": _PALAVRAS / _SENTENCAS if _SENTENCAS else 0,
+    "tamanho_medio_palavras": sum(map(len, _TOKENS)) / _PALAVRAS if _PALAVRAS else 0,
+    "tipo_palavras": _TIPO_PALAVRAS
+}
+
+# Conteúdo fixo da análise (nota 7.0): montado uma vez na importação e
+# compartilhado por referência, já que a gravação apenas lê os valores
+_ANALISE_TEMPLATE = {
+    "correcoes": CORRECOES_DIFF,
+    "resumo_executivo": "Redação com conteúdo adequado, mas apresenta diversos problemas de acentuação e alguns erros gramaticais. A estrutura argumentativa é satisfatória, porém a conclusão poderia ser mais impactante.",
+    "metricas": METRICAS,
+    "problemas_gramaticais": [
+        {
+            "tipo": "acentuação",
+            "texto_original": "historico",
+            "sugestao": "histórico",
+            "explicacao": "Palavra paroxítona terminada em 'o' com sílaba tônica com 'i' deve ser acentuada",
+            "posicao": _POSICOES["historico"]
+        },
+        {
+            "tipo": "acentuação",
+            "texto_original": "cidadoes",
+            "sugestao": "cidadãos",
+            "explicacao": "Plural de palavras terminadas em 'ão' geralmente terminam em 'ãos', 'ães' ou 'ões'",
+            "posicao": _POSICOES["cidadoes"]
+        },
+        {
+            "tipo": "acentuação",
+            "texto_original": "esta",
+            "sugestao": "está",
+            "explicacao": "Verbo 'estar' na 3ª pessoa do singular do presente do indicativo deve ser acentuado",
+            "posicao": _POSICOES["esta"]
+        },
+        {
+            "tipo": "concordância",
+            "texto_original": "estudos mostram",
+            "sugestao": "estudos mostram",
+            "explicacao": "Concordância adequada entre sujeito e verbo",
+            "posicao": _POSICOES["estudos mostram"]
+        }
+    ],
+    "analise_estrutural": {
+        "introducao": {
+            "identificada": True,
+            "qualidade": "regular",
+            "presenca_tese": True
+        },
+        "desenvolvimento": {
+            "identificada": True,
+            "qualidade": "boa",
+            "numero_argumentos": 3
+        },
+        "conclusao": {
+            "identificada": True,
+            "qualidade": "regular",
+            "retomada_tese": True
+        },
+        "proporcao": {
+            "introducao": 0.15,
+            "desenvolvimento": 0.7,
+            "conclusao": 0.15
+        }
+    },
+    "analise_coesao": {
+        "conectivos_utilizados": [
+            {"texto": "além disso", "tipo": "aditivo", "frequencia": 1},
+            {"texto": "também", "tipo": "aditivo", "frequencia": 1},
+            {"texto": "portanto", "tipo": "conclusivo", "frequencia": 1}
+        ],
+        "repeticoes_excessivas": [
+            {"termo": "desigualdade", "frequencia": 5, "sugestoes": ["disparidade", "diferença social"]}
+        ],
+        "qualidade_transicao": {
+            "avaliacao": "regular",
+            "pontuacao": 6.5
+        }
+    },
+    "analise_vocabulario": {
+        "riqueza_lexical": 0.65,
+        "palavras_incomuns": ["ascenção", "disparidade"],
+        "registro_linguistico": "formal com falhas",
+        "sugestoes_vocabulario": [
+            {"original": "grande abismo", "sugestao": "disparidade significativa"},
+            {"original": "fatores históricos", "sugestao": "contexto histórico"}
+        ]
+    },
+    "analise_argumentativa": {
+        "argumentos_identificados": [
+            {"texto": "Segundo dados do IBGE, os 10% mais ricos concentram mais de 40% da renda do país", "tipo": "estatística", "forca": "forte"},
+            {"texto": "fatores históricos como a escravidão", "tipo": "causa-efeito", "forca": "média"},
+            {"texto": "O Nordeste e o Norte do país têm indices de desenvolvimento humano inferiores", "tipo": "comparação", "forca": "média"}
+        ],
+        "qualidade_argumentativa": {
+            "avaliacao": "satisfatória",
+            "pontuacao": 7.0
+        },
+        "fontes_citadas": ["IBGE"]
+    },
+    "notas": [
+        {
+            "competencia": "Domínio da norma culta",
+            "nota": 6.0,
+            "justificativa": "Apresenta diversos problemas de acentuação e alguns erros ortográficos",
+            "pontos_fortes": ["Estrutura sintática adequada"],
+            "pontos_melhorar": ["Revisão de regras de acentuação", "Atenção à ortografia"]
+        },
+        {
+            "competencia": "Compreensão do tema",
+            "nota": 8.0,
+            "justificativa": "Demonstra boa compreensão do tema da desigualdade social no Brasil",
+            "pontos_fortes": ["Abordagem histórica", "Menção a elementos econômicos e sociais"],
+            "pontos_melhorar": ["Poderia explorar mais propostas de solução"]
+        },
+        {
+            "competencia": "Argumentação",
+            "nota": 7.0,
+            "justificativa": "Argumentação satisfatória com uso de alguns dados",
+            "pontos_fortes": ["Uso de dados estatísticos", "Abordagem multifacetada do problema"],
+            "pontos_melhorar": ["Aprofundar a análise crítica", "Usar mais fontes de dados"]
+        },
+        {
+            "competencia": "Coesão textual",
+            "nota": 7.0,
+            "justificativa": "Apresenta coesão adequada, mas com algumas repetições",
+            "pontos_fortes": ["Uso de alguns conectivos adequados"],
+            "pontos_melhorar": ["Diversificar conectivos", "Evitar repetições"]
+        },
+        {
+            "competencia": "Proposta de intervenção",
+            "nota": 7.0,
+            "justificativa": "Apresenta proposta genérica para solução do problema",
+            "pontos_fortes": ["Menciona políticas públicas necessárias"],
+            "pontos_melhorar": ["Detalhar propostas concretas", "Especificar agentes e ações"]
+        }
+    ],
+    "nota_geral": 7.0,
+    "recomendacoes": [
+        "Revisar regras de acentuação gráfica",
+        "Diversificar o vocabulário para evitar repetições",
+        "Usar mais dados e estatísticas para fortalecer a argumentação",
+        "Elaborar uma proposta de intervenção mais detalhada e concreta",
+        "Melhorar a conclusão para torná-la mais impactante"
+    ],
+    "tempo_processamento_ms": 3500
 }
 
-async def adicionar_redacao_media():
-    """Adiciona uma redação de qualidade média (nota 7.0) ao MongoDB"""
+# Parte fixa do exemplo do corpus
+_CORPUS_TEMPLATE = {
+    "titulo": REDACAO_MEDIA["titulo"],
+    "texto": REDACAO_MEDIA["texto"],
+    "categoria": "comum",
+    "temas": ["desigualdade", "problemas sociais", "Brasil"],
+    "nivel_qualidade": 7.0
+}
+
+# Os modelos já codificados em BSON: a cada execução só os poucos campos
+# variáveis (IDs e datas) passam pelo codificador
+_ANALISE_BSON = bson.encode(_ANALISE_TEMPLATE)
+_CORPUS_BSON = bson.encode(_CORPUS_TEMPLATE)
+
+def _documento_raw(campos: dict, modelo_bson: bytes) -> RawBSONDocument:
+    """
+    Monta o documento final concatenando, em BSON, os campos variáveis e o modelo fixo
+    
+    Um documento BSON é int32 (tamanho total) + elementos + 0x00, então basta
+    juntar os elementos dos dois e recalcular o tamanho. As chaves não podem se repetir.
+    """
+    elementos = bson.encode(campos)[4:-1] + modelo_bson[4:-1]
+    return RawBSONDocument(struct.pack("<i", len(elementos) + 5) + elementos + b"\x00")
+
+# Escritas de carga inicial: ninguém aguarda durabilidade, então dispensa o
+# journal (sem fsync por escrita). Escritas de usuários mantêm o padrão do cliente
+SEED_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+# Tempo máximo de espera pelos embeddings ao final do script (segundos)
+EMBEDDING_TIMEOUT = 30.0
+
+def _enfileirar_embedding(redacao_id: ObjectId) -> bool:
+    """Enfileira a redação para o embedding em lote; a falha não interrompe o script"""
+    try:
+        # Importado só aqui: carrega OpenAI SDK, tiktoken e numpy, dispensáveis
+        # quando o script roda com --skip-embedding
+        from app.database.rag_manager import seed_embedding_queue
+        seed_embedding_queue.enqueue(redacao_id, REDACAO_MEDIA["texto"], REDACAO_MEDIA["titulo"])
+        return True
+    except Exception as e:
+        logger.warning("Não foi possível enfileirar o embedding: %s", e)
+        return False
+
+async def gerar_embeddings_pendentes() -> int:
+    """
+    Gera, em uma única rodada de chamadas à OpenAI, os embeddings enfileirados
+    pelos scripts de carga; a falha (sem OpenAI API) não interrompe o script
+    """
     try:
-        print("Adicionando redação de qualidade média (nota 7.0) ao MongoDB...")
+        from app.database.rag_manager import seed_embedding_queue
+        return await asyncio.wait_for(seed_embedding_queue.flush(), timeout=EMBEDDING_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Embeddings não concluídos em %.0fs", EMBEDDING_TIMEOUT)
+    except Exception as e:
+        logger.warning("Não foi possível gerar embeddings (requer OpenAI API): %s", e)
+    return 0
+
+async def adicionar_redacao_media(gerar_embedding: bool = True):
+    """
+    Adiciona uma redação de qualidade média (nota 7.0) ao MongoDB
+    
+    Args:
+        gerar_embedding: Se False, não enfileira o embedding (nem importa o RAG Manager);
+            os enfileirados são gerados juntos por gerar_embeddings_pendentes()
+    """
+    try:
+        logger.info("Adicionando redação de qualidade média (nota 7.0) ao MongoDB...")
+        
+        # Garantir coleções e índices antes das escritas
+        await mongo_client.ensure_indexes()
+        
+        # IDs gerados no cliente: as referências entre documentos ficam prontas
+        # antes de qualquer escrita
+        redacao_id = ObjectId()
+        analise_id = ObjectId()
+        corpus_id = ObjectId()
+        
+        # Um único instante para todos os documentos relacionados
+        agora = datetime.now(timezone.utc)
         
         # 1. Obter ou criar usuário para a redação
         user_data = {
@@ -56,251 +354,123 @@ async def adicionar_redacao_media():
             "nome": "Avaliador Sistema",
             "tipo": "admin",
             "instituicao": "Sistema Elysia",
-            "data_cadastro": datetime.now(),
-            "ultimo_acesso": datetime.now(),
+            "data_cadastro": agora,
+            "ultimo_acesso": agora,
             "configuracoes": {"idioma": "pt-BR"}
         }
         
-        existing_user = await user_repository.find_by_email("avaliador@exemplo.com")
-        if existing_user:
-            user_id = str(existing_user["_id"])
-            print(f"Usuário existente encontrado com ID: {user_id}")
-        else:
-            user_id = await user_repository.insert_one(user_data)
-            print(f"Novo usuário criado com ID: {user_id}")
+        user_id = await user_repository.get_or_create_by_email(user_data["email"], user_data)
+        if user_id is None:
+            raise RuntimeError("Falha ao obter ou criar o usuário avaliador")
+        logger.info("Usuário avaliador com ID: %s", user_id)
         
-        # 2. Criar a redação no MongoDB
+        # 2. Montar a redação
         redacao_data = {
-            "usuario_id": ObjectId(user_id),
+            "_id": redacao_id,
+            "usuario_id": user_id,
             "titulo": REDACAO_MEDIA["titulo"],
             "status": "concluida",
-            "data_envio": datetime.now(),
-            "data_conclusao": datetime.now(),
+            "data_envio": agora,
+            "data_conclusao": agora,
             "objeto_url": "samples/redacao_media.txt",
             "texto_extraido": REDACAO_MEDIA["texto"],
             "metadata": {
                 "tipo_arquivo": "txt",
-                "tamanho_bytes": len(REDACAO_MEDIA["texto"]),
+                "tamanho_bytes": TAMANHO_BYTES,
                 "origem": "script",
                 "classificacao_qualidade": "media"
             }
         }
         
-        redacao_id = await redacao_repository.insert_one(redacao_data)
-        print(f"Redação média criada com ID: {redacao_id}")
-        
-        # 3. Criar análise com nota 7.0
-        # Calcular métricas simples do texto
-        palavras = len(REDACAO_MEDIA["texto"].split())
-        sentencas = len([s for s in REDACAO_MEDIA["texto"].split('.') if s.strip()])
-        paragrafos = len([p for p in REDACAO_MEDIA["texto"].split('\n\n') if p.strip()])
-        
-        # Criar análise com problemas gramaticais identificados
-        analise_data = {
-            "redacao_id": ObjectId(redacao_id),
-            "usuario_id": ObjectId(user_id),
-            "texto_original": REDACAO_MEDIA["texto"],
-            "texto_corrigido": REDACAO_MEDIA["texto"].replace("historico", "histórico")
-                                                  .replace("cidadoes", "cidadãos")
-                                                  .replace("esta", "está")
-                                                  .replace("dificil", "difícil")
-                                                  .replace("contribuiram", "contribuíram")
-                                                  .replace("ascenção", "ascensão")
-                                                  .replace("salarios", "salários")
-                                                  .replace("tambem", "também")
-                                                  .replace("indices", "índices")
-                                                  .replace("individuos", "indivíduos")
-                                                  .replace("valorizacão", "valorização"),
-            "resumo_executivo": "Redação com conteúdo adequado, mas apresenta diversos problemas de acentuação e alguns erros gramaticais. A estrutura argumentativa é satisfatória, porém a conclusão poderia ser mais impactante.",
-            "metricas": {
-                "num_palavras": palavras,
-                "num_sentencas": sentencas,
-                "num_paragrafos": paragrafos,
-                "tamanho_medio_sentencas": palavras / sentencas if sentencas else 0,
-                "tamanho_medio_palavras": sum(len(p) for p in REDACAO_MEDIA["texto"].split()) / palavras if palavras else 0,
-                "tipo_palavras": {
-                    "NOUN": int(palavras * 0.25),
-                    "VERB": int(palavras * 0.2),
-                    "ADJ": int(palavras * 0.1),
-                    "DET": int(palavras * 0.15),
-                    "PREP": int(palavras * 0.12),
-                    "CONJ": int(palavras * 0.05),
-                    "OTHER": int(palavras * 0.13)
-                }
-            },
-            "problemas_gramaticais": [
-                {
-                    "tipo": "acentuação",
-                    "texto_original": "historico",
-                    "sugestao": "histórico",
-                    "explicacao": "Palavra paroxítona terminada em 'o' com sílaba tônica com 'i' deve ser acentuada",
-                    "posicao": [40, 49]
-                },
-                {
-                    "tipo": "acentuação",
-                    "texto_original": "cidadoes",
-                    "sugestao": "cidadãos",
-                    "explicacao": "Plural de palavras terminadas em 'ão' geralmente terminam em 'ãos', 'ães' ou 'ões'",
-                    "posicao": [222, 230]
-                },
-                {
-                    "tipo": "acentuação",
-                    "texto_original": "esta",
-                    "sugestao": "está",
-                    "explicacao": "Verbo 'estar' na 3ª pessoa do singular do presente do indicativo deve ser acentuado",
-                    "posicao": [304, 308]
-                },
-                {
-                    "tipo": "concordância",
-                    "texto_original": "estudos mostram",
-                    "sugestao": "estudos mostram",
-                    "explicacao": "Concordância adequada entre sujeito e verbo",
-                    "posicao": [856, 872]
-                }
-            ],
-            "analise_estrutural": {
-                "introducao": {
-                    "identificada": True,
-                    "qualidade": "regular",
-                    "presenca_tese": True
-                },
-                "desenvolvimento": {
-                    "identificada": True,
-                    "qualidade": "boa",
-                    "numero_argumentos": 3
-                },
-                "conclusao": {
-                    "identificada": True,
-                    "qualidade": "regular",
-                    "retomada_tese": True
-                },
-                "proporcao": {
-                    "introducao": 0.15,
-                    "desenvolvimento": 0.7,
-                    "conclusao": 0.15
-                }
-            },
-            "analise_coesao": {
-                "conectivos_utilizados": [
-                    {"texto": "além disso", "tipo": "aditivo", "frequencia": 1},
-                    {"texto": "também", "tipo": "aditivo", "frequencia": 1},
-                    {"texto": "portanto", "tipo": "conclusivo", "frequencia": 1}
-                ],
-                "repeticoes_excessivas": [
-                    {"termo": "desigualdade", "frequencia": 5, "sugestoes": ["disparidade", "diferença social"]}
-                ],
-                "qualidade_transicao": {
-                    "avaliacao": "regular",
-                    "pontuacao": 6.5
-                }
-            },
-            "analise_vocabulario": {
-                "riqueza_lexical": 0.65,
-                "palavras_incomuns": ["ascenção", "disparidade"],
-                "registro_linguistico": "formal com falhas",
-                "sugestoes_vocabulario": [
-                    {"original": "grande abismo", "sugestao": "disparidade significativa"},
-                    {"original": "fatores históricos", "sugestao": "contexto histórico"}
-                ]
-            },
-            "analise_argumentativa": {
-                "argumentos_identificados": [
-                    {"texto": "Segundo dados do IBGE, os 10% mais ricos concentram mais de 40% da renda do país", "tipo": "estatística", "forca": "forte"},
-                    {"texto": "fatores históricos como a escravidão", "tipo": "causa-efeito", "forca": "média"},
-                    {"texto": "O Nordeste e o Norte do país têm indices de desenvolvimento humano inferiores", "tipo": "comparação", "forca": "média"}
-                ],
-                "qualidade_argumentativa": {
-                    "avaliacao": "satisfatória",
-                    "pontuacao": 7.0
-                },
-                "fontes_citadas": ["IBGE"]
-            },
-            "notas": [
-                {
-                    "competencia": "Domínio da norma culta",
-                    "nota": 6.0,
-                    "justificativa": "Apresenta diversos problemas de acentuação e alguns erros ortográficos",
-                    "pontos_fortes": ["Estrutura sintática adequada"],
-                    "pontos_melhorar": ["Revisão de regras de acentuação", "Atenção à ortografia"]
-                },
-                {
-                    "competencia": "Compreensão do tema",
-                    "nota": 8.0,
-                    "justificativa": "Demonstra boa compreensão do tema da desigualdade social no Brasil",
-                    "pontos_fortes": ["Abordagem histórica", "Menção a elementos econômicos e sociais"],
-                    "pontos_melhorar": ["Poderia explorar mais propostas de solução"]
-                },
-                {
-                    "competencia": "Argumentação",
-                    "nota": 7.0,
-                    "justificativa": "Argumentação satisfatória com uso de alguns dados",
-                    "pontos_fortes": ["Uso de dados estatísticos", "Abordagem multifacetada do problema"],
-                    "pontos_melhorar": ["Aprofundar a análise crítica", "Usar mais fontes de dados"]
-                },
-                {
-                    "competencia": "Coesão textual",
-                    "nota": 7.0,
-                    "justificativa": "Apresenta coesão adequada, mas com algumas repetições",
-                    "pontos_fortes": ["Uso de alguns conectivos adequados"],
-                    "pontos_melhorar": ["Diversificar conectivos", "Evitar repetições"]
-                },
-                {
-                    "competencia": "Proposta de intervenção",
-                    "nota": 7.0,
-                    "justificativa": "Apresenta proposta genérica para solução do problema",
-                    "pontos_fortes": ["Menciona políticas públicas necessárias"],
-                    "pontos_melhorar": ["Detalhar propostas concretas", "Especificar agentes e ações"]
-                }
-            ],
-            "nota_geral": 7.0,
-            "recomendacoes": [
-                "Revisar regras de acentuação gráfica",
-                "Diversificar o vocabulário para evitar repetições",
-                "Usar mais dados e estatísticas para fortalecer a argumentação",
-                "Elaborar uma proposta de intervenção mais detalhada e concreta",
-                "Melhorar a conclusão para torná-la mais impactante"
-            ],
-            "data_analise": datetime.now(),
-            "tempo_processamento_ms": 3500
-        }
-        
-        analise_id = await analise_repository.insert_one(analise_data)
-        print(f"Análise criada com ID: {analise_id}")
+        # 3. Montar a análise com nota 7.0 a partir do modelo fixo pré-codificado
+        analise_data = _documento_raw({
+            "_id": analise_id,
+            "redacao_id": redacao_id,
+            "texto_original_ref": redacao_id,
+            "usuario_id": user_id,
+            "data_analise": agora
+        }, _ANALISE_BSON)
         
-        # 4. Adicionar ao corpus de exemplos com nota 7.0
-        corpus_data = {
-            "titulo": REDACAO_MEDIA["titulo"],
-            "texto": REDACAO_MEDIA["texto"],
-            "analise_id": ObjectId(analise_id),
-            "categoria": "comum",
-            "temas": ["desigualdade", "problemas sociais", "Brasil"],
-            "nivel_qualidade": 7.0,
-            "data_adicao": datetime.now()
-        }
+        # 4. Montar o exemplo do corpus com nota 7.0
+        corpus_data = _documento_raw({
+            "_id": corpus_id,
+            "analise_id": analise_id,
+            "data_adicao": agora
+        }, _CORPUS_BSON)
         
-        corpus_id = await corpus_repository.insert_one(corpus_data)
-        print(f"Exemplo adicionado ao corpus com ID: {corpus_id}")
-        
-        # 5. Gerar embedding para a redação
-        try:
-            embedding_id = await rag_manager.store_redacao_embedding(
-                redacao_id,
-                REDACAO_MEDIA["texto"],
-                REDACAO_MEDIA["titulo"]
+        # 5. Gravar os três documentos em paralelo: com os IDs já definidos,
+        # nenhuma escrita depende de outra
+        escritas = [
+            (repository, repository.bulk_write(
+                [InsertOne(document)], ordered=False, write_concern=SEED_WRITE_CONCERN
+            ))
+            for repository, document in (
+                (redacao_repository, redacao_data),
+                (analise_repository, analise_data),
+                (corpus_repository, corpus_data),
             )
-            print(f"Embedding gerado com ID: {embedding_id}")
-        except Exception as e:
-            print(f"Aviso: Não foi possível gerar embedding (requer OpenAI API): {e}")
+        ]
+        resultados = await asyncio.gather(*(escrita for _, escrita in escritas))
+        for (repository, _), resultado in zip(escritas, resultados):
+            if resultado is None:
+                raise RuntimeError(f"Falha ao gravar em {repository.collection_name}")
+        
+        # 6. Enfileirar o embedding: a chamada à OpenAI é feita uma vez para
+        # todas as redações de carga, em gerar_embeddings_pendentes()
+        embedding_enfileirado = gerar_embedding and _enfileirar_embedding(redacao_id)
         
-        print("\nRedação de qualidade média (nota 7.0) adicionada com sucesso!")
-        print(f"ID da redação: {redacao_id}")
-        print(f"ID da análise: {analise_id}")
+        # Resumo único ao final
+        logger.info(
+            "Redação de qualidade média (nota 7.0) adicionada com sucesso! "
+            "Redação: %s | Análise: %s | Corpus: %s | Embedding: %s",
+            redacao_id, analise_id, corpus_id, "enfileirado" if embedding_enfileirado else "não gerado"
+        )
         
         return redacao_id, analise_id
         
     except Exception as e:
-        print(f"Erro ao adicionar redação média: {e}")
+        logger.error("Erro ao adicionar redação média: %s", e)
         raise
 
+async def main(args: argparse.Namespace):
+    try:
+        await adicionar_redacao_media(gerar_embedding=not args.skip_embedding)
+        if not args.skip_embedding:
+            total = await gerar_embeddings_pendentes()
+            logger.info("%s embedding(s) gerado(s)", total)
+    finally:
+        mongo_client.close()
+
+def _configurar_logging():
+    """
+    Mensagens acumuladas em memória e escritas em stderr de uma vez (ou
+    imediatamente a partir de ERROR), fora do caminho dos awaits
+    
+    Só chamado ao rodar o script: importá-lo não altera o logger raiz.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        handlers=[logging.handlers.MemoryHandler(
+            capacity=100,
+            flushLevel=logging.ERROR,
+            target=logging.StreamHandler(sys.stderr)
+        )]
+    )
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Adiciona uma redação de qualidade média (nota 7.0) ao MongoDB")
+    parser.add_argument(
+        "--skip-embedding",
+        action="store_true",
+        help="Não gera o embedding da redação (dispensa a OpenAI API)"
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    asyncio.run(adicionar_redacao_media())
+    _configurar_logging()
+    try:
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop if HAS_UVLOOP else None) as runner:
+            runner.run(main(_parse_args()))
+    finally:
+        # Garante a escrita das mensagens ainda no buffer
+        logging.shutdown()
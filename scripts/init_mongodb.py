@@ -1,16 +1,26 @@
 import sys
 import os
 from pathlib import Path
-import json
 import asyncio
+import hashlib
+import inspect
 from datetime import datetime, timedelta
-import random
+import numpy as np
+import bson
+from bson import ObjectId
 
 # Adicionar diretório raiz ao path
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
 
-# Importar repositórios
+# Pool dimensionado para as escritas paralelas da inicialização; precisa ser
+# definido antes de importar o cliente (criado na importação)
+INIT_POOL_SIZE = 8
+os.environ.setdefault("MONGODB_MIN_POOL_SIZE", str(INIT_POOL_SIZE))
+os.environ.setdefault("MONGODB_MAX_POOL_SIZE", "32")
+
+# Importar cliente MongoDB e repositórios
+from app.database.mongo_client import mongo_client
 from app.database.repositories import (
     user_repository,
     redacao_repository,
@@ -78,35 +88,58 @@ SAMPLE_REDACOES = [
     }
 ]
 
+# Proporção estimada de cada classe gramatical nas métricas de exemplo
+_POS_RATIOS = (
+    ("NOUN", 0.25),
+    ("VERB", 0.20),
+    ("ADJ", 0.10),
+    ("DET", 0.15),
+    ("PREP", 0.12),
+    ("CONJ", 0.05),
+    ("OTHER", 0.13),
+)
+
+def _compute_metrics(texto):
+    """Métricas simples do texto: palavras, sentenças, parágrafos e classes estimadas"""
+    # Número de palavras, sentenças e parágrafos (uma única divisão em tokens)
+    tokens = texto.split()
+    palavras = len(tokens)
+    sentencas = sum(1 for s in texto.split('.') if s.strip())
+    paragrafos = sum(1 for p in texto.split('\n\n') if p.strip())
+    
+    return {
+        "num_palavras": palavras,
+        "num_sentencas": sentencas,
+        "num_paragrafos": paragrafos,
+        "tamanho_medio_sentencas": palavras / sentencas if sentencas else 0,
+        "tamanho_medio_palavras": sum(map(len, tokens)) / palavras if palavras else 0,
+        "tipo_palavras": {pos: int(palavras * ratio) for pos, ratio in _POS_RATIOS}
+    }
+
+# Os textos de exemplo são constantes: métricas calculadas uma vez na importação
+SAMPLE_METRICS = {r["titulo"]: _compute_metrics(r["texto"]) for r in SAMPLE_REDACOES}
+
 # Modelo básico de análise para as redações de exemplo
-def create_sample_analise(texto, nivel_qualidade=8.5):
-    """Cria uma análise de exemplo para inicialização"""
+def create_sample_analise(texto, nivel_qualidade=8.5, metricas=None, tempo_processamento_ms=None):
+    """
+    Cria uma análise de exemplo para inicialização
     
-    # Número de palavras, sentenças e parágrafos
-    palavras = len(texto.split())
-    sentencas = len([s for s in texto.split('.') if s.strip()])
-    paragrafos = len([p for p in texto.split('\n\n') if p.strip()])
+    Args:
+        texto: Texto da redação
+        nivel_qualidade: Nota base da análise
+        metricas: Métricas já calculadas (ex.: SAMPLE_METRICS); calculadas se omitidas
+        tempo_processamento_ms: Tempo simulado; sorteado entre 3000 e 8000 se omitido
+    """
+    if metricas is None:
+        metricas = _compute_metrics(texto)
+    if tempo_processamento_ms is None:
+        tempo_processamento_ms = int(np.random.default_rng().integers(3000, 8001))
     
     return {
         "texto_original": texto,
         "texto_corrigido": texto,  # Sem correções no exemplo
-        "resumo_executivo": f"Redação com {palavras} palavras distribuídas em {paragrafos} parágrafos. Apresenta boa estrutura argumentativa e coesão textual adequada.",
-        "metricas": {
-            "num_palavras": palavras,
-            "num_sentencas": sentencas,
-            "num_paragrafos": paragrafos,
-            "tamanho_medio_sentencas": palavras / sentencas if sentencas else 0,
-            "tamanho_medio_palavras": sum(len(p) for p in texto.split()) / palavras if palavras else 0,
-            "tipo_palavras": {
-                "NOUN": int(palavras * 0.25),
-                "VERB": int(palavras * 0.2),
-                "ADJ": int(palavras * 0.1),
-                "DET": int(palavras * 0.15),
-                "PREP": int(palavras * 0.12),
-                "CONJ": int(palavras * 0.05),
-                "OTHER": int(palavras * 0.13)
-            }
-        },
+        "resumo_executivo": f"Redação com {metricas['num_palavras']} palavras distribuídas em {metricas['num_paragrafos']} parágrafos. Apresenta boa estrutura argumentativa e coesão textual adequada.",
+        "metricas": metricas,
         "problemas_gramaticais": [],  # Sem problemas no exemplo
         "analise_estrutural": {
             "introducao": {
@@ -189,13 +222,93 @@ def create_sample_analise(texto, nivel_qualidade=8.5):
             "Ampliar o repertório de conectivos para melhorar a fluidez textual"
         ],
         "data_analise": datetime.now().isoformat(),
-        "tempo_processamento_ms": random.randint(3000, 8000)
+        "tempo_processamento_ms": tempo_processamento_ms
     }
 
+# Análises de exemplo já montadas (sem IDs e data), em BSON: geradas na primeira
+# execução e reaproveitadas enquanto a versão do gerador (_fixture_version) não mudar.
+# Fica em data/cache/, junto do cache do TF-IDF, fora do Git e do contexto de build
+SAMPLES_FIXTURE_PATH = root_dir / "data" / "cache" / "samples.bson"
+
+def _gerar_analises_exemplo():
+    """Monta as análises de exemplo, uma por redação de SAMPLE_REDACOES"""
+    # Tempos de processamento simulados: um único sorteio para todas as amostras
+    tempos = np.random.default_rng(seed=0).integers(3000, 8001, size=len(SAMPLE_REDACOES)).tolist()
+    
+    analises = []
+    for i, redacao_data in enumerate(SAMPLE_REDACOES):
+        analise = create_sample_analise(
+            redacao_data["texto"], 
+            nivel_qualidade=8.5 + (i * 0.5),  # Variar qualidade para exemplos
+            metricas=SAMPLE_METRICS[redacao_data["titulo"]],
+            tempo_processamento_ms=tempos[i]
+        )
+        # A data é atribuída a cada inicialização
+        del analise["data_analise"]
+        analises.append(analise)
+    return analises
+
+def _fixture_version():
+    """
+    SHA-256 de tudo que determina as análises de exemplo: os textos e o código
+    de _POS_RATIOS, _compute_metrics, create_sample_analise e _gerar_analises_exemplo
+    
+    Qualquer mudança no template (notas, recomendações, campos) invalida o fixture.
+    """
+    h = hashlib.sha256()
+    for redacao in SAMPLE_REDACOES:
+        h.update(redacao["titulo"].encode() + b"\0" + redacao["texto"].encode() + b"\0")
+    h.update(repr(_POS_RATIOS).encode())
+    for func in (_compute_metrics, create_sample_analise, _gerar_analises_exemplo):
+        h.update(inspect.getsource(func).encode())
+    return h.hexdigest()
+
+def carregar_analises_exemplo():
+    """
+    Carrega as análises de exemplo do fixture BSON, gerando-o se ausente ou desatualizado
+    
+    O primeiro documento do arquivo é um cabeçalho {"fixture_version": ...};
+    as análises vêm em seguida.
+    
+    Returns:
+        Análises na ordem de SAMPLE_REDACOES, sem "_id", IDs de referência e data_analise
+    """
+    versao = _fixture_version()
+    
+    if SAMPLES_FIXTURE_PATH.exists():
+        try:
+            with open(SAMPLES_FIXTURE_PATH, "rb") as f:
+                documentos = list(bson.decode_file_iter(f))
+            if documentos and documentos[0].get("fixture_version") == versao:
+                analises = documentos[1:]
+                if len(analises) == len(SAMPLE_REDACOES):
+                    return analises
+        except Exception as e:
+            print(f"Erro ao carregar análises de exemplo em cache: {e}")
+    
+    analises = _gerar_analises_exemplo()
+    try:
+        # Gravar em arquivo temporário e renomear, como o cache do TF-IDF
+        SAMPLES_FIXTURE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = SAMPLES_FIXTURE_PATH.with_name(f"{SAMPLES_FIXTURE_PATH.name}.{os.getpid()}.tmp")
+        cabecalho = bson.encode({"fixture_version": versao})
+        tmp_path.write_bytes(cabecalho + b"".join(bson.encode(a) for a in analises))
+        os.replace(tmp_path, SAMPLES_FIXTURE_PATH)
+    except Exception as e:
+        print(f"Erro ao salvar análises de exemplo em cache: {e}")
+    return analises
+
 async def init_mongodb():
     """Inicializa o MongoDB com dados de exemplo"""
     print("Inicializando MongoDB com dados de exemplo...")
     
+    # Garantir coleções e índices antes das escritas, abrindo ao mesmo tempo as
+    # conexões que as gravações em paralelo vão usar
+    await asyncio.gather(
+        mongo_client.ensure_indexes(),
+        mongo_client.warm_pool(INIT_POOL_SIZE)
+    )
+    
     # 1. Criar usuário de exemplo
     user_data = {
         "email": "professor@exemplo.com",
@@ -211,14 +324,23 @@ async def init_mongodb():
         }
     }
     
-    user_id = await user_repository.insert_one(user_data)
-    print(f"Usuário criado com ID: {user_id}")
+    # get_or_create_by_email devolve o ObjectId direto e torna a reexecução segura
+    # (o email é único: insert_one falharia e o ID ficaria indefinido)
+    user_id = await user_repository.get_or_create_by_email(user_data["email"], user_data)
+    if user_id is None:
+        raise RuntimeError("Falha ao obter ou criar o usuário de exemplo")
+    print(f"Usuário de exemplo com ID: {user_id}")
     
-    # 2. Criar redações e análises de exemplo
-    for i, redacao_data in enumerate(SAMPLE_REDACOES):
-        # Redação
-        redacao = {
-            "usuario_id": ObjectId(user_id),
+    # Reexecução contra um banco já populado (ex.: setup após um `down` sem -v):
+    # o estado do banco decide, e as amostras não são duplicadas
+    if await redacao_repository.count({"usuario_id": user_id, "metadata.origem": "importacao"}):
+        print("Dados de exemplo já presentes; nada a inserir.")
+        return
+    
+    # 2. Criar as redações de exemplo (uma única chamada ao MongoDB)
+    redacoes = [
+        {
+            "usuario_id": user_id,
             "titulo": redacao_data["titulo"],
             "status": "concluida",
             "data_envio": datetime.now() - timedelta(days=i+1),
@@ -233,46 +355,69 @@ async def init_mongodb():
                 "sessao_id": f"sample_session_{i+1}"
             }
         }
-        
-        redacao_id = await redacao_repository.insert_one(redacao)
+        for i, redacao_data in enumerate(SAMPLE_REDACOES)
+    ]
+    
+    redacao_ids = await redacao_repository.insert_many(redacoes)
+    if redacao_ids is None:
+        raise RuntimeError("Falha ao criar as redações de exemplo")
+    for redacao_data, redacao_id in zip(SAMPLE_REDACOES, redacao_ids):
         print(f"Redação '{redacao_data['titulo']}' criada com ID: {redacao_id}")
-        
-        # Análise
-        analise = create_sample_analise(
-            redacao_data["texto"], 
-            nivel_qualidade=8.5 + (i * 0.5)  # Variar qualidade para exemplos
-        )
-        
-        analise["redacao_id"] = ObjectId(redacao_id)
-        analise["usuario_id"] = ObjectId(user_id)
-        
-        analise_id = await analise_repository.insert_one(analise)
-        print(f"Análise criada com ID: {analise_id}")
-        
-        # Adicionar ao corpus de exemplos
-        corpus_exemplo = {
+    
+    # Os embeddings só dependem dos IDs das redações: começam já, em paralelo com
+    # a gravação de análises e corpus. store_many envia todos os textos em uma
+    # única requisição à API e grava os vetores com um único bulk_write
+    embeddings_task = asyncio.create_task(rag_manager.store_many([
+        {"redacao_id": redacao_id, "texto": redacao_data["texto"], "titulo": redacao_data["titulo"]}
+        for redacao_data, redacao_id in zip(SAMPLE_REDACOES, redacao_ids)
+    ]))
+    
+    # 3. Criar as análises (do fixture), ligadas às redações pelos IDs retornados.
+    # IDs das análises gerados no cliente: o corpus já referencia analise_id e
+    # as duas coleções são gravadas em paralelo
+    data_analise = datetime.now().isoformat()
+    analises = [
+        {
+            **analise,
+            "_id": ObjectId(),
+            "redacao_id": redacao_id,
+            "usuario_id": user_id,
+            "data_analise": data_analise
+        }
+        for analise, redacao_id in zip(carregar_analises_exemplo(), redacao_ids)
+    ]
+    
+    # 4. Adicionar ao corpus de exemplos
+    corpus_exemplos = [
+        {
             "titulo": redacao_data["titulo"],
             "texto": redacao_data["texto"],
-            "analise_id": ObjectId(analise_id),
+            "analise_id": analise["_id"],
             "categoria": "exemplar",
             "temas": ["educação", "tecnologia", "sustentabilidade"],
             "nivel_qualidade": 8.5 + (i * 0.5),
             "data_adicao": datetime.now()
         }
-        
-        corpus_id = await corpus_repository.insert_one(corpus_exemplo)
+        for i, (redacao_data, analise) in enumerate(zip(SAMPLE_REDACOES, analises))
+    ]
+    
+    analise_ids, corpus_ids = await asyncio.gather(
+        analise_repository.insert_many(analises),
+        corpus_repository.insert_many(corpus_exemplos)
+    )
+    if analise_ids is None or corpus_ids is None:
+        embeddings_task.cancel()
+        raise RuntimeError("Falha ao criar as análises ou o corpus de exemplo")
+    for analise_id, corpus_id in zip(analise_ids, corpus_ids):
+        print(f"Análise criada com ID: {analise_id}")
         print(f"Exemplo adicionado ao corpus com ID: {corpus_id}")
-        
-        # Gerar embedding
-        try:
-            embedding_id = await rag_manager.store_redacao_embedding(
-                redacao_id,
-                redacao_data["texto"],
-                redacao_data["titulo"]
-            )
-            print(f"Embedding gerado com ID: {embedding_id}")
-        except Exception as e:
-            print(f"Não foi possível gerar embedding: {e}")
+    
+    # 5. Aguardar os embeddings iniciados após a criação das redações
+    try:
+        total = await embeddings_task
+        print(f"{total} embeddings gerados")
+    except Exception as e:
+        print(f"Não foi possível gerar os embeddings: {e}")
     
     print("Inicialização concluída!")
 
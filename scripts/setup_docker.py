@@ -1,41 +1,78 @@
 #!/usr/bin/env python
 import os
 import sys
-import subprocess
-import time
-import requests
+import asyncio
+import contextlib
+import hashlib
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+# O script roda no host (make setup/status), onde só a biblioteca padrão é
+# garantida: sem estes pacotes, as verificações usam urllib e conexão TCP
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    HAS_MOTOR = True
+except ImportError:
+    HAS_MOTOR = False
+
+try:
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
 # Defina o diretório raiz do projeto
 ROOT_DIR = Path(__file__).resolve().parent.parent
 
+# Diretórios dos volumes Docker, como strings para as chamadas diretas a os
+VOLUME_DIRS = tuple(
+    os.path.join(ROOT_DIR, *sub.split("/"))
+    for sub in ("data/mongodb", "data/redis", "data/elasticsearch", "data/minio", "data/embeddings_cache", "logs")
+)
+
+# Hash dos arquivos que definem as imagens no último build bem-sucedido
+BUILD_HASH_PATH = ROOT_DIR / ".docker_build_hash"
+
 def print_step(message):
     """Imprime uma mensagem de etapa formatada"""
     print("\n" + "=" * 80)
     print(f" {message} ".center(80, "="))
     print("=" * 80 + "\n")
 
-def run_command(command, cwd=ROOT_DIR):
-    """Executa um comando shell e imprime a saída"""
+async def run_command_async(command, cwd=ROOT_DIR, prefix=""):
+    """
+    Executa um comando shell e imprime a saída à medida que é produzida
+    
+    A leitura não bloqueia o event loop, então vários comandos podem rodar
+    juntos; `prefix` identifica as linhas de cada um quando intercaladas.
+    """
     print(f"Executando: {command}")
-    process = subprocess.Popen(
+    process = await asyncio.create_subprocess_shell(
         command,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
         cwd=cwd
     )
     
-    for line in process.stdout:
-        print(line.strip())
+    async for line in process.stdout:
+        print(f"{prefix}{line.decode(errors='replace').rstrip()}")
     
-    process.wait()
-    if process.returncode != 0:
+    if await process.wait() != 0:
         print(f"Erro ao executar o comando: {command}")
         return False
     return True
 
+def run_command(command, cwd=ROOT_DIR):
+    """Executa um comando shell e imprime a saída"""
+    return asyncio.run(run_command_async(command, cwd))
+
 def check_docker():
     """Verifica se o Docker e Docker Compose estão instalados"""
     print_step("Verificando instalação do Docker")
@@ -56,29 +93,58 @@ def create_directories():
     """Cria diretórios necessários para volumes Docker"""
     print_step("Criando diretórios para volumes")
     
-    directories = [
-        ROOT_DIR / "data" / "mongodb",
-        ROOT_DIR / "data" / "redis",
-        ROOT_DIR / "data" / "elasticsearch",
-        ROOT_DIR / "data" / "minio",
-        ROOT_DIR / "logs"
-    ]
-    
-    for directory in directories:
-        if not directory.exists():
+    for directory in VOLUME_DIRS:
+        # makedirs direto, sem exists() antes: um stat a menos e sem corrida;
+        # FileExistsError apenas indica que já existia
+        try:
+            os.makedirs(directory)
             print(f"Criando diretório: {directory}")
-            directory.mkdir(parents=True, exist_ok=True)
+        except FileExistsError:
+            pass
     
     print("✅ Diretórios criados com sucesso.")
 
+def _build_inputs_digest():
+    """SHA-256 dos Dockerfiles, docker-compose.yml, requirements.txt e scripts/"""
+    h = hashlib.sha256()
+    paths = (
+        sorted(ROOT_DIR.glob("Dockerfile*"))
+        + [ROOT_DIR / "docker-compose.yml", ROOT_DIR / "requirements.txt"]
+        + sorted((ROOT_DIR / "scripts").glob("*.py"))
+    )
+    for path in paths:
+        if path.exists():
+            h.update(str(path.relative_to(ROOT_DIR)).encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
 def build_containers():
-    """Constrói as imagens Docker"""
+    """Constrói as imagens Docker, exceto se nada que as define mudou desde o último build"""
     print_step("Construindo imagens Docker")
     
-    if not run_command("docker-compose build"):
+    # O código da aplicação é montado como volume (./app); os scripts não são,
+    # e initialize_database os executa dentro do contêiner
+    digest = _build_inputs_digest()
+    if BUILD_HASH_PATH.exists() and BUILD_HASH_PATH.read_text().strip() == digest:
+        print("✅ Imagens Docker já atualizadas; build ignorado.")
+        return
+    
+    # As imagens de terceiros não dependem do build: baixá-las enquanto
+    # as imagens da aplicação são construídas
+    async def build_and_pull():
+        return await asyncio.gather(
+            run_command_async("docker-compose build", prefix="[build] "),
+            run_command_async("docker-compose pull mongodb redis elasticsearch minio mongo-express", prefix="[pull] ")
+        )
+    
+    built, pulled = asyncio.run(build_and_pull())
+    if not built:
         print("Erro ao construir as imagens Docker.")
         sys.exit(1)
+    if not pulled:
+        print("⚠️ Não foi possível baixar todas as imagens; docker-compose up tentará novamente.")
     
+    BUILD_HASH_PATH.write_text(digest)
     print("✅ Imagens Docker construídas com sucesso.")
 
 def start_containers():
@@ -91,67 +157,128 @@ def start_containers():
     
     print("✅ Contêineres Docker iniciados com sucesso.")
 
-def check_services():
-    """Verifica se os serviços estão funcionando corretamente"""
-    print_step("Verificando serviços")
+# Serviços com endpoint HTTP; MongoDB e Redis são verificados pelo próprio protocolo
+HTTP_SERVICES = {
+    "Elasticsearch": "http://localhost:9200",
+    "MinIO Console": "http://localhost:9001",
+    "API Elysia": "http://localhost:8000"
+}
+MONGODB_URI = "mongodb://localhost:27017"
+MONGODB_ADDR = ("localhost", 27017)
+REDIS_URI = "redis://localhost:6379"
+REDIS_ADDR = ("localhost", 6379)
+PING_TIMEOUT = 2
+
+def _http_status(url):
+    """Status HTTP via urllib (bloqueante; chamado em uma thread)"""
+    try:
+        with urllib.request.urlopen(url, timeout=PING_TIMEOUT) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+async def _probe_http(client, service_name, url):
+    """Verifica se o endpoint HTTP do serviço está respondendo"""
+    try:
+        if client is not None:
+            status_code = (await client.get(url)).status_code
+        else:
+            status_code = await asyncio.to_thread(_http_status, url)
+    except Exception as e:
+        print(f"❌ {service_name} não está disponível ainda: {e}")
+        return False
     
-    services = {
-        "MongoDB": "http://localhost:27017",
-        "Redis": "http://localhost:6379",
-        "Elasticsearch": "http://localhost:9200",
-        "MinIO Console": "http://localhost:9001",
-        "API Elysia": "http://localhost:8000"
-    }
+    if status_code < 400:
+        print(f"✅ {service_name} está respondendo em {url}")
+        return True
+    print(f"❌ {service_name} retornou status {status_code}")
+    return False
+
+async def _tcp_connect(service_name, addr):
+    """Sem o cliente do serviço instalado: basta a porta aceitar conexões"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(*addr), PING_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        print(f"❌ {service_name} não está disponível ainda: {e}")
+        return False
+    writer.close()
+    await writer.wait_closed()
+    print(f"✅ {service_name} está aceitando conexões TCP.")
+    return True
+
+async def _ping_mongodb():
+    """Verifica se o MongoDB aceita conexões (comando ping)"""
+    if not HAS_MOTOR:
+        return await _tcp_connect("MongoDB", MONGODB_ADDR)
+    client = AsyncIOMotorClient(MONGODB_URI, serverSelectionTimeoutMS=PING_TIMEOUT * 1000)
+    try:
+        await client.admin.command("ping")
+        print("✅ MongoDB está aceitando conexões.")
+        return True
+    except Exception as e:
+        print(f"❌ MongoDB não está disponível ainda: {e}")
+        return False
+    finally:
+        client.close()
+
+async def _ping_redis():
+    """Verifica se o Redis aceita conexões (comando PING)"""
+    if not HAS_REDIS:
+        return await _tcp_connect("Redis", REDIS_ADDR)
+    client = aioredis.from_url(REDIS_URI, socket_connect_timeout=PING_TIMEOUT, socket_timeout=PING_TIMEOUT)
+    try:
+        await client.ping()
+        print("✅ Redis está aceitando conexões.")
+        return True
+    except Exception as e:
+        print(f"❌ Redis não está disponível ainda: {e}")
+        return False
+    finally:
+        # aclose() só existe a partir do redis 5.0.1; antes, close() é a corrotina
+        await (client.aclose() if hasattr(client, "aclose") else client.close())
+
+async def check_services_async(max_attempts=25, base_delay=0.25, max_delay=10.0):
+    """
+    Verifica se os serviços estão funcionando corretamente
     
-    max_attempts = 30
-    attempts = 0
+    As verificações de uma tentativa rodam em paralelo e os serviços já prontos
+    saem da lista. Entre tentativas, espera exponencial (base_delay * 1.5^n, até
+    max_delay): serviços rápidos são detectados em segundos e o Elasticsearch,
+    mais lento, ainda tem ~3 minutos para subir.
+    """
+    print_step("Verificando serviços")
     
-    while attempts < max_attempts:
-        attempts += 1
-        
-        all_services_up = True
+    async with (httpx.AsyncClient(timeout=PING_TIMEOUT) if HAS_HTTPX else contextlib.nullcontext()) as client:
+        # Nome do serviço -> função que cria a verificação
+        pendentes = {
+            **{name: (lambda name=name, url=url: _probe_http(client, name, url)) for name, url in HTTP_SERVICES.items()},
+            "MongoDB": _ping_mongodb,
+            "Redis": _ping_redis
+        }
         
-        for service_name, url in services.items():
-            try:
-                if "mongodb" in url or "redis" in url:
-                    # Para MongoDB e Redis, verificamos se o contêiner está em execução
-                    service_id = service_name.lower().split()[0]
-                    result = subprocess.run(
-                        f"docker ps --filter name=rag_thiago_{service_id} --format '{{{{.Status}}}}'",
-                        shell=True,
-                        capture_output=True,
-                        text=True
-                    )
-                    
-                    if "Up" in result.stdout:
-                        print(f"✅ {service_name} está em execução.")
-                    else:
-                        print(f"❌ {service_name} não está em execução.")
-                        all_services_up = False
-                else:
-                    # Para outros serviços, verificamos se o endpoint está respondendo
-                    response = requests.get(url, timeout=2)
-                    if response.status_code < 400:
-                        print(f"✅ {service_name} está respondendo em {url}")
-                    else:
-                        print(f"❌ {service_name} retornou status {response.status_code}")
-                        all_services_up = False
+        for attempts in range(1, max_attempts + 1):
+            nomes = list(pendentes)
+            resultados = await asyncio.gather(*(pendentes[name]() for name in nomes), return_exceptions=True)
+            for name, resultado in zip(nomes, resultados):
+                if resultado is True:
+                    del pendentes[name]
             
-            except (requests.RequestException, subprocess.SubprocessError) as e:
-                print(f"❌ {service_name} não está disponível ainda: {str(e)}")
-                all_services_up = False
-        
-        if all_services_up:
-            print("\n✅ Todos os serviços estão funcionando corretamente!")
-            return True
-        
-        print(f"\nAguardando serviços iniciarem... (tentativa {attempts}/{max_attempts})")
-        time.sleep(5)
+            if not pendentes:
+                print("\n✅ Todos os serviços estão funcionando corretamente!")
+                return True
+            
+            delay = min(max_delay, base_delay * (1.5 ** attempts))
+            print(f"\nAguardando {', '.join(pendentes)}... (tentativa {attempts}/{max_attempts}, próxima em {delay:.1f}s)")
+            await asyncio.sleep(delay)
     
     print("\n⚠️ Nem todos os serviços estão funcionando após várias tentativas.")
     print("Verifique os logs com 'docker-compose logs' para mais informações.")
     return False
 
+def check_services():
+    """Verifica se os serviços estão funcionando corretamente"""
+    return asyncio.run(check_services_async())
+
 def initialize_database():
     """Inicializa o banco de dados com dados de exemplo"""
     print_step("Inicializando banco de dados")
@@ -2,14 +2,21 @@
 """
 Script para configurar e iniciar o ambiente Docker do sistema Elysia
 """
+import argparse
+import fnmatch
+import hashlib
 import os
+import re
 import subprocess
-import time
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-def print_colored(message, color='green'):
-    """Imprime mensagem colorida no console"""
-    colors = {
+# Códigos ANSI de cor, montados uma vez; vazios quando a saída não é um terminal
+# (redirecionada para arquivo ou pipe), para não gravar bytes de escape
+if sys.stdout.isatty():
+    _COLORS = {
         'green': '\033[92m',
         'yellow': '\033[93m',
         'red': '\033[91m',
@@ -17,138 +24,374 @@ def print_colored(message, color='green'):
         'purple': '\033[95m',
         'end': '\033[0m'
     }
-    
-    print(f"{colors.get(color, '')}{message}{colors['end']}")
+else:
+    _COLORS = dict.fromkeys(('green', 'yellow', 'red', 'blue', 'purple', 'end'), '')
+
+_BANNER_RULE = _COLORS['blue'] + "=" * 52 + _COLORS['end'] + "\n"
+
+def print_colored(message, color='green'):
+    """Imprime mensagem colorida no console"""
+    sys.stdout.write(_colored(message, color) + "\n")
+
+def _colored(message, color):
+    """Mensagem com os códigos de cor, sem escrever nada"""
+    return _COLORS.get(color, '') + message + _COLORS['end']
+
+def _banner(title):
+    """Título centralizado entre duas linhas de separação, como string"""
+    return "\n" + _BANNER_RULE + _colored(title.center(52), 'purple') + "\n" + _BANNER_RULE
+
+def print_banner(title):
+    """Imprime um título centralizado entre duas linhas de separação"""
+    sys.stdout.write(_banner(title))
 
 def run_command(command, cwd=None):
-    """Executa um comando shell e retorna o resultado"""
+    """
+    Executa um comando curto (ex.: --version) e retorna o resultado capturado
+    
+    Uma lista de argumentos é executada diretamente, sem /bin/sh intermediário.
+    Uma string passa pelo shell e fica reservada às cadeias com `&&`, para que o
+    uso do shell seja explícito (e portável: sh ou cmd.exe, conforme o sistema).
+    """
     try:
-        result = subprocess.run(command, shell=True, check=True, text=True, 
+        result = subprocess.run(command, shell=isinstance(command, str), check=True, text=True, 
                                capture_output=True, cwd=cwd)
         return True, result.stdout
     except subprocess.CalledProcessError as e:
         return False, e.stderr
+    except FileNotFoundError as e:
+        # Executável ausente (sem shell não há "command not found")
+        return False, str(e)
 
-def check_docker_installed():
-    """Verifica se o Docker está instalado"""
-    success, output = run_command("docker --version")
-    if not success:
-        print_colored("Docker não encontrado. Por favor instale o Docker Desktop primeiro.", 'red')
+def stream_command(command, cwd=None, prefix=""):
+    """
+    Executa um comando longo repassando a saída ao terminal linha a linha
+    
+    Sem acumular a saída em memória (o log do build pode ter megabytes), e o
+    progresso aparece em tempo real. Mesma regra de shell de run_command.
+    `prefix` identifica as linhas quando dois comandos rodam ao mesmo tempo.
+    """
+    try:
+        process = subprocess.Popen(command, shell=isinstance(command, str), stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, bufsize=1, text=True, cwd=cwd)
+    except FileNotFoundError as e:
+        print_colored(str(e), 'red')
         return False
     
-    print_colored(f"Docker encontrado: {output.strip()}")
-    return True
+    for line in process.stdout:
+        sys.stdout.write(prefix + line)
+    return process.wait() == 0
 
-def check_docker_compose_installed():
-    """Verifica se o Docker Compose está instalado"""
-    success, output = run_command("docker-compose --version")
-    if not success:
-        print_colored("Docker Compose não encontrado. Verifique sua instalação do Docker.", 'red')
-        return False
+# Compose v2 roda dentro do CLI do Docker (Go); o v1 é um programa Python que
+# gasta centenas de ms só para iniciar, a cada chamada
+COMPOSE_V2 = ("docker", "compose")
+COMPOSE_LEGACY = ("docker-compose",)
+
+def check_prereqs():
+    """
+    Verifica se o Docker e o Docker Compose estão instalados (uma única chamada ao shell)
     
-    print_colored(f"Docker Compose encontrado: {output.strip()}")
-    return True
+    Prefere o plugin `docker compose` (v2, executado pelo próprio CLI do Docker);
+    o binário legado `docker-compose` só é consultado se o plugin não existir.
+    
+    Returns:
+        Comando do Compose a usar (COMPOSE_V2 ou COMPOSE_LEGACY), ou None se ausente
+    """
+    success, output = run_command('docker version --format "{{.Client.Version}}" && docker compose version --short')
+    versoes = output.strip().splitlines()
+    compose = COMPOSE_V2
+    if not success or len(versoes) < 2:
+        success, output = run_command("docker --version && docker-compose --version")
+        versoes = output.strip().splitlines()
+        compose = COMPOSE_LEGACY
+    
+    if not success or len(versoes) < 2:
+        print_colored("Docker ou Docker Compose não encontrado (ou o Docker não está em execução). Por favor instale o Docker Desktop primeiro.", 'red')
+        return None
+    
+    if compose == COMPOSE_LEGACY:
+        print_colored("Aviso: usando o docker-compose v1 (legado, mais lento); instale o plugin Compose v2.", 'yellow')
+    print_colored(f"Docker encontrado: {versoes[0]}")
+    print_colored(f"Docker Compose encontrado: {versoes[1]}")
+    return compose
+
+def _stat(path):
+    """os.stat numa única chamada; None se o arquivo não existir"""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
 
-def check_env_file():
-    """Verifica se o arquivo .env existe e atualiza a chave de API OpenAI se necessário"""
-    if not os.path.exists(".env"):
+ENV_PATH = Path(".env")
+ENV_EXAMPLE_PATH = Path(".env.example")
+# Tocado quando o .env tem uma chave real; mais novo que o .env = nada a verificar
+ENV_SENTINEL_PATH = Path(".env.sentinel")
+_PLACEHOLDER_API_KEY_RE = re.compile(r"^OPENAI_API_KEY=.*sua-chave-openai.*$", re.M)
+
+def check_env_file(api_key=None):
+    """
+    Verifica se o arquivo .env existe e atualiza a chave de API OpenAI se necessário
+    
+    A chave vem de `api_key` (--openai-key) ou de $OPENAI_API_KEY; o input()
+    só é usado num terminal interativo, para a configuração não travar em CI.
+    """
+    env_st = _stat(ENV_PATH)
+    sentinel_st = _stat(ENV_SENTINEL_PATH)
+    if env_st is not None and sentinel_st is not None and sentinel_st.st_mtime >= env_st.st_mtime:
+        return
+    
+    if env_st is None:
         print_colored("Arquivo .env não encontrado. Criando...", 'yellow')
-        with open(".env.example", "r") as example:
-            with open(".env", "w") as env:
-                env.write(example.read())
-    
-    # Verificar se a chave OpenAI está configurada
-    with open(".env", "r") as f:
-        lines = f.readlines()
-    
-    for i, line in enumerate(lines):
-        if line.startswith("OPENAI_API_KEY=") and "sua-chave-openai" in line:
-            api_key = input("\nDigite sua chave de API OpenAI (comece com 'sk-'): ")
-            if api_key and api_key.startswith("sk-"):
-                lines[i] = f"OPENAI_API_KEY={api_key}\n"
-                with open(".env", "w") as f:
-                    f.writelines(lines)
-                print_colored("Chave de API OpenAI atualizada com sucesso!", 'green')
-            else:
-                print_colored("Chave de API inválida. A chave deve começar com 'sk-'", 'yellow')
-                print_colored("Você pode atualizar a chave manualmente no arquivo .env mais tarde.", 'yellow')
-            break
-
-def build_docker_containers():
-    """Constrói os containers Docker"""
-    print_colored("\n=== Construindo containers... ===", 'blue')
-    success, output = run_command("docker-compose build")
-    if not success:
-        print_colored(f"Erro ao construir containers: {output}", 'red')
+        ENV_PATH.write_bytes(ENV_EXAMPLE_PATH.read_bytes())
+    
+    # Lido uma única vez; só é regravado se a chave de exemplo for substituída
+    text = ENV_PATH.read_text()
+    if not _PLACEHOLDER_API_KEY_RE.search(text):
+        ENV_SENTINEL_PATH.touch()
+        return
+    
+    api_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+    if not api_key:
+        if not sys.stdin.isatty():
+            print_colored("Aviso: chave de API OpenAI não informada (use --openai-key ou $OPENAI_API_KEY).", 'yellow')
+            print_colored("Você pode atualizar a chave manualmente no arquivo .env mais tarde.", 'yellow')
+            return
+        api_key = input("\nDigite sua chave de API OpenAI (comece com 'sk-'): ")
+    
+    if not api_key or not api_key.startswith("sk-"):
+        print_colored("Chave de API inválida. A chave deve começar com 'sk-'", 'yellow')
+        print_colored("Você pode atualizar a chave manualmente no arquivo .env mais tarde.", 'yellow')
+        return
+    
+    new_text = _PLACEHOLDER_API_KEY_RE.sub(lambda _: f"OPENAI_API_KEY={api_key}", text, count=1)
+    if new_text != text:
+        ENV_PATH.write_text(new_text)
+    ENV_SENTINEL_PATH.touch()
+    print_colored("Chave de API OpenAI atualizada com sucesso!", 'green')
+
+BUILD_FINGERPRINT_PATH = Path(".build-fingerprint")
+DOCKERIGNORE_PATH = Path(".dockerignore")
+
+def _dockerignore_patterns():
+    """Padrões do .dockerignore (sem comentários, linhas vazias e exceções `!`)"""
+    if _stat(DOCKERIGNORE_PATH) is None:
+        return []
+    patterns = []
+    for line in DOCKERIGNORE_PATH.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith(("#", "!")):
+            patterns.append(line.strip("/"))
+    return patterns
+
+def _ignored(rel_path, patterns):
+    """
+    Verdadeiro se o caminho (ou um diretório acima dele) casa com algum padrão
+    
+    Como no Docker, o padrão vale a partir da raiz do contexto; `**/` no início
+    casa com qualquer profundidade, inclusive zero.
+    """
+    parts = rel_path.split("/")
+    prefixes = ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+    for pattern in patterns:
+        candidates = [pattern]
+        if pattern.startswith("**/"):
+            candidates.append(pattern[3:])
+        for prefix in prefixes:
+            if any(fnmatch.fnmatch(prefix, c) for c in candidates):
+                return True
+    return False
+
+def build_fingerprint():
+    """
+    BLAKE2b do contexto de build (Dockerfiles inclusos), respeitando o .dockerignore
+    
+    Os dois Dockerfiles fazem `COPY . .`: qualquer arquivo do contexto entra na
+    imagem, então o hash cobre caminho e conteúdo de todos, em ordem estável.
+    """
+    patterns = _dockerignore_patterns()
+    h = hashlib.blake2b(digest_size=32)
+    for root, dirs, files in os.walk("."):
+        rel_root = os.path.relpath(root, ".").replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
+        dirs[:] = sorted(d for d in dirs if not _ignored(rel_root + d, patterns))
+        for name in sorted(files):
+            rel_path = rel_root + name
+            if _ignored(rel_path, patterns):
+                continue
+            h.update(rel_path.encode() + b"\0")
+            with open(os.path.join(root, name), "rb") as f:
+                h.update(hashlib.blake2b(f.read()).digest())
+    return h.hexdigest()
+
+def bring_up_stack(compose, force_build=False):
+    """
+    Constrói e inicia os containers Docker
+    
+    O build das imagens locais (api, worker) e o pull das imagens prontas
+    (mongodb, redis, elasticsearch, minio, mongo-express) são independentes:
+    nenhum serviço construído serve de base para outro, e os depends_on só
+    valem na inicialização. Os dois rodam em paralelo e o up não refaz nenhum.
+    
+    Se o contexto de build não mudou desde o último build bem-sucedido (mesmo
+    .build-fingerprint), as duas etapas são puladas; --force-build as refaz.
+    """
+    print_colored("\n=== Construindo e iniciando containers... ===", 'blue')
+    fingerprint = build_fingerprint()
+    up_to_date = (not force_build and _stat(BUILD_FINGERPRINT_PATH) is not None
+                  and BUILD_FINGERPRINT_PATH.read_text().strip() == fingerprint)
+    if up_to_date:
+        print_colored("Contexto de build inalterado; build ignorado (use --force-build para refazer).", 'green')
+    elif not _build_and_pull(compose):
+        return False
+    else:
+        BUILD_FINGERPRINT_PATH.write_text(fingerprint)
+    
+    # --wait: só retorna quando os serviços com healthcheck estão saudáveis.
+    # O v1 não tem a opção; ali o healthcheck do MongoDB é consultado direto
+    if compose == COMPOSE_V2:
+        up_cmd = [*compose, "up", "-d", "--wait", "--wait-timeout", str(WAIT_TIMEOUT), "--no-build"]
+    else:
+        up_cmd = [*compose, "up", "-d", "--no-build"]
+    if not stream_command(up_cmd):
+        print_colored("Erro ao iniciar containers (ver a saída acima)", 'red')
+        return False
+    if compose != COMPOSE_V2 and not wait_healthy(compose, "mongodb"):
+        print_colored("Erro: o MongoDB não ficou saudável a tempo", 'red')
         return False
     
-    print_colored("Containers construídos com sucesso!", 'green')
+    print_colored("Containers construídos e iniciados com sucesso!", 'green')
     return True
 
-def start_docker_containers():
-    """Inicia os containers Docker"""
-    print_colored("\n=== Iniciando containers... ===", 'blue')
-    success, output = run_command("docker-compose up -d")
-    if not success:
-        print_colored(f"Erro ao iniciar containers: {output}", 'red')
+WAIT_TIMEOUT = 120
+
+def _container_id(compose, service):
+    """ID do container de um serviço, via `ps -q` (None se não estiver rodando)"""
+    success, output = run_command([*compose, "ps", "-q", service])
+    return output.strip().splitlines()[0] if success and output.strip() else None
+
+_ARGV_INSPECT_HEALTH = ("docker", "inspect", "--format", "{{.State.Health.Status}}")
+
+def wait_healthy(compose, service, timeout=WAIT_TIMEOUT, interval=0.5):
+    """
+    Aguarda o healthcheck de um serviço sem o `up --wait` do Compose v2
+    
+    Consulta o estado de saúde do container a cada `interval` segundos e volta
+    assim que ele fica `healthy`, em vez de uma espera fixa que sobra nas
+    máquinas rápidas e falta nas lentas.
+    """
+    container_id = _container_id(compose, service)
+    if container_id is None:
         return False
     
-    print_colored("Containers iniciados com sucesso!", 'green')
+    inspect_cmd = [*_ARGV_INSPECT_HEALTH, container_id]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        success, output = run_command(inspect_cmd)
+        if success and output.strip() == "healthy":
+            return True
+        time.sleep(interval)
+    return False
+
+def _build_and_pull(compose):
+    """Constrói as imagens locais enquanto baixa as prontas; False se o build falhar"""
+    # O Compose v2 pula os serviços com `build:`; o legado só ignora a falha do pull
+    pull_flag = "--ignore-buildable" if compose == COMPOSE_V2 else "--ignore-pull-failures"
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        build = pool.submit(stream_command, [*compose, "build"], prefix="[build] ")
+        pull = pool.submit(stream_command, [*compose, "pull", "--quiet", pull_flag], prefix="[pull] ")
+        built, pulled = build.result(), pull.result()
+    
+    if not built:
+        print_colored("Erro ao construir os containers (ver a saída acima)", 'red')
+        return False
+    if not pulled:
+        # O up ainda baixa o que faltar; só deixa de ser em paralelo
+        print_colored("Aviso: nem todas as imagens foram baixadas antecipadamente", 'yellow')
     return True
 
-def initialize_database():
-    """Inicializa o banco de dados MongoDB"""
-    print_colored("\n=== Aguardando inicialização do MongoDB... ===", 'blue')
-    # Esperar MongoDB iniciar
-    time.sleep(5)
+INIT_SCRIPT_PATH = "scripts/init_mongodb.py"
+# argv fixo do script dentro do container, montado uma vez; nunca passa pelo shell
+_ARGV_INIT_DB = ("python", INIT_SCRIPT_PATH)
+# Gravado após uma inicialização bem-sucedida, com o ID do container do MongoDB
+# que a recebeu; apague-o para forçar uma nova
+INIT_SENTINEL_PATH = Path(".mongo_initialized")
+
+def initialize_database(compose):
+    """Inicializa o banco de dados MongoDB (já saudável: bring_up_stack usa --wait)"""
+    # Um único stat responde "existe?" e dá o mtime para a comparação com a sentinela
+    script_st = _stat(INIT_SCRIPT_PATH)
+    if script_st is None:
+        print_colored("Script de inicialização do MongoDB não encontrado. O banco será inicializado automaticamente.", 'yellow')
+        return
     
-    print_colored("Executando script de inicialização do MongoDB...", 'purple')
+    # A sentinela só vale para o mesmo container: `down -v` (make clean) apaga o
+    # volume junto com o container, e o novo ID força a execução. O script, por
+    # sua vez, não duplica os dados se o banco já tiver as amostras
+    mongo_id = _container_id(compose, "mongodb")
+    sentinel_st = _stat(INIT_SENTINEL_PATH)
+    if (mongo_id and sentinel_st is not None and sentinel_st.st_mtime > script_st.st_mtime
+            and INIT_SENTINEL_PATH.read_text().strip() == mongo_id):
+        print_colored(f"Banco de dados já inicializado (apague {INIT_SENTINEL_PATH} para repetir).", 'green')
+        return
     
-    # Verificar se existe um script para inicializar o MongoDB
-    if os.path.exists("scripts/init_mongodb.py"):
-        success, output = run_command("docker-compose exec -T api python scripts/init_mongodb.py")
-        if not success:
-            print_colored(f"Aviso: Não foi possível inicializar o banco de dados: {output}", 'yellow')
-            print_colored("Você pode inicializar o banco manualmente depois.", 'yellow')
-        else:
-            print_colored("Banco de dados inicializado com sucesso!", 'green')
+    print_colored("Executando script de inicialização do MongoDB...", 'purple')
+    # O ID do container sai de um `ps -q` barato; o exec vai direto ao Docker,
+    # sem o Compose resolver o projeto de novo (o binário legado é Python)
+    container_id = _container_id(compose, "api")
+    if container_id:
+        init_cmd = ["docker", "exec", "-i", container_id, *_ARGV_INIT_DB]
     else:
-        print_colored("Script de inicialização do MongoDB não encontrado. O banco será inicializado automaticamente.", 'yellow')
+        init_cmd = [*compose, "exec", "-T", "api", *_ARGV_INIT_DB]
+    
+    if not stream_command(init_cmd):
+        print_colored("Aviso: Não foi possível inicializar o banco de dados (ver a saída acima)", 'yellow')
+        print_colored("Você pode inicializar o banco manualmente depois.", 'yellow')
+        return
+    
+    if mongo_id:
+        INIT_SENTINEL_PATH.write_text(mongo_id)
+    print_colored("Banco de dados inicializado com sucesso!", 'green')
 
 def main():
     """Função principal para configurar o ambiente Docker"""
-    print_colored("\n====================================================", 'blue')
-    print_colored("      Configuração do Ambiente Elysia RAG", 'purple')
-    print_colored("====================================================\n", 'blue')
+    parser = argparse.ArgumentParser(description="Configura e inicia o ambiente Docker do sistema Elysia")
+    parser.add_argument("--openai-key", help="Chave de API OpenAI gravada no .env (padrão: $OPENAI_API_KEY)")
+    parser.add_argument("--force-build", action="store_true",
+                        help="Reconstrói as imagens mesmo com o contexto de build inalterado")
+    args = parser.parse_args()
+    
+    sys.stdout.write(_banner("Configuração do Ambiente Elysia RAG") + "\n")
+    sys.stdout.flush()
     
     # Verificar pré-requisitos
-    if not check_docker_installed() or not check_docker_compose_installed():
+    compose = check_prereqs()
+    if compose is None:
         sys.exit(1)
     
     # Verificar arquivo .env
-    check_env_file()
+    check_env_file(args.openai_key)
     
-    # Construir containers
-    if not build_docker_containers():
-        sys.exit(1)
-    
-    # Iniciar containers
-    if not start_docker_containers():
+    # Construir e iniciar containers
+    if not bring_up_stack(compose, force_build=args.force_build):
         sys.exit(1)
     
     # Inicializar banco de dados
-    initialize_database()
-    
-    print_colored("\n====================================================", 'blue')
-    print_colored("      Sistema Elysia RAG inicializado!", 'purple')
-    print_colored("====================================================", 'blue')
-    print_colored("\nServiços disponíveis:", 'green')
-    print_colored("  - API: http://localhost:8000", 'blue')
-    print_colored("  - MongoDB Express: http://localhost:8081", 'blue')
-    print_colored("  - MinIO Console: http://localhost:9001", 'blue')
-    
-    print_colored("\nPara interromper os serviços: docker-compose down", 'yellow')
-    print_colored("Para ver os logs: docker-compose logs -f\n", 'yellow')
+    initialize_database(compose)
+    
+    # Resumo final montado numa string só: uma escrita, sem intercalar com outra saída
+    cmd = " ".join(compose)
+    sys.stdout.write("\n".join([
+        _banner("Sistema Elysia RAG inicializado!"),
+        _colored("Serviços disponíveis:", 'green'),
+        _colored("  - API: http://localhost:8000", 'blue'),
+        _colored("  - MongoDB Express: http://localhost:8081", 'blue'),
+        _colored("  - MinIO Console: http://localhost:9001", 'blue'),
+        "",
+        _colored(f"Para interromper os serviços: {cmd} down", 'yellow'),
+        _colored(f"Para ver os logs: {cmd} logs -f", 'yellow'),
+        "",
+    ]) + "\n")
+    sys.stdout.flush()
 
 if __name__ == "__main__":
     main()
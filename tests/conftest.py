@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Os testes importam `app` e os scripts a partir da raiz do projeto, como os scripts fazem
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
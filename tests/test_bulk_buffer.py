@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.database import bulk_buffer as bulk_buffer_module
+from app.database.bulk_buffer import BulkBuffer
+
+
+class FakeCollection:
+    def __init__(self, log, name, erros=None):
+        self.log = log
+        self.name = name
+        self.erros = erros or {}
+    
+    async def bulk_write(self, requests, ordered=True):
+        self.log.append((self.name, len(requests)))
+        if self.erros:
+            raise BulkWriteError({
+                "writeErrors": [{"index": i, "errmsg": msg} for i, msg in self.erros.items()]
+            })
+
+
+class FakeDB:
+    def __init__(self, erros=None):
+        self.log = []
+        self.erros = erros or {}
+        self.collections = {}
+    
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self.log, name, self.erros.get(name))
+        return self.collections[name]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(bulk_buffer_module, "get_db", lambda: db)
+    return db
+
+
+def test_flush_imediato_ao_atingir_max_ops(fake_db):
+    async def cenario():
+        buffer = BulkBuffer(flush_interval=3600, max_ops=5)
+        ids = await asyncio.wait_for(
+            asyncio.gather(*(buffer.insert_one("redacoes", {"n": i}) for i in range(5))),
+            timeout=1
+        )
+        return ids
+    
+    ids = asyncio.run(cenario())
+    
+    # Sem esperar a janela de 1 hora: um único bulk_write com as 5 operações
+    assert fake_db.log == [("redacoes", 5)]
+    assert len(set(ids)) == 5
+
+
+def test_flush_pela_janela_abaixo_do_limite(fake_db):
+    async def cenario():
+        buffer = BulkBuffer(flush_interval=0.01, max_ops=500)
+        await asyncio.gather(*(buffer.insert_one("redacoes", {"n": i}) for i in range(3)))
+    
+    asyncio.run(cenario())
+    
+    assert fake_db.log == [("redacoes", 3)]
+
+
+def test_um_bulk_write_por_colecao(fake_db):
+    async def cenario():
+        buffer = BulkBuffer(flush_interval=0.01, max_ops=500)
+        await asyncio.gather(
+            buffer.insert_one("redacoes", {}),
+            buffer.insert_one("analises", {}),
+            buffer.insert_one("redacoes", {}),
+        )
+    
+    asyncio.run(cenario())
+    
+    assert sorted(fake_db.log) == [("analises", 1), ("redacoes", 2)]
+
+
+def test_id_gerado_no_cliente_e_preservado(fake_db):
+    async def cenario():
+        buffer = BulkBuffer(flush_interval=0.01, max_ops=500)
+        documento = {}
+        inserted = await buffer.insert_one("redacoes", documento)
+        return inserted, documento
+    
+    inserted, documento = asyncio.run(cenario())
+    
+    assert inserted == str(documento["_id"])
+
+
+def test_erro_parcial_falha_so_o_item_com_erro(monkeypatch):
+    db = FakeDB(erros={"redacoes": {1: "duplicate key"}})
+    monkeypatch.setattr(bulk_buffer_module, "get_db", lambda: db)
+    
+    async def cenario():
+        buffer = BulkBuffer(flush_interval=0.01, max_ops=500)
+        return await asyncio.gather(
+            *(buffer.insert_one("redacoes", {"n": i}) for i in range(3)),
+            return_exceptions=True
+        )
+    
+    resultados = asyncio.run(cenario())
+    
+    assert isinstance(resultados[1], Exception)
+    assert "duplicate key" in str(resultados[1])
+    assert isinstance(resultados[0], str) and isinstance(resultados[2], str)
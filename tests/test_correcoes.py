@@ -0,0 +1,48 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from app.database.models import aplicar_correcoes
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+
+
+@pytest.fixture(scope="module")
+def add_redacao_media():
+    spec = importlib.util.spec_from_file_location(
+        "add_redacao_media", SCRIPTS_DIR / "add_redacao_media.py"
+    )
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def test_aplicar_correcoes_basico():
+    correcoes = [
+        {"pos": 6, "del": 5, "ins": "mundo"},
+        {"pos": 0, "del": 0, "ins": ">> "},
+    ]
+    
+    assert aplicar_correcoes("Olá, terra!", correcoes) == ">> Olá, mundo!"
+
+
+def test_aplicar_correcoes_sem_correcoes():
+    assert aplicar_correcoes("texto", []) == "texto"
+
+
+def test_diff_da_redacao_media_equivale_a_substituicao_pela_regex(add_redacao_media):
+    texto = add_redacao_media.REDACAO_MEDIA["texto"]
+    esperado = add_redacao_media._CORRECOES_RE.sub(
+        lambda m: add_redacao_media.CORRECOES[m.group(0)], texto
+    )
+    
+    assert add_redacao_media.CORRECOES_DIFF
+    assert aplicar_correcoes(texto, add_redacao_media.CORRECOES_DIFF) == esperado
+
+
+def test_diff_da_redacao_media_nao_se_sobrepoe(add_redacao_media):
+    diff = sorted(add_redacao_media.CORRECOES_DIFF, key=lambda c: c["pos"])
+    
+    for anterior, seguinte in zip(diff, diff[1:]):
+        assert anterior["pos"] + anterior["del"] <= seguinte["pos"]
@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.utils.redacao_analyzer import RedacaoAnalyzer
+
+
+def _analyzer_com_exemplos(exemplos):
+    # Sem __init__: só a busca por exemplos é exercitada, sem carregar spaCy/TF-IDF
+    analyzer = RedacaoAnalyzer.__new__(RedacaoAnalyzer)
+    analyzer.definir_exemplos(exemplos)
+    return analyzer
+
+
+def test_exemplos_similares_igual_ao_argsort():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((200, 32))
+    exemplos = [{"titulo": f"exemplo {i}", "embedding": e.tolist()} for i, e in enumerate(embeddings)]
+    analyzer = _analyzer_com_exemplos(exemplos)
+    query = rng.standard_normal(32)
+    
+    resultado = analyzer.exemplos_similares(query.tolist(), k=5)
+    
+    normalizada = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = normalizada @ (query / np.linalg.norm(query))
+    esperado = np.argsort(-scores)[:5]
+    assert [e["titulo"] for e, _ in resultado] == [f"exemplo {i}" for i in esperado]
+    np.testing.assert_allclose([s for _, s in resultado], scores[esperado], rtol=1e-5)
+
+
+def test_exemplos_sem_embedding_ficam_fora_da_matriz():
+    analyzer = _analyzer_com_exemplos([
+        {"titulo": "sem embedding"},
+        {"titulo": "a", "embedding": [1.0, 0.0]},
+        {"titulo": "b", "embedding": [0.0, 1.0]},
+    ])
+    
+    resultado = analyzer.exemplos_similares([1.0, 0.1], k=10)
+    
+    assert [e["titulo"] for e, _ in resultado] == ["a", "b"]
+    assert len(analyzer.exemplos) == 3
+
+
+def test_sem_exemplos_ou_consulta_nula():
+    assert _analyzer_com_exemplos([{"titulo": "x"}]).exemplos_similares([1.0, 0.0]) == []
+    assert _analyzer_com_exemplos([{"titulo": "a", "embedding": [1.0, 0.0]}]).exemplos_similares([0.0, 0.0]) == []
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.database import rag_manager as rag_manager_module
+from app.database.rag_manager import ingest_many
+
+
+class FakeRepository:
+    def __init__(self):
+        self.ativos = 0
+        self.max_ativos = 0
+        self.documentos = []
+    
+    async def create(self, documento):
+        self.ativos += 1
+        self.max_ativos = max(self.max_ativos, self.ativos)
+        await asyncio.sleep(0.01)
+        self.ativos -= 1
+        self.documentos.append(documento)
+        return str(ObjectId())
+
+
+class FakeFileProcessor:
+    def extract_text(self, conteudo, nome, content_type=None):
+        if nome.startswith("erro"):
+            raise ValueError("arquivo corrompido")
+        return conteudo.decode()
+
+
+@pytest.fixture
+def ingestao(monkeypatch):
+    repositorio = FakeRepository()
+    armazenadas = []
+    
+    async def store_many(redacoes):
+        armazenadas.extend(redacoes)
+        return len(redacoes)
+    
+    monkeypatch.setattr(rag_manager_module, "redacao_repository", repositorio)
+    monkeypatch.setattr(rag_manager_module, "file_processor", FakeFileProcessor())
+    monkeypatch.setattr(rag_manager_module.rag_manager, "store_many", store_many)
+    return repositorio, armazenadas
+
+
+def _item(nome, texto="Texto da redação"):
+    return {"conteudo": texto.encode(), "nome": nome}
+
+
+def test_concorrencia_limitada_pelo_semaforo(ingestao):
+    repositorio, armazenadas = ingestao
+    
+    ids = asyncio.run(ingest_many([_item(f"r{i}.txt") for i in range(10)], concurrency=3))
+    
+    assert len(ids) == 10 and all(ids)
+    assert repositorio.max_ativos == 3
+    # Uma única chamada agrupada de embeddings, com todas as redações gravadas
+    assert sorted(r["redacao_id"] for r in armazenadas) == sorted(ids)
+
+
+def test_falhas_viram_none_na_posicao_do_item(ingestao):
+    repositorio, armazenadas = ingestao
+    itens = [_item("a.txt"), _item("erro.txt"), _item("vazio.txt", "   "), _item("b.txt")]
+    
+    ids = asyncio.run(ingest_many(itens))
+    
+    assert ids[0] and ids[3]
+    assert ids[1] is None and ids[2] is None
+    assert sorted(d["titulo"] for d in repositorio.documentos) == ["a", "b"]
+    assert len(armazenadas) == 2
+
+
+def test_sem_redacoes_validas_nao_gera_embeddings(ingestao):
+    _, armazenadas = ingestao
+    
+    assert asyncio.run(ingest_many([_item("erro.txt")])) == [None]
+    assert armazenadas == []
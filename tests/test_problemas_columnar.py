@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from app.database.models import ProblemasColumnar, codificar_problemas
+
+
+PROBLEMAS = [
+    {
+        "tipo": "ortografia",
+        "texto_original": "historico",
+        "sugestao": "histórico",
+        "explicacao": "Proparoxítona",
+        "posicao": [10, 19],
+    },
+    {
+        "tipo": "concordância",
+        "texto_original": "os população",
+        "sugestao": "a população",
+        "explicacao": "Substantivo feminino",
+        "posicao": [30, 42],
+        "gravidade": "alta",
+    },
+    {
+        "tipo": "ortografia",
+        "texto_original": "esta",
+        "sugestao": "está",
+        "explicacao": "Verbo estar",
+    },
+]
+
+
+def _round_trip(problemas):
+    return ProblemasColumnar.from_bson(ProblemasColumnar.from_list(problemas).to_bson())
+
+
+def test_round_trip_preserva_campos_e_chaves_extras():
+    itens = _round_trip(PROBLEMAS).to_list()
+    
+    assert [i["tipo"] for i in itens] == ["ortografia", "concordância", "ortografia"]
+    assert itens[0]["posicao"] == [10, 19]
+    assert itens[1]["gravidade"] == "alta"
+    assert "gravidade" not in itens[0]
+    # Posição ausente é representada por -1
+    assert itens[2]["posicao"] == [-1, -1]
+
+
+def test_contagem_por_tipo():
+    assert _round_trip(PROBLEMAS).contagem_por_tipo() == {"ortografia": 2, "concordância": 1}
+
+
+def test_campos_nulos_ou_numericos_viram_texto():
+    itens = _round_trip([{"tipo": None, "texto_original": 3, "sugestao": None, "explicacao": 1.5}]).to_list()
+    
+    assert itens[0]["tipo"] == ""
+    assert itens[0]["texto_original"] == "3"
+    assert itens[0]["sugestao"] == ""
+    assert itens[0]["explicacao"] == "1.5"
+
+
+def test_posicao_float_inteiro_e_aceita():
+    assert _round_trip([{"tipo": "x", "posicao": [1.0, 4.0]}]).to_list()[0]["posicao"] == [1, 4]
+
+
+@pytest.mark.parametrize("problema", [
+    {"tipo": "x", "posicao": "linha 2"},
+    {"tipo": "x", "posicao": [3]},
+    {"tipo": "x", "posicao": [1.5, 2]},
+    {"tipo": "x", "posicao": [float("inf"), 2]},
+    {"tipo": "x", "posicao": [0, 2 ** 40]},
+    {"tipo": {"aninhado": True}},
+    "não é um objeto",
+])
+def test_item_malformado_rejeitado(problema):
+    with pytest.raises(ValueError):
+        ProblemasColumnar.from_list([problema])
+
+
+def test_codificar_problemas_cai_para_lista_bruta():
+    problemas = PROBLEMAS + [{"tipo": "x", "posicao": "linha 2"}]
+    
+    assert codificar_problemas(problemas) == {"problemas_gramaticais": problemas}
+    assert "problemas" in codificar_problemas(PROBLEMAS)
+    assert codificar_problemas(None) == {"problemas_gramaticais": []}
+
+
+def test_mais_de_127_tipos_distintos():
+    problemas = [{"tipo": f"tipo_{i}"} for i in range(300)]
+    colunas = _round_trip(problemas)
+    
+    assert colunas.tipo_codes.dtype == np.int32
+    assert colunas[299].tipo == "tipo_299"
+
+
+def test_le_documento_antigo_com_codigos_int8():
+    doc = ProblemasColumnar.from_list(PROBLEMAS).to_bson()
+    doc["tipo_codes"] = np.array([0, 1, 0], dtype=np.int8).tobytes()
+    
+    colunas = ProblemasColumnar.from_bson(doc)
+    
+    assert [colunas[i].tipo for i in range(3)] == ["ortografia", "concordância", "ortografia"]
+
+
+def test_lista_vazia():
+    colunas = _round_trip([])
+    
+    assert len(colunas) == 0
+    assert colunas.to_list() == []
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from app.database import rag_manager as rag_manager_module
+from app.database.rag_manager import RAGManager, CORPUS_DTYPE
+
+
+def _manager_com_corpus(n, dim, rng):
+    manager = RAGManager()
+    corpus = rng.standard_normal((n, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    manager._corpus = corpus.astype(CORPUS_DTYPE)
+    manager._corpus_ids = [ObjectId() for _ in range(n)]
+    manager._corpus_doc_ids = [None] * n
+    manager._corpus_titulos = [None] * n
+    manager._corpus_snippets = [""] * n
+    manager._corpus_pos = {redacao_id: i for i, redacao_id in enumerate(manager._corpus_ids)}
+    return manager
+
+
+def _brute_force(manager, query, k):
+    q = np.asarray(query, dtype=np.float32)
+    q = q / np.linalg.norm(q)
+    scores = manager._corpus.astype(np.float32) @ q
+    ordem = np.argsort(-scores)[:k]
+    return ordem, scores[ordem]
+
+
+@pytest.mark.parametrize("n", [50, 1000])  # abaixo e acima de JIT_MAX_ROWS
+@pytest.mark.parametrize("use_numba", [False, True])
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_top_k_igual_ao_argsort(monkeypatch, n, use_numba, k):
+    if use_numba and not rag_manager_module.HAS_NUMBA:
+        pytest.skip("numba não instalado")
+    monkeypatch.setattr(rag_manager_module, "HAS_NUMBA", use_numba)
+    
+    rng = np.random.default_rng(n + k)
+    manager = _manager_com_corpus(n, 64, rng)
+    query = rng.standard_normal(64).tolist()
+    
+    resultado = manager._top_k(query, k)
+    ordem, scores = _brute_force(manager, query, k)
+    
+    assert [i for i, _ in resultado] == ordem.tolist()
+    np.testing.assert_allclose([s for _, s in resultado], scores, rtol=1e-5, atol=1e-5)
+
+
+def test_top_k_nao_altera_a_consulta():
+    rng = np.random.default_rng(1)
+    manager = _manager_com_corpus(10, 16, rng)
+    query = (rng.standard_normal(16) * 5).astype(np.float32)
+    original = query.copy()
+    
+    manager._top_k(query, 3)
+    
+    np.testing.assert_array_equal(query, original)
+
+
+def test_update_corpus_normaliza_sem_alterar_o_embedding():
+    rng = np.random.default_rng(2)
+    manager = _manager_com_corpus(10, 16, rng)
+    embedding = (rng.standard_normal(16) * 5).astype(np.float32)
+    original = embedding.copy()
+    
+    manager.update_corpus(ObjectId(), embedding)
+    
+    np.testing.assert_array_equal(embedding, original)
+    assert manager._corpus.shape == (11, 16)
+    np.testing.assert_allclose(np.linalg.norm(manager._corpus[-1].astype(np.float32)), 1.0, atol=1e-3)
+    # A nova linha é encontrada pela própria consulta
+    assert manager._top_k(embedding, 1)[0][0] == 10
+
+
+def test_top_k_com_k_maior_que_o_corpus():
+    rng = np.random.default_rng(0)
+    manager = _manager_com_corpus(4, 16, rng)
+    
+    resultado = manager._top_k(rng.standard_normal(16).tolist(), 10)
+    
+    assert sorted(i for i, _ in resultado) == [0, 1, 2, 3]
+    scores = [s for _, s in resultado]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_k_corpus_vazio():
+    manager = RAGManager()
+    manager._corpus = np.empty((0, 16), dtype=CORPUS_DTYPE)
+    manager._corpus_ids = []
+    
+    assert manager._top_k([1.0] * 16, 3) == []